@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-__init__.py
+@Description : 性能基准脚本（python -m bench.xxx 运行）
+"""
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-bench_engine_profile.py
+@Description : 对比启用 / 不启用 [database] 连接参数时的写入吞吐
+
+用法（在项目根目录）：
+    python -m bench.bench_engine_profile --commits 2000 --batch 1
+    python -m bench.bench_engine_profile --commits 200 --batch 500 --reader
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+
+from storage import StatsDelta, apply_delta, install_profile, load_profile
+
+
+def _make_engine(path: str, profile_name: str):
+    from storage.models import Base
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    install_profile(engine, load_profile({"profile": profile_name}))
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _reader(engine, stop: threading.Event, result: dict) -> None:
+    # 模拟面板轮询：反复读取按键总计
+    reads = errors = 0
+    while not stop.is_set():
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql(
+                    "SELECT key_name, virtual_key_code, total_count FROM key_total_stats ORDER BY total_count DESC"
+                ).fetchall()
+            reads += 1
+        except Exception:
+            errors += 1
+    result.update(reads=reads, read_errors=errors)
+
+
+def run(profile_name: str, commits: int, batch: int, with_reader: bool) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="traceboard-bench-")
+    engine = _make_engine(os.path.join(tmpdir, "bench.db"), profile_name)
+
+    stop = threading.Event()
+    reader_result: dict = {}
+    reader = None
+    if with_reader:
+        reader = threading.Thread(target=_reader, args=(engine, stop, reader_result), daemon=True)
+        reader.start()
+
+    now = datetime.datetime.now()
+    t0 = time.perf_counter()
+    for i in range(commits):
+        delta = StatsDelta()
+        for j in range(batch):
+            delta.add_key("k", 48 + (i * batch + j) % 40, now)
+        with engine.begin() as conn:
+            apply_delta(conn, delta)
+    elapsed = time.perf_counter() - t0
+
+    stop.set()
+    if reader is not None:
+        reader.join()
+    engine.dispose()
+
+    out = {
+        "profile": profile_name,
+        "commits": commits,
+        "events_per_commit": batch,
+        "seconds": round(elapsed, 4),
+        "commits_per_sec": round(commits / elapsed, 1),
+        "events_per_sec": round(commits * batch / elapsed, 1),
+    }
+    out.update(reader_result)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--commits", type=int, default=1000, help="提交次数")
+    ap.add_argument("--batch", type=int, default=1, help="每次提交包含的按键事件数")
+    ap.add_argument("--reader", action="store_true", help="同时运行一个轮询读取线程")
+    args = ap.parse_args()
+
+    for name in ("off", "tuned"):
+        print(json.dumps(run(name, args.commits, args.batch, args.reader), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-bench_ingest.py
+@Description : 不安装键盘钩子，把合成的按键流直接喂给 on_press / on_release，测量采集与落库路径
+
+输出每秒事件数（端到端，直到全部落库）、回调耗时 p50 / p99、每秒提交次数。
+数据库为临时文件，不会写入 key_events.db。
+
+用法（在项目根目录）：
+    python -m bench.bench_ingest --events 200000
+    python -m bench.bench_ingest --events 50000 --flush-threshold 200 --out ingest.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from bench.common import DB_ENV, emit, latency_summary, write_results
+
+# 无桌面环境时 pynput 使用空后端，只需要 KeyCode 类型
+os.environ.setdefault("PYNPUT_BACKEND", "dummy")
+
+VK_SHIFT, VK_CTRL, VK_ALT = 0xA0, 0xA2, 0xA4
+VK_SPACE, VK_ENTER, VK_BACK, VK_TAB = 0x20, 0x0D, 0x08, 0x09
+
+# 英文文本的字母频率（%），决定字母键的分布
+LETTER_FREQ = {
+    "E": 12.7, "T": 9.1, "A": 8.2, "O": 7.5, "I": 7.0, "N": 6.7, "S": 6.3, "H": 6.1, "R": 6.0,
+    "D": 4.3, "L": 4.0, "C": 2.8, "U": 2.8, "M": 2.4, "W": 2.4, "F": 2.2, "G": 2.0, "Y": 2.0,
+    "P": 1.9, "B": 1.5, "V": 1.0, "K": 0.8, "J": 0.15, "X": 0.15, "Q": 0.1, "Z": 0.07,
+}
+
+# 合成流里出现的快捷键：(修饰键, 触发键)
+SHORTCUTS = [(VK_CTRL, ord("C")), (VK_CTRL, ord("V")), (VK_CTRL, ord("S")), (VK_CTRL, ord("Z")),
+             (VK_CTRL, ord("F")), (VK_ALT, VK_TAB)]
+
+PRESS, RELEASE = 0, 1
+
+# (PRESS / RELEASE, vk)
+SynthEvent = Tuple[int, int]
+
+
+def synth_stream(n_events: int, seed: int = 1) -> Tuple[List[SynthEvent], int, int]:
+    """
+    生成约 n_events 个事件的按键流：按单词成段输入（段长近似几何分布），
+    约 4% 的字母带 Shift，约 3% 的退格带长按重复，约 6% 的段以快捷键结束。
+    返回 (事件, 计入统计的按下次数, 应命中的快捷键次数)；长按重复的按下不计入。
+    """
+    rng = random.Random(seed)
+    letters = [ord(c) for c in LETTER_FREQ]
+    weights = list(LETTER_FREQ.values())
+    events: List[SynthEvent] = []
+    counted = hotkeys = 0
+
+    def tap(vk: int) -> None:
+        nonlocal counted
+        events.append((PRESS, vk))
+        events.append((RELEASE, vk))
+        counted += 1
+
+    while len(events) < n_events:
+        for _ in range(max(1, int(rng.expovariate(1 / 8)))):          # 一段约 8 个单词
+            for vk in rng.choices(letters, weights, k=max(1, int(rng.expovariate(1 / 5)))):
+                if rng.random() < 0.04:
+                    events.append((PRESS, VK_SHIFT))
+                    tap(vk)
+                    events.append((RELEASE, VK_SHIFT))
+                    counted += 1
+                else:
+                    tap(vk)
+            if rng.random() < 0.03:
+                # 长按退格：系统会重复发送按下事件，直到松开
+                repeats = rng.randint(2, 12)
+                events.extend([(PRESS, VK_BACK)] * repeats)
+                events.append((RELEASE, VK_BACK))
+                counted += 1
+            tap(VK_SPACE)
+        if rng.random() < 0.06:
+            mod, vk = rng.choice(SHORTCUTS)
+            events.append((PRESS, mod))
+            tap(vk)
+            events.append((RELEASE, mod))
+            counted += 1
+            hotkeys += 1
+        else:
+            tap(VK_ENTER)
+    return events, counted, hotkeys
+
+
+def _key_objects():
+    """
+    vk -> pynput 的按键对象。修饰键也用带 vk 的 KeyCode：空后端下 Key 枚举成员的 vk 都是 0，
+    用它们时修饰键不会被识别，快捷键路径根本不会执行。
+    """
+    from pynput.keyboard import KeyCode
+
+    keys = {}
+    for vk in list(range(0x41, 0x5B)) + [VK_SPACE, VK_ENTER, VK_BACK, VK_TAB]:
+        keys[vk] = KeyCode(vk=vk, char=chr(vk).lower() if 0x41 <= vk <= 0x5A else None)
+    for vk in (VK_SHIFT, VK_CTRL, VK_ALT):
+        keys[vk] = KeyCode(vk=vk)
+    return keys
+
+
+def run(n_events: int, seed: int, flush_interval: float, flush_threshold: int, burst: int) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="traceboard-bench-")
+    db_path = os.path.join(tmpdir, "ingest.db")
+    os.environ[DB_ENV] = db_path
+
+    from listener import keyboard as kb
+    from storage import add_write_listener
+
+    # 监听器在第一次落库时才导入 server.app（建表、载入排名），基准只测稳态，先加载
+    kb.get_engine()
+
+    stream, expected, expected_hotkeys = synth_stream(n_events, seed)
+    keys = _key_objects()
+    calls = [(kb.on_press if kind == PRESS else kb.on_release, keys[vk]) for kind, vk in stream]
+
+    commits = []
+    add_write_listener(lambda delta, generation: commits.append(time.perf_counter()))
+
+    kb.stats_buffer.flush_interval = flush_interval
+    kb.stats_buffer.flush_threshold = flush_threshold
+    kb.stats_buffer.start()
+    kb.ingest_worker.start()
+
+    ring = kb.event_ring
+    high = ring.capacity // 2
+    latencies = [0] * len(calls)
+    clock = time.perf_counter_ns
+
+    started = time.perf_counter()
+    for i, (callback, key) in enumerate(calls):
+        t0 = clock()
+        callback(key)
+        latencies[i] = clock() - t0
+        # 每个输入段之后，队列积压过半就等消费者追上，避免测成丢弃率
+        if i % burst == 0 and ring.depth() > high:
+            while ring.depth() > high // 2:
+                time.sleep(0.0005)
+    pushed = time.perf_counter()
+
+    while kb.ingest_worker.processed < len(calls) - ring.dropped:
+        time.sleep(0.001)
+    kb.stats_buffer.flush()
+    finished = time.perf_counter()
+    stats = kb.ingest_stats()
+    kb.flush_stats()
+
+    con = sqlite3.connect(db_path)
+    try:
+        counted = con.execute("SELECT COALESCE(SUM(count), 0) FROM hourly_key_stats").fetchone()[0]
+        hotkeys = con.execute("SELECT COALESCE(SUM(count), 0) FROM hourly_hotkey_stats").fetchone()[0]
+    finally:
+        con.close()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+    elapsed = finished - started
+    callback_s = sum(latencies) / 1e9
+    return {
+        "bench": "ingest",
+        "events": len(calls),
+        "seconds": round(elapsed, 4),
+        "events_per_sec": round(len(calls) / elapsed, 1),
+        "push_events_per_sec": round(len(calls) / (pushed - started), 1),
+        "callback_events_per_sec": round(len(calls) / callback_s, 1) if callback_s else None,
+        "callback_latency": latency_summary(latencies),
+        "commits": len(commits),
+        "commits_per_sec": round(len(commits) / elapsed, 2),
+        "dropped": stats["dropped"],
+        "coalesced": stats["coalesced"],
+        "queue_high_watermark": stats["high_watermark"],
+        "key_presses": {"expected": expected, "stored": counted},
+        "hotkeys": {"expected": expected_hotkeys, "stored": hotkeys},
+        "flush_interval": flush_interval,
+        "flush_threshold": flush_threshold,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="按键采集 / 落库路径基准")
+    ap.add_argument("--events", type=int, default=200_000, help="合成的按下 + 松开事件数")
+    ap.add_argument("--seed", type=int, default=1, help="随机种子，相同种子生成相同的按键流")
+    ap.add_argument("--flush-interval", type=float, default=0.5, help="StatsBuffer 落库间隔（秒）")
+    ap.add_argument("--flush-threshold", type=int, default=2000, help="StatsBuffer 提前落库的事件数")
+    ap.add_argument("--burst", type=int, default=256, help="每多少个事件检查一次队列积压")
+    ap.add_argument("--out", help="把结果写入 JSON 文件")
+    args = ap.parse_args()
+
+    result = run(args.events, args.seed, args.flush_interval, args.flush_threshold, max(1, args.burst))
+    emit(result)
+    if args.out:
+        write_results(args.out, [result])
+    mismatched = [name for name in ("key_presses", "hotkeys") if result[name]["expected"] != result[name]["stored"]]
+    if mismatched:
+        print(f"❌ 落库的计数与合成流不一致: {', '.join(mismatched)}（见上面的 expected / stored）", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-bench_routes.py
+@Description : 用进程内 ASGI 客户端逐个请求 FastAPI 路由，数据库预先灌入 N 年的合成数据
+
+每个路由分别测量“清空响应缓存后”（即实际查询）与“缓存命中”两种情况的耗时。
+合成数据经由真实的写入路径生成（apply_delta -> rollup -> retention），表的形态与长期使用的库一致；
+灌好的库按 年数 / 种子 / 日期 缓存在 --db-dir 下，重复运行直接复用。
+
+用法（在项目根目录）：
+    python -m bench.bench_routes --years 1
+    python -m bench.bench_routes --years 10 --iterations 30 --out routes-10y.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench.common import DB_ENV, emit, latency_summary, write_results
+
+DEFAULT_DB_DIR = os.path.join(tempfile.gettempdir(), "traceboard-bench")
+
+# (方法, 路径, 查询参数 / 请求体)；路径相同、参数不同的多条分别统计
+GET_ROUTES: List[Tuple[str, Dict[str, Any]]] = [
+    ("/", {}),
+    ("/key_counts", {}),
+    ("/key_counts", {"limit": 10}),
+    ("/key_counts", {"since_generation": 1}),
+    ("/ingest_stats", {}),
+    ("/activity_daily", {"days": 365}),
+    ("/activity_daily", {"days": 3650, "format": "columnar"}),
+    ("/activity_hourly", {"hours": 24}),
+    ("/activity_hourly", {"hours": 1440, "format": "columnar"}),
+    ("/activity_monthly", {"months": 120}),
+    ("/hotkey_totals", {"limit": 20}),
+    ("/hotkey_series", {"hotkey_id": "CTRL+C", "days": 365}),
+    ("/hotkey_series", {"hotkey_id": "CTRL+C", "days": 3650, "format": "columnar"}),
+    ("/key_matrix/week_hour", {}),
+    ("/key_matrix/week_hour", {"vk": 69, "days": 30}),
+    ("/key_matrix/day_key", {"days": 7}),
+    ("/key_matrix/day_key", {"days": 365, "top": 40}),
+    ("/key_bigrams", {"limit": 20}),
+    ("/key_bigrams", {"limit": 50, "prev_vk": 0x20}),
+    ("/key_bigrams/matrix", {}),
+    ("/analytics/rolling_mean", {"days": 3650, "window": 28}),
+    ("/analytics/week_over_week", {"days": 365}),
+    ("/analytics/percentiles", {"days": 3650}),
+    ("/typing/speed", {}),
+    ("/typing/speed", {"days": 366, "q": "50,90,99,99.9"}),
+    ("/metrics", {}),
+]
+
+# /live 是不会结束的 SSE 流，不在这里测量
+SKIPPED_ROUTES = {"/live"}
+
+POST_BATCH_EVENTS = 1000
+
+
+def _weekday_profile(rng: random.Random, day: datetime.date) -> Tuple[bool, float]:
+    """(当天是否使用, 当天按键总数)：工作日约 90% 的天有输入，周末约 35%"""
+    weekend = day.weekday() >= 5
+    active = rng.random() < (0.35 if weekend else 0.9)
+    mean = 4000 if weekend else 14000
+    return active, max(200.0, rng.gauss(mean, mean * 0.3))
+
+
+# 一天中各小时的输入比重（上午 / 下午 / 晚上三段）
+HOUR_WEIGHTS = [0] * 9 + [6, 9, 9, 3, 5, 8, 9, 8, 6, 2, 2, 4, 4, 2] + [0]
+
+# 打字速度摘要只灌最近这些天（/typing/speed 最多查 366 天）
+TYPING_DAYS = 366
+
+
+def _typing_hour(rng: random.Random, hour: int, presses: float):
+    """一小时的打字摘要：活跃分钟数随按键量增长，各直方图取少量近似正态的样本"""
+    from storage.typingstats import HourSummary
+
+    s = HourSummary(hour)
+    s.active_minutes = max(1, min(60, int(presses / 120)))
+    s.key_presses = int(presses)
+    s.bursts = max(1, s.active_minutes * 3)
+    for _ in range(s.active_minutes):
+        kpm = max(1, int(rng.gauss(presses / s.active_minutes, 40)))
+        s.kpm.add(kpm)
+        s.peak_kpm = max(s.peak_kpm, kpm)
+    for _ in range(64):
+        s.intervals.add(max(1, int(rng.lognormvariate(5.0, 0.5))))
+    for _ in range(s.bursts):
+        s.idle.add(int(rng.expovariate(1 / 8000)) + 2000)
+        s.burst_keys.add(max(1, int(rng.expovariate(1 / 40))))
+    return s
+
+
+def seed_database(engine, years: int, seed: int, today: datetime.date) -> Dict[str, Any]:
+    """按月生成增量并落库，每月汇总一次；最后按保留策略降采样"""
+    from bench.bench_ingest import LETTER_FREQ
+    from listener.hotkeys import load_hotkey_defs
+    from storage import Retention, StatsDelta, apply_delta, load_retention, rollup
+    from storage.timekeys import epoch_hour
+    from storage.typingstats import save_hours
+
+    rng = random.Random(seed)
+    keys = [(c.lower(), ord(c), w) for c, w in LETTER_FREQ.items()]
+    keys += [("space", 0x20, 18.0), ("enter", 0x0D, 3.0), ("backspace", 0x08, 4.0), ("shift", 0xA0, 3.0),
+             ("ctrl_l", 0xA2, 2.0), ("tab", 0x09, 1.0), ("-", 0xBD, 0.8), (".", 0xBE, 1.5), (",", 0xBC, 1.2)]
+    key_total = sum(w for _, _, w in keys)
+    hotkey_names = {str(d.get("hotkey_id")): str(d.get("display_name", "")) for d in load_hotkey_defs()}
+    shortcut_ids = [hid for hid in ("CTRL+C", "CTRL+V", "CTRL+S", "CTRL+Z", "CTRL+F", "ALT+TAB") if hid in hotkey_names]
+    hour_total = sum(HOUR_WEIGHTS)
+
+    start = today - datetime.timedelta(days=365 * years)
+    typing_start = today - datetime.timedelta(days=TYPING_DAYS)
+    started = time.perf_counter()
+    events = 0
+    delta = StatsDelta()
+    typing = []
+    day = start
+    while day <= today:
+        active, total = _weekday_profile(rng, day)
+        if active:
+            for hour, hw in enumerate(HOUR_WEIGHTS):
+                if not hw:
+                    continue
+                now = datetime.datetime(day.year, day.month, day.day, hour, 30)
+                presses = total * hw / hour_total
+                for name, vk, w in keys:
+                    n = int(presses * w / key_total * rng.uniform(0.7, 1.3))
+                    if n:
+                        delta.add_key(name, vk, now, n)
+                for hid in shortcut_ids:
+                    n = int(presses * 0.002 * rng.uniform(0.2, 1.8))
+                    if n:
+                        delta.add_hotkey(hid, hotkey_names[hid], now, n)
+                if day >= typing_start:
+                    typing.append(_typing_hour(rng, epoch_hour(now), presses))
+
+        nxt = day + datetime.timedelta(days=1)
+        if nxt.month != day.month or nxt > today:
+            with engine.begin() as conn:
+                apply_delta(conn, delta)
+                rollup(conn)
+                save_hours(conn, typing)
+            events += delta.events
+            delta = StatsDelta()
+            typing = []
+        day = nxt
+
+    # 按键转移只有全部历史的累计，按两键频率之积一次写入
+    delta = StatsDelta()
+    for _, a, wa in keys:
+        for _, b, wb in keys:
+            n = int(events * wa * wb / key_total ** 2 * rng.uniform(0.5, 1.5))
+            if n:
+                delta.add_bigram((a << 8) | b, n)
+    with engine.begin() as conn:
+        apply_delta(conn, delta)
+
+    retention = Retention(engine, load_retention({"batch_size": 100_000}))
+    expired = retention.run_once(datetime.datetime.combine(today, datetime.time(12)))
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"events": events, "seconds": round(time.perf_counter() - started, 2), "retention": expired}
+
+
+def _db_path(db_dir: str, years: int, seed: int, today: datetime.date) -> str:
+    return os.path.join(db_dir, f"seed-{years}y-s{seed}-{today:%Y%m%d}.db")
+
+
+async def _measure(client, method: str, path: str, params: Dict[str, Any], iterations: int,
+                   clear_cache) -> Dict[str, Any]:
+    samples: List[int] = []
+    status = size = None
+    for _ in range(iterations):
+        if clear_cache is not None:
+            clear_cache()
+        t0 = time.perf_counter_ns()
+        if method == "GET":
+            resp = await client.get(path, params=params)
+        else:
+            resp = await client.post(path, content=params["body"], headers={"content-type": "application/json"})
+        samples.append(time.perf_counter_ns() - t0)
+        status, size = resp.status_code, len(resp.content)
+    lat = latency_summary(samples)
+    return {
+        "status": status,
+        "bytes": size,
+        "p50_ms": round(lat["p50_us"] / 1000, 3),
+        "p99_ms": round(lat["p99_us"] / 1000, 3),
+        "mean_ms": round(lat["mean_us"] / 1000, 3),
+        "req_per_sec": round(1e6 / lat["mean_us"], 1) if lat["mean_us"] else None,
+    }
+
+
+async def _run_routes(app_module, years: int, iterations: int) -> List[Dict[str, Any]]:
+    import httpx
+
+    from fastapi.routing import APIRoute
+
+    app = app_module.app
+    clear = app_module.response_cache.clear
+    results: List[Dict[str, Any]] = []
+    covered = set()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path, params in GET_ROUTES:
+            covered.add(("GET", path))
+            query = "&".join(f"{k}={v}" for k, v in params.items())
+            rec = {"bench": "route", "years": years, "method": "GET", "route": path + (f"?{query}" if query else "")}
+            rec["uncached"] = await _measure(client, "GET", path, params, iterations, clear)
+            await client.get(path, params=params)
+            rec["cached"] = await _measure(client, "GET", path, params, iterations * 4, None)
+            results.append(rec)
+            emit(rec)
+
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        posts = [
+            ("/key_events", json.dumps({"key_name": "a", "virtual_key_code": 65})),
+            ("/key_events/batch", json.dumps([
+                {"key_name": "a", "virtual_key_code": 65 + i % 26, "timestamp": now} for i in range(POST_BATCH_EVENTS)
+            ])),
+        ]
+        for path, body in posts:
+            covered.add(("POST", path))
+            rec = {"bench": "route", "years": years, "method": "POST", "route": path,
+                   "write": await _measure(client, "POST", path, {"body": body}, iterations, None)}
+            results.append(rec)
+            emit(rec)
+
+    uncovered = sorted(
+        f"{m} {r.path}" for r in app.routes if isinstance(r, APIRoute) and r.path not in SKIPPED_ROUTES
+        for m in r.methods if (m, r.path) not in covered
+    )
+    if uncovered:
+        print(f"[WARN] 以下路由没有基准用例: {', '.join(uncovered)}")
+    return results
+
+
+def run(years: int, seed: int, iterations: int, db_dir: str, reseed: bool) -> List[Dict[str, Any]]:
+    today = datetime.date.today()
+    os.makedirs(db_dir, exist_ok=True)
+    path = _db_path(db_dir, years, seed, today)
+    if reseed:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    fresh = not os.path.exists(path)
+
+    # server.app 在导入时按环境变量打开数据库，因此每个进程只测一个库
+    os.environ[DB_ENV] = path
+    app_module = importlib.import_module("server.app")
+
+    results: List[Dict[str, Any]] = []
+    if fresh:
+        info = seed_database(app_module.engine, years, seed, today)
+        # 灌库绕过了写入监听，按键排名在导入时载入的是空库，这里重新载入
+        app_module.key_ranking.seed_from_db(app_module.read_engine, 0)
+        rec = {"bench": "seed", "years": years, **info}
+        results.append(rec)
+        emit(rec)
+
+    results.append({"bench": "database", "years": years, "bytes": os.path.getsize(path),
+                    "hourly_key_rows": _count(app_module.engine, "hourly_key_stats"),
+                    "daily_rows": _count(app_module.engine, "daily_activity_stats")})
+    emit(results[-1])
+    results.extend(asyncio.run(_run_routes(app_module, years, iterations)))
+    return results
+
+
+def _count(engine, table: str) -> int:
+    with engine.connect() as conn:
+        return int(conn.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar() or 0)
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="FastAPI 路由基准")
+    ap.add_argument("--years", type=int, default=1, help="灌入多少年的合成数据")
+    ap.add_argument("--seed", type=int, default=1, help="随机种子")
+    ap.add_argument("--iterations", type=int, default=20, help="每个路由不走缓存的请求次数（缓存命中测 4 倍次数）")
+    ap.add_argument("--db-dir", default=DEFAULT_DB_DIR, help="合成数据库的缓存目录")
+    ap.add_argument("--reseed", action="store_true", help="忽略已缓存的数据库，重新生成")
+    ap.add_argument("--out", help="把结果写入 JSON 文件")
+    args = ap.parse_args(argv)
+
+    results = run(max(1, args.years), args.seed, max(1, args.iterations), args.db_dir, args.reseed)
+    if args.out:
+        write_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-common.py
+@Description : 基准脚本共用：分位数、运行环境信息、结果文件读写
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# server.app 读取该环境变量决定数据库文件，基准测试不碰 key_events.db
+DB_ENV = "TRACEBOARD_DB"
+
+RESULT_FORMAT = 1
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """已排序序列的线性插值分位数（q 为 0..100）"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def latency_summary(samples_ns: List[int]) -> Dict[str, float]:
+    """纳秒样本 -> 微秒的 p50 / p99 / max / mean"""
+    if not samples_ns:
+        return {"n": 0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0, "mean_us": 0.0}
+    ordered = sorted(samples_ns)
+    return {
+        "n": len(ordered),
+        "p50_us": round(percentile(ordered, 50) / 1000, 3),
+        "p99_us": round(percentile(ordered, 99) / 1000, 3),
+        "max_us": round(ordered[-1] / 1000, 3),
+        "mean_us": round(sum(ordered) / len(ordered) / 1000, 3),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                             capture_output=True, text=True, timeout=5)
+        rev = out.stdout.strip()
+        if rev:
+            dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                                   capture_output=True, text=True, timeout=5).stdout.strip()
+            return rev + ("-dirty" if dirty else "")
+    except Exception:
+        pass
+    return None
+
+
+def environment() -> Dict[str, Any]:
+    """结果文件里附带的运行环境，比较分支时用来确认条件一致"""
+    import sqlite3
+
+    info: Dict[str, Any] = {
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
+    for mod in ("numpy", "orjson"):
+        try:
+            info[mod] = __import__(mod).__version__
+        except Exception:
+            info[mod] = None
+    return info
+
+
+def emit(record: Dict[str, Any]) -> None:
+    """每条结果一行 JSON 打到标准输出，便于 run_suite 收集或直接重定向"""
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def write_results(path: str, results: List[Dict[str, Any]], argv: Optional[List[str]] = None) -> None:
+    doc = {"format": RESULT_FORMAT, "env": environment(), "argv": argv or sys.argv[1:], "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=1)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-run_suite.py
+@Description : 依次运行采集基准与 1 / 5 / 10 年数据下的路由基准，汇总成一个 JSON 结果文件，并可与另一分支的结果对比
+
+用法（在项目根目录）：
+    python -m bench.run_suite --out bench-main.json
+    git checkout my-branch && python -m bench.run_suite --out bench-branch.json --compare bench-main.json
+    python -m bench.run_suite --compare bench-main.json bench-branch.json   # 只对比两个已有结果
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench.common import PROJECT_ROOT, load_results, write_results
+
+DEFAULT_YEARS = (1, 5, 10)
+
+# 对比时关注的指标：(记录类型, 字段路径, 数值越大越好)
+METRICS: List[Tuple[str, str, bool]] = [
+    ("ingest", "events_per_sec", True),
+    ("ingest", "callback_latency.p50_us", False),
+    ("ingest", "callback_latency.p99_us", False),
+    ("ingest", "commits_per_sec", True),
+    ("route", "uncached.p50_ms", False),
+    ("route", "uncached.p99_ms", False),
+    ("route", "cached.p50_ms", False),
+    ("route", "write.p50_ms", False),
+]
+
+
+def _run_module(module: str, args: List[str]) -> List[Dict[str, Any]]:
+    """每个基准在独立进程中运行（server.app 在导入时绑定数据库），收集其标准输出的 JSON 行"""
+    cmd = [sys.executable, "-m", module] + args
+    print(f"▶ {' '.join(cmd[1:])}", file=sys.stderr)
+    proc = subprocess.run(cmd, cwd=PROJECT_ROOT, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+    records = []
+    for line in proc.stdout.splitlines():
+        if line.startswith("{"):
+            records.append(json.loads(line))
+        else:
+            print(line, file=sys.stderr)
+    if proc.returncode != 0:
+        print(f"❌ {module} 退出码 {proc.returncode}", file=sys.stderr)
+    return records
+
+
+def _record_key(rec: Dict[str, Any]) -> Optional[str]:
+    if rec.get("bench") == "ingest":
+        return "ingest"
+    if rec.get("bench") == "route":
+        return f"{rec['years']}y {rec['method']} {rec['route']}"
+    return None
+
+
+def _get(rec: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = rec
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """逐项对比两次结果；change 为相对变化，better 表示是否向好的方向变化"""
+    base_by_key = {_record_key(r): r for r in base["results"] if _record_key(r)}
+    rows = []
+    for rec in head["results"]:
+        key = _record_key(rec)
+        old = base_by_key.get(key)
+        if old is None:
+            continue
+        for kind, path, higher_is_better in METRICS:
+            if rec.get("bench") != kind:
+                continue
+            a, b = _get(old, path), _get(rec, path)
+            if a is None or b is None or not a:
+                continue
+            change = (b - a) / a
+            rows.append({"key": key, "metric": path, "base": a, "head": b, "change": round(change, 4),
+                         "better": change > 0 if higher_is_better else change < 0})
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]], base_env: Dict[str, Any], head_env: Dict[str, Any],
+                     threshold: float) -> None:
+    print(f"基准: {base_env.get('git')}  对比: {head_env.get('git')}")
+    for field in ("python", "sqlite", "numpy", "orjson", "platform"):
+        if base_env.get(field) != head_env.get(field):
+            print(f"ℹ️ 运行环境不同 {field}: {base_env.get(field)} -> {head_env.get(field)}")
+    width = max((len(r["key"]) for r in rows), default=10)
+    for r in rows:
+        mark = "  "
+        if abs(r["change"]) >= threshold:
+            mark = "✅" if r["better"] else "❌"
+        print(f"{mark} {r['key']:<{width}}  {r['metric']:<24} {r['base']:>12,.3f} -> {r['head']:>12,.3f}  "
+              f"{r['change'] * 100:+7.1f}%")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="运行全部基准并输出机器可读的结果")
+    ap.add_argument("--out", default=os.path.join(PROJECT_ROOT, "bench-results.json"), help="结果 JSON 文件")
+    ap.add_argument("--years", default=",".join(map(str, DEFAULT_YEARS)), help="路由基准使用的数据年数，逗号分隔")
+    ap.add_argument("--events", type=int, default=200_000, help="采集基准的事件数")
+    ap.add_argument("--iterations", type=int, default=20, help="路由基准每个路由的请求次数")
+    ap.add_argument("--db-dir", help="合成数据库的缓存目录（默认见 bench_routes）")
+    ap.add_argument("--compare", nargs="+", metavar="RESULT",
+                    help="一个文件：与本次结果对比；两个文件：只对比这两个已有结果")
+    ap.add_argument("--threshold", type=float, default=0.05, help="对比时标记变化的相对幅度")
+    args = ap.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        base, head = load_results(args.compare[0]), load_results(args.compare[1])
+        print_comparison(compare(base, head), base["env"], head["env"], args.threshold)
+        return
+
+    results = _run_module("bench.bench_ingest", ["--events", str(args.events)])
+    for years in (int(y) for y in args.years.split(",") if y.strip()):
+        route_args = ["--years", str(years), "--iterations", str(args.iterations)]
+        if args.db_dir:
+            route_args += ["--db-dir", args.db_dir]
+        results += _run_module("bench.bench_routes", route_args)
+
+    write_results(args.out, results)
+    print(f"✅ 已写入 {args.out}（{len(results)} 条结果）", file=sys.stderr)
+
+    if args.compare:
+        base, head = load_results(args.compare[0]), load_results(args.out)
+        print_comparison(compare(base, head), base["env"], head["env"], args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-bigrams.py
+@Description : 按键转移（bigram）：相邻两次计数按下组成 (prev_vk << 8) | vk 的整数键
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+from settings import get_section
+
+DEFAULT_MAX_GAP = 2.0   # 秒：两次按下间隔超过该值不算转移（停顿后重新开始）
+
+# 矩阵按 256 × 256 存放，超出单字节的键码（非 Windows 平台的部分按键）不参与统计
+VK_LIMIT = 256
+
+
+def load_bigram_config() -> Dict[str, object]:
+    cfg = get_section("bigrams")
+    try:
+        max_gap = float(cfg.get("max_gap", DEFAULT_MAX_GAP))
+    except (TypeError, ValueError):
+        max_gap = DEFAULT_MAX_GAP
+    return {"enabled": bool(cfg.get("enabled", True)), "max_gap": max(0.0, max_gap)}
+
+
+def pack(prev_vk: int, vk: int) -> int:
+    return (prev_vk << 8) | vk
+
+
+def unpack(pair: int):
+    return pair >> 8, pair & 0xFF
+
+
+class BigramTracker:
+    """记住上一次计数按下的键与时间；监听器与日志回放共用，保证规则一致"""
+
+    __slots__ = ("_max_gap_ms", "_prev", "_prev_ms")
+
+    def __init__(self, max_gap: float = DEFAULT_MAX_GAP):
+        self._max_gap_ms = int(max_gap * 1000)
+        self._prev = -1
+        self._prev_ms = 0
+
+    def step(self, vk: int, ms: int) -> Optional[int]:
+        """一次计数按下；与上一次构成转移时返回打包后的键"""
+        prev, prev_ms = self._prev, self._prev_ms
+        if vk >= VK_LIMIT:
+            self._prev = -1
+            return None
+        self._prev, self._prev_ms = vk, ms
+        if prev < 0 or ms - prev_ms > self._max_gap_ms:
+            return None
+        return (prev << 8) | vk
+
+    def reset(self) -> None:
+        """队列溢出合并的按下无法确定先后，从下一次按下重新开始"""
+        self._prev = -1
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-buffer.py
+@Description : 按键统计的内存写回缓冲（write-behind），由后台线程批量落库
+"""
+
+from __future__ import annotations
+
+import datetime
+import threading
+from typing import Callable, Optional
+
+from storage import StatsDelta
+
+DEFAULT_FLUSH_INTERVAL = 3.0     # 秒
+DEFAULT_FLUSH_THRESHOLD = 2000   # 累计事件数达到该值时提前落库
+
+
+class StatsBuffer:
+    """
+    线程安全的增量缓冲：
+    - 调用方（键盘监听）只做内存计数
+    - 后台线程按时间间隔或事件数阈值，把整批增量在一个事务里写入数据库
+    """
+
+    def __init__(self, writer: Callable[[StatsDelta], None],
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 flush_threshold: int = DEFAULT_FLUSH_THRESHOLD):
+        self._writer = writer
+        self.flush_interval = max(0.05, float(flush_interval))
+        self.flush_threshold = max(1, int(flush_threshold))
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._delta = StatsDelta()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_key(self, key_name: str, vk: int, now: datetime.datetime, n: int = 1) -> None:
+        with self._lock:
+            self._delta.add_key(key_name, vk, now, n)
+            full = self._delta.events >= self.flush_threshold
+        if full:
+            self._wakeup.set()
+
+    def add_hotkey(self, hotkey_id: str, display_name: str, now: datetime.datetime) -> None:
+        with self._lock:
+            self._delta.add_hotkey(hotkey_id, display_name, now)
+            full = self._delta.events >= self.flush_threshold
+        if full:
+            self._wakeup.set()
+
+    def add_bigram(self, pair: int) -> None:
+        with self._lock:
+            self._delta.add_bigram(pair)
+
+    def pending(self) -> int:
+        return self._delta.events
+
+    def flush(self) -> int:
+        """把当前增量写入数据库，返回写入的事件数；失败时增量并回缓冲，下次重试"""
+        with self._flush_lock:
+            with self._lock:
+                delta, self._delta = self._delta, StatsDelta()
+            if not delta.events:
+                return 0
+            try:
+                self._writer(delta)
+            except Exception as e:
+                print(f"Error flushing key stats: {e}")
+                with self._lock:
+                    delta.merge(self._delta)
+                    self._delta = delta
+                return 0
+            return delta.events
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="stats-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止后台线程并做最后一次落库（退出程序时调用）"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+
+if __name__ == '__main__':
+    pass
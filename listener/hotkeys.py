@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-hotkeys.py
+@Description : 快捷键定义与预编译匹配表（触发键 vk -> [(修饰键位掩码, id, 显示名)]）
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from settings import get_section
+
+MOD_VK: Dict[str, Tuple[int, ...]] = {
+    "CTRL": (162, 163),   # VK_LCONTROL / VK_RCONTROL
+    "SHIFT": (160, 161),  # VK_LSHIFT / VK_RSHIFT
+    "ALT": (164, 165),    # VK_LMENU / VK_RMENU
+    "WIN": (91, 92),      # VK_LWIN / VK_RWIN
+}
+
+# 逻辑修饰键位：CTRL=1, SHIFT=2, ALT=4, WIN=8
+MOD_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(MOD_VK)}
+
+# 每个物理修饰键（区分左右）占一位；按下状态最多 8 位，可以直接查表换算成逻辑掩码
+_VK_BIT: Dict[int, int] = {}
+_VK_BIT_MOD: List[int] = []
+for _name, _vks in MOD_VK.items():
+    for _vk in _vks:
+        _VK_BIT[_vk] = 1 << len(_VK_BIT_MOD)
+        _VK_BIT_MOD.append(MOD_BITS[_name])
+
+_LOGICAL: List[int] = []
+for _state in range(1 << len(_VK_BIT_MOD)):
+    _mask = 0
+    for _i, _bit in enumerate(_VK_BIT_MOD):
+        if _state & (1 << _i):
+            _mask |= _bit
+    _LOGICAL.append(_mask)
+
+BUILTIN_HOTKEYS: List[Dict[str, object]] = [
+    {"hotkey_id": "CTRL+C", "display_name": "Ctrl + C（复制）", "mods": ["CTRL"], "key_vk": 67},
+    {"hotkey_id": "CTRL+V", "display_name": "Ctrl + V（粘贴）", "mods": ["CTRL"], "key_vk": 86},
+    {"hotkey_id": "CTRL+X", "display_name": "Ctrl + X（剪切）", "mods": ["CTRL"], "key_vk": 88},
+    {"hotkey_id": "CTRL+Z", "display_name": "Ctrl + Z（撤销）", "mods": ["CTRL"], "key_vk": 90},
+    {"hotkey_id": "CTRL+Y", "display_name": "Ctrl + Y（重做）", "mods": ["CTRL"], "key_vk": 89},
+    {"hotkey_id": "CTRL+S", "display_name": "Ctrl + S（保存）", "mods": ["CTRL"], "key_vk": 83},
+    {"hotkey_id": "CTRL+F", "display_name": "Ctrl + F（查找）", "mods": ["CTRL"], "key_vk": 70},
+    {"hotkey_id": "CTRL+A", "display_name": "Ctrl + A（全选）", "mods": ["CTRL"], "key_vk": 65},
+    {"hotkey_id": "CTRL+W", "display_name": "Ctrl + W（关闭标签/窗口）", "mods": ["CTRL"], "key_vk": 87},
+    {"hotkey_id": "CTRL+T", "display_name": "Ctrl + T（新建标签）", "mods": ["CTRL"], "key_vk": 84},
+
+    {"hotkey_id": "ALT+TAB", "display_name": "Alt + Tab（切换窗口）", "mods": ["ALT"], "key_vk": 9},
+    {"hotkey_id": "ALT+F4", "display_name": "Alt + F4（关闭窗口）", "mods": ["ALT"], "key_vk": 115},
+
+    {"hotkey_id": "WIN+D", "display_name": "Win + D（显示桌面）", "mods": ["WIN"], "key_vk": 68},
+    {"hotkey_id": "WIN+E", "display_name": "Win + E（资源管理器）", "mods": ["WIN"], "key_vk": 69},
+    {"hotkey_id": "WIN+L", "display_name": "Win + L（锁屏）", "mods": ["WIN"], "key_vk": 76},
+
+    {"hotkey_id": "CTRL+SHIFT+ESC", "display_name": "Ctrl + Shift + Esc（任务管理器）", "mods": ["CTRL", "SHIFT"], "key_vk": 27},
+    {"hotkey_id": "CTRL+ALT+DEL", "display_name": "Ctrl + Alt + Del（安全选项）", "mods": ["CTRL", "ALT"], "key_vk": 46},
+]
+
+# config.toml 中可以用 key = "T" / "F5" / "ESC" 代替 key_vk
+_KEY_NAMES: Dict[str, int] = {
+    "TAB": 9, "ENTER": 13, "ESC": 27, "SPACE": 32,
+    "PAGEUP": 33, "PAGEDOWN": 34, "END": 35, "HOME": 36,
+    "LEFT": 37, "UP": 38, "RIGHT": 39, "DOWN": 40,
+    "INSERT": 45, "DEL": 46, "DELETE": 46, "BACKSPACE": 8,
+}
+_KEY_NAMES.update({chr(c): c for c in range(ord("A"), ord("Z") + 1)})
+_KEY_NAMES.update({chr(c): c for c in range(ord("0"), ord("9") + 1)})
+_KEY_NAMES.update({f"F{i}": 111 + i for i in range(1, 25)})
+
+HotkeyIndex = Dict[int, List[Tuple[int, str, str]]]
+
+
+def vk_modifier_bit(vk: int) -> int:
+    """物理修饰键对应的位，非修饰键返回 0"""
+    return _VK_BIT.get(vk, 0)
+
+
+def logical_mods(vk_state: int) -> int:
+    """物理修饰键按下状态 -> 逻辑修饰键掩码（左右任一按下即算按下）"""
+    return _LOGICAL[vk_state]
+
+
+def _parse_def(d: Dict[str, object]) -> Optional[Tuple[int, int, str, str]]:
+    """返回 (触发键 vk, 修饰键掩码, id, 显示名)，定义无效时返回 None"""
+    try:
+        if "key_vk" in d:
+            vk = int(d["key_vk"])
+        else:
+            vk = _KEY_NAMES[str(d["key"]).upper()]
+        mods = d.get("mods", [])
+        if not isinstance(mods, list):
+            return None
+        mask = 0
+        for m in mods:
+            mask |= MOD_BITS[str(m).upper()]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    hotkey_id = str(d.get("hotkey_id") or d.get("id") or "")
+    if not hotkey_id:
+        return None
+    return vk, mask, hotkey_id, str(d.get("display_name") or d.get("name") or hotkey_id)
+
+
+def compile_hotkeys(defs: Iterable[Dict[str, object]]) -> HotkeyIndex:
+    """
+    只在加载时解析一次。同一 id 重复定义时后者覆盖前者，
+    因此配置文件里的同名快捷键可以改写内置定义的按键或显示名。
+    """
+    by_id: Dict[str, Tuple[int, int, str, str]] = {}
+    for d in defs:
+        parsed = _parse_def(d) if isinstance(d, dict) else None
+        if parsed is None:
+            print(f"[WARN] 忽略无效的快捷键定义: {d!r}")
+            continue
+        by_id[parsed[2]] = parsed
+
+    index: HotkeyIndex = {}
+    for vk, mask, hotkey_id, display in by_id.values():
+        index.setdefault(vk, []).append((mask, hotkey_id, display))
+    return index
+
+
+def load_hotkey_defs() -> List[Dict[str, object]]:
+    """内置快捷键 + config.toml 的 [hotkeys] 段（builtin = false 可关闭内置定义）"""
+    cfg = get_section("hotkeys")
+    defs: List[Dict[str, object]] = list(BUILTIN_HOTKEYS) if cfg.get("builtin", True) else []
+    custom = cfg.get("custom", [])
+    if isinstance(custom, list):
+        defs.extend(custom)
+    else:
+        print("[WARN] hotkeys.custom 应为数组，已忽略")
+    return defs
+
+
+def match(index: HotkeyIndex, trigger_vk: int, mods: int) -> List[Tuple[str, str]]:
+    """
+    一次字典查找 + 整数比较；与原逻辑一致，按下了额外的修饰键也算命中
+    返回：(hotkey_id, display_name)
+    """
+    candidates = index.get(trigger_vk)
+    if not candidates:
+        return []
+    return [(hid, display) for mask, hid, display in candidates if mods & mask == mask]
+
+
+if __name__ == '__main__':
+    pass
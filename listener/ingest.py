@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-ingest.py
+@Description : 键盘钩子回调与统计逻辑之间的有界事件队列
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+KIND_PRESS = 0
+KIND_RELEASE = 1
+
+OVERFLOW_DROP = "drop"          # 队列满时丢弃按下事件并计数
+OVERFLOW_COALESCE = "coalesce"  # 队列满时把按下事件合并成按键计数，稍后补记
+
+DEFAULT_CAPACITY = 65536
+
+# (vk, key_name, monotonic_ts, kind)
+KeyEvent = Tuple[int, str, float, int]
+
+
+class EventRing:
+    """
+    单生产者 / 单消费者的有界队列。
+    deque 的 append / popleft 在 CPython 中是原子操作，常规路径无需加锁；
+    只有溢出合并（coalesce）时才用一把锁保护合并计数。
+    合并模式下生产者自己记录按下状态：溢出时仍处于按下状态的键是长按的自动重复，与消费者一样只计一次；
+    合并计数按本地时间的小时分开，各自保留时间戳，补记时落在事件自己的小时里。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, overflow: str = OVERFLOW_DROP,
+                 wall_offset: float = 0.0):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_COALESCE):
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.capacity = max(1, int(capacity))
+        self.overflow = overflow
+
+        self._q: deque = deque()
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_watermark = 0
+
+        self._coalesce = overflow == OVERFLOW_COALESCE
+        self._wall_offset = wall_offset                 # monotonic -> Unix 时间，见 monotonic_to_wall_offset
+        self._down: set = set()                         # 生产者视角下按住的 vk，只由钩子线程读写
+        self._coalesce_lock = threading.Lock()
+        # (vk, key_name, 本地时间的 (年, 月, 日, 时)) -> [次数, 最后一次的 monotonic 时间]
+        self._coalesced_presses: Dict[Tuple[int, str, tuple], List] = {}
+
+        self._consumer_idle = False
+        self._wakeup = threading.Event()
+
+    def push(self, event: KeyEvent) -> bool:
+        """钩子线程调用，O(1)，永不阻塞；返回事件是否按原样入队"""
+        q = self._q
+        if event[3] == KIND_PRESS:
+            if len(q) >= self.capacity:
+                self._overflow(event)
+                return False
+            if self._coalesce:
+                self._down.add(event[0])
+        elif self._coalesce:
+            # 松开事件一律入队，否则消费者会认为按键一直处于按下状态
+            self._down.discard(event[0])
+
+        q.append(event)
+        if self._consumer_idle:
+            self._wakeup.set()
+        return True
+
+    def _overflow(self, event: KeyEvent) -> None:
+        if not self._coalesce:
+            self.dropped += 1
+            return
+        vk, key_name, ts, _ = event
+        if vk in self._down:
+            return  # 长按的自动重复
+        self._down.add(vk)
+        key = (vk, key_name, time.localtime(ts + self._wall_offset)[:4])
+        with self._coalesce_lock:
+            entry = self._coalesced_presses.get(key)
+            if entry is None:
+                self._coalesced_presses[key] = [1, ts]
+            else:
+                entry[0] += 1
+                entry[1] = ts
+        self.coalesced += 1
+
+    def drain(self, max_items: int = 4096) -> List[KeyEvent]:
+        q = self._q
+        depth = len(q)
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        out: List[KeyEvent] = []
+        popleft = q.popleft
+        for _ in range(min(depth, max_items)):
+            out.append(popleft())
+        return out
+
+    def take_coalesced(self) -> List[Tuple[int, str, int, float]]:
+        """取走合并计数：[(vk, key_name, 次数, 该小时内最后一次的 monotonic 时间)]"""
+        if not self._coalesced_presses:
+            return []
+        with self._coalesce_lock:
+            presses, self._coalesced_presses = self._coalesced_presses, {}
+        return [(vk, key_name, n, ts) for (vk, key_name, _), (n, ts) in presses.items()]
+
+    def wait(self, timeout: float) -> None:
+        """消费者在队列为空时调用，直到有新事件或超时"""
+        self._consumer_idle = True
+        if not self._q:
+            self._wakeup.wait(timeout)
+        self._consumer_idle = False
+        self._wakeup.clear()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def depth(self) -> int:
+        return len(self._q)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "depth": len(self._q),
+            "capacity": self.capacity,
+            "high_watermark": self.high_watermark,
+            "overflow": self.overflow,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class IngestWorker:
+    """
+    消费者线程：从 EventRing 取出事件，依次交给 handler 处理。
+    合并计数（coalesce）的按下事件交给 coalesced_handler（不参与快捷键判断）。
+    队列取空、即将等待时调用 idle_handler（例如把日志缓冲写盘）。
+    """
+
+    def __init__(self, ring: EventRing,
+                 handler: Callable[[KeyEvent], None],
+                 coalesced_handler: Optional[Callable[[int, str, int, float], None]] = None,
+                 idle_wait: float = 0.5,
+                 idle_handler: Optional[Callable[[], None]] = None):
+        self.ring = ring
+        self._handler = handler
+        self._coalesced_handler = coalesced_handler
+        self._idle_wait = idle_wait
+        self._idle_handler = idle_handler
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.processed = 0
+
+    def drain_once(self) -> int:
+        n = 0
+        while True:
+            batch = self.ring.drain()
+            if not batch:
+                break
+            for ev in batch:
+                try:
+                    self._handler(ev)
+                except Exception as e:
+                    print(f"Error handling key event: {e}")
+            n += len(batch)
+
+        presses = self.ring.take_coalesced()
+        if presses and self._coalesced_handler is not None:
+            for vk, key_name, cnt, ts in presses:
+                try:
+                    self._coalesced_handler(vk, key_name, cnt, ts)
+                except Exception as e:
+                    print(f"Error handling coalesced key events: {e}")
+
+        self.processed += n
+        return n
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            if not self.drain_once():
+                if self._idle_handler is not None:
+                    try:
+                        self._idle_handler()
+                    except Exception as e:
+                        print(f"Error in ingest idle handler: {e}")
+                self.ring.wait(self._idle_wait)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="key-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止消费线程，并把队列里剩余的事件处理完"""
+        self._stopped.set()
+        self.ring.wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.drain_once()
+
+
+def monotonic_to_wall_offset() -> float:
+    """time.monotonic() 与 time.time() 的差值，用于把事件时间戳换算成本地时间"""
+    return time.time() - time.monotonic()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-journal.py
+@Description : 可选的原始按键日志：定长二进制记录追加写入按大小轮转的分段文件，可 mmap 回放
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from settings import PROJECT_ROOT, get_section
+
+# 分段文件头：magic、格式版本、单条记录字节数、本段基准时间（Unix 毫秒）
+HEADER = struct.Struct("<4sHHQ")
+MAGIC = b"TBJ1"
+VERSION = 1
+
+# 记录：相对本段基准时间的毫秒数（u32）、虚拟键码（u16）、标志位（u8），共 7 字节
+RECORD = struct.Struct("<IHB")
+MAX_DELTA_MS = 0xFFFFFFFF   # 约 49.7 天，超过后必须轮转
+
+FLAG_PRESS = 0x01       # 置位为按下，否则为松开
+FLAG_COALESCED = 0x02   # 队列溢出后补记的按下事件：只计数，不参与快捷键判断
+
+SEGMENT_SUFFIX = ".tbj"
+NAMES_FILE = "names.json"   # vk -> 最近一次的 key_name，记录里不存名称
+
+DEFAULT_JOURNAL: Dict[str, Any] = {
+    "enabled": False,
+    "dir": "journal",
+    "segment_bytes": 8 * 1024 * 1024,
+    "flush_bytes": 64 * 1024,
+    "flush_interval": 1.0,
+}
+
+# (Unix 毫秒, vk, flags)
+JournalRecord = Tuple[int, int, int]
+
+
+def load_journal_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    cfg = dict(DEFAULT_JOURNAL)
+    cfg.update(get_section("journal"))
+    if overrides:
+        cfg.update(overrides)
+    cfg["enabled"] = bool(cfg["enabled"])
+    path = str(cfg["dir"])
+    cfg["dir"] = path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+    for key in ("segment_bytes", "flush_bytes", "flush_interval"):
+        try:
+            cfg[key] = type(DEFAULT_JOURNAL[key])(cfg[key])
+        except (TypeError, ValueError):
+            print(f"[WARN] journal.{key} = {cfg[key]!r} 无效，使用 {DEFAULT_JOURNAL[key]}")
+            cfg[key] = DEFAULT_JOURNAL[key]
+    cfg["segment_bytes"] = max(HEADER.size + RECORD.size, cfg["segment_bytes"])
+    return cfg
+
+
+class EventJournal:
+    """
+    只由消费者线程调用的追加写入器：记录先打包进内存缓冲，
+    累计 flush_bytes 或距上次写盘超过 flush_interval 秒时一次 write 落盘。
+    进程崩溃最多丢失最后一个缓冲区的事件；文件末尾的半条记录在读取时忽略。
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = DEFAULT_JOURNAL["segment_bytes"],
+                 flush_bytes: int = DEFAULT_JOURNAL["flush_bytes"],
+                 flush_interval: float = DEFAULT_JOURNAL["flush_interval"]):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_bytes = max(RECORD.size, flush_bytes)
+        self.flush_interval = flush_interval
+
+        self._file = None
+        self._base_ms = 0
+        self._size = 0
+        self._buf = bytearray()
+        self._last_flush = time.monotonic()
+
+        self.names: Dict[int, str] = load_names(directory)
+        self._names_dirty = False
+        self.records = 0
+        self.segments = 0
+
+    def _open_segment(self, ms: int) -> None:
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        # 同一毫秒内轮转时顺延，保证文件名唯一且按时间排序
+        while os.path.exists(segment_path(self.directory, ms)):
+            ms += 1
+        self._file = open(segment_path(self.directory, ms), "xb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, ms))
+        self._base_ms = ms
+        self._size = HEADER.size
+        self.segments += 1
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._write_buffer()
+            self._file.close()
+            self._file = None
+
+    def _write_buffer(self) -> None:
+        if self._buf:
+            self._file.write(self._buf)
+            self._file.flush()
+            self._buf.clear()
+        self._last_flush = time.monotonic()
+
+    def append(self, ms: int, vk: int, flags: int, key_name: str = "", count: int = 1) -> None:
+        """ms 为 Unix 毫秒；count > 1 时写入多条相同记录（溢出合并的按下事件）"""
+        if key_name and self.names.get(vk) != key_name:
+            self.names[vk] = key_name
+            self._names_dirty = True
+
+        size = RECORD.size * count
+        if (self._file is None
+                or self._size + size > self.segment_bytes
+                or ms - self._base_ms > MAX_DELTA_MS):
+            self._open_segment(ms)
+        record = RECORD.pack(max(ms - self._base_ms, 0), vk & 0xFFFF, flags)
+        self._buf += record if count == 1 else record * count
+        self._size += size
+        self.records += count
+
+        if len(self._buf) >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._write_buffer()
+        if self._names_dirty:
+            save_names(self.directory, self.names)
+            self._names_dirty = False
+
+    def close(self) -> None:
+        self.flush()
+        self._close_segment()
+
+
+def segment_path(directory: str, base_ms: int) -> str:
+    return os.path.join(directory, f"seg-{base_ms:013d}{SEGMENT_SUFFIX}")
+
+
+def list_segments(directory: str) -> List[str]:
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(SEGMENT_SUFFIX))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, n) for n in names]
+
+
+def load_names(directory: str) -> Dict[int, str]:
+    try:
+        with open(os.path.join(directory, NAMES_FILE), "r", encoding="utf-8") as f:
+            return {int(k): str(v) for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[WARN] 读取按键名称表失败: {e}")
+        return {}
+
+
+def save_names(directory: str, names: Dict[int, str]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, NAMES_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({str(k): v for k, v in sorted(names.items())}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def iter_segment(path: str) -> Iterator[JournalRecord]:
+    """mmap 整个分段，逐条解出 (Unix 毫秒, vk, flags)"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, record_size, base_ms = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                print(f"[WARN] 跳过无法识别的日志分段: {path}")
+                return
+            n = (size - HEADER.size) // RECORD.size
+            view = memoryview(mm)[HEADER.size:HEADER.size + n * RECORD.size]
+            records = RECORD.iter_unpack(view)
+            try:
+                for rel, vk, flags in records:
+                    yield base_ms + rel, vk, flags
+            finally:
+                # 提前结束遍历时也要先释放对 mmap 的引用，否则无法关闭
+                del records
+                view.release()
+
+
+def iter_journal(directory: str, since_ms: Optional[int] = None,
+                 until_ms: Optional[int] = None) -> Iterator[JournalRecord]:
+    """按时间顺序遍历所有分段；[since_ms, until_ms) 之外的记录跳过"""
+    segments = list_segments(directory)
+    for i, path in enumerate(segments):
+        # 下一段的基准时间就是本段记录的上界
+        if since_ms is not None and i + 1 < len(segments) and _segment_base(segments[i + 1]) <= since_ms:
+            continue
+        if until_ms is not None and _segment_base(path) >= until_ms:
+            break
+        for record in iter_segment(path):
+            ms = record[0]
+            if since_ms is not None and ms < since_ms:
+                continue
+            if until_ms is not None and ms >= until_ms:
+                return
+            yield record
+
+
+def _segment_base(path: str) -> int:
+    return int(os.path.basename(path)[4:-len(SEGMENT_SUFFIX)])
+
+
+if __name__ == '__main__':
+    pass
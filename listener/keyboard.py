@@ -12,252 +12,148 @@
 from __future__ import annotations
 
 import datetime
+from time import monotonic
 from typing import Dict, List, Optional, Set, Tuple
 
 from pynput.keyboard import Key
 from pynput import keyboard
 
-DB_COMPONENTS_LOADED = False
-try:
-    from server.app import (
-        SessionLocal,
-        KeyTotalStats,
-        MonthlyKeyStats,
-        DailyActivityStats,
-        HourlyActivityStats,
-        HotkeyTotalStats,
-        HotkeyDailyStats,
-    )
-    DB_COMPONENTS_LOADED = True
-except Exception as e:
-    print(f"FATAL: 无法从 'server.app' 导入数据库组件: {e}")
-    print("键盘监听功能将无法保存数据！请确保在项目根目录运行。")
+from listener.bigrams import BigramTracker, load_bigram_config
+from listener.buffer import (
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_FLUSH_THRESHOLD,
+    StatsBuffer,
+)
+from listener.hotkeys import (
+    HotkeyIndex,
+    compile_hotkeys,
+    load_hotkey_defs,
+    logical_mods,
+    vk_modifier_bit,
+)
+from listener.hotkeys import match as match_hotkeys
+from listener.ingest import (
+    DEFAULT_CAPACITY,
+    KIND_PRESS,
+    KIND_RELEASE,
+    OVERFLOW_COALESCE,
+    OVERFLOW_DROP,
+    EventRing,
+    IngestWorker,
+    KeyEvent,
+    monotonic_to_wall_offset,
+)
+from listener.journal import FLAG_COALESCED, FLAG_PRESS, EventJournal, load_journal_config
+from listener.typing_speed import TypingAnalyzer, load_typing_config
+import metrics
+from settings import get_section
+from storage import StatsDelta, write_delta
+from storage.typingstats import save_hours
+
+# 数据库引擎在第一次落库时（落库线程中）才从 server.app 导入：钩子不必等 Web 框架、ORM 与建表完成，
+# 之前的按键都在内存缓冲里。导入失败后置为 False，不再缓冲
+DB_COMPONENTS_LOADED = True
+_engine = None
+
+
+def get_engine():
+    global _engine, DB_COMPONENTS_LOADED
+    if _engine is None:
+        try:
+            from server.app import engine
+        except Exception as e:
+            DB_COMPONENTS_LOADED = False
+            print(f"FATAL: 无法从 'server.app' 导入数据库组件: {e}")
+            print("键盘监听功能将无法保存数据！请确保在项目根目录运行。")
+            return None
+        _engine = engine
+    return _engine
 
 
 pressed_vks: Set[int] = set()
 _active_hotkeys: Set[str] = set()
 
-MOD_VK: Dict[str, Set[int]] = {
-    "CTRL": {162, 163},   # VK_LCONTROL / VK_RCONTROL
-    "SHIFT": {160, 161},  # VK_LSHIFT / VK_RSHIFT
-    "ALT": {164, 165},    # VK_LMENU / VK_RMENU
-    "WIN": {91, 92},      # VK_LWIN / VK_RWIN
-}
-
-HOTKEY_DEFS: List[Dict[str, object]] = [
-    {"hotkey_id": "CTRL+C", "display_name": "Ctrl + C（复制）", "mods": ["CTRL"], "key_vk": 67},
-    {"hotkey_id": "CTRL+V", "display_name": "Ctrl + V（粘贴）", "mods": ["CTRL"], "key_vk": 86},
-    {"hotkey_id": "CTRL+X", "display_name": "Ctrl + X（剪切）", "mods": ["CTRL"], "key_vk": 88},
-    {"hotkey_id": "CTRL+Z", "display_name": "Ctrl + Z（撤销）", "mods": ["CTRL"], "key_vk": 90},
-    {"hotkey_id": "CTRL+Y", "display_name": "Ctrl + Y（重做）", "mods": ["CTRL"], "key_vk": 89},
-    {"hotkey_id": "CTRL+S", "display_name": "Ctrl + S（保存）", "mods": ["CTRL"], "key_vk": 83},
-    {"hotkey_id": "CTRL+F", "display_name": "Ctrl + F（查找）", "mods": ["CTRL"], "key_vk": 70},
-    {"hotkey_id": "CTRL+A", "display_name": "Ctrl + A（全选）", "mods": ["CTRL"], "key_vk": 65},
-    {"hotkey_id": "CTRL+W", "display_name": "Ctrl + W（关闭标签/窗口）", "mods": ["CTRL"], "key_vk": 87},
-    {"hotkey_id": "CTRL+T", "display_name": "Ctrl + T（新建标签）", "mods": ["CTRL"], "key_vk": 84},
-
-    {"hotkey_id": "ALT+TAB", "display_name": "Alt + Tab（切换窗口）", "mods": ["ALT"], "key_vk": 9},
-    {"hotkey_id": "ALT+F4", "display_name": "Alt + F4（关闭窗口）", "mods": ["ALT"], "key_vk": 115},
-
-    {"hotkey_id": "WIN+D", "display_name": "Win + D（显示桌面）", "mods": ["WIN"], "key_vk": 68},
-    {"hotkey_id": "WIN+E", "display_name": "Win + E（资源管理器）", "mods": ["WIN"], "key_vk": 69},
-    {"hotkey_id": "WIN+L", "display_name": "Win + L（锁屏）", "mods": ["WIN"], "key_vk": 76},
-
-    {"hotkey_id": "CTRL+SHIFT+ESC", "display_name": "Ctrl + Shift + Esc（任务管理器）", "mods": ["CTRL", "SHIFT"], "key_vk": 27},
-    {"hotkey_id": "CTRL+ALT+DEL", "display_name": "Ctrl + Alt + Del（安全选项）", "mods": ["CTRL", "ALT"], "key_vk": 46},
-]
-
-
-def _mods_pressed(mods: List[str], current_pressed: Set[int]) -> bool:
-    for m in mods:
-        vks = MOD_VK.get(m)
-        if not vks:
-            return False
-        if not (current_pressed & vks):
-            return False
-    return True
-
-
-def _maybe_trigger_hotkeys(trigger_vk: int, current_pressed: Set[int]) -> List[Tuple[str, str]]:
+# 当前按下的物理修饰键（每个左右键一位），由消费者线程在按下 / 松开时维护
+_mod_state = 0
+
+HOTKEY_DEFS: List[Dict[str, object]] = load_hotkey_defs()
+HOTKEY_INDEX: HotkeyIndex = compile_hotkeys(HOTKEY_DEFS)
+
+
+def _maybe_trigger_hotkeys(trigger_vk: int, mods: int) -> List[Tuple[str, str]]:
     """
     只在“触发键”按下时判断，避免修饰键按下时误计数
     返回：(hotkey_id, display_name)
     """
-    fired: List[Tuple[str, str]] = []
-    for d in HOTKEY_DEFS:
-        if int(d["key_vk"]) != trigger_vk:
-            continue
-        mods = d.get("mods", [])
-        if not isinstance(mods, list):
-            continue
-        if _mods_pressed(mods, current_pressed):
-            fired.append((str(d["hotkey_id"]), str(d["display_name"])))
-    return fired
-
-def update_key_stats_in_db(key_name: str, virtual_key_code: int):
+    return match_hotkeys(HOTKEY_INDEX, trigger_vk, mods)
 
-    if not DB_COMPONENTS_LOADED:
+
+def _write_delta(delta: StatsDelta) -> None:
+    """后台线程调用：一次事务写入整批增量（过期数据由 storage.retention 在后台清理）"""
+    engine = get_engine()
+    if engine is None:
+        return
+    hours = typing_analyzer.take_pending() if typing_analyzer is not None else []
+    if not hours:
+        write_delta(engine, delta)
         return
+    try:
+        # 已结束的打字速度小时摘要随同这一批增量写入
+        write_delta(engine, delta, extra=lambda conn: save_hours(conn, hours))
+    except Exception:
+        typing_analyzer.restore_pending(hours)
+        raise
 
-    db = SessionLocal()
-    vk = int(virtual_key_code)
-    now = datetime.datetime.now()
-    current_month = now.strftime("%Y-%m")
-    today = now.strftime("%Y-%m-%d")
-    current_hour = now.strftime("%Y-%m-%d %H")
 
+def _save_typing() -> None:
+    """退出时：没有按键增量可搭载时单独写入剩余的打字速度摘要"""
+    hours = typing_analyzer.take_pending() if typing_analyzer is not None else []
+    engine = get_engine() if hours else None
+    if engine is None:
+        return
     try:
-        # 总计
-        total_stat = db.query(KeyTotalStats).filter(KeyTotalStats.virtual_key_code == vk).first()
-        if total_stat:
-            total_stat.total_count += 1
-            total_stat.last_updated = now
-            if key_name:
-                total_stat.key_name = key_name
-        else:
-            db.add(KeyTotalStats(
-                key_name=key_name,
-                virtual_key_code=vk,
-                total_count=1,
-                last_updated=now
-            ))
-
-        # 月度
-        monthly_stat = db.query(MonthlyKeyStats).filter(
-            MonthlyKeyStats.virtual_key_code == vk,
-            MonthlyKeyStats.stat_month == current_month
-        ).first()
-        if monthly_stat:
-            monthly_stat.monthly_count += 1
-            if key_name and not monthly_stat.key_name:
-                monthly_stat.key_name = key_name
-        else:
-            db.add(MonthlyKeyStats(
-                key_name=key_name,
-                virtual_key_code=vk,
-                stat_month=current_month,
-                monthly_count=1
-            ))
-
-        # 日活跃度
-        daily = db.query(DailyActivityStats).filter(DailyActivityStats.stat_date == today).first()
-        if daily:
-            daily.key_presses += 1
-            daily.last_updated = now
-        else:
-            db.add(DailyActivityStats(
-                stat_date=today,
-                key_presses=1,
-                hotkey_triggers=0,
-                last_updated=now
-            ))
-
-        # 最近24小时
-        hourly = db.query(HourlyActivityStats).filter(HourlyActivityStats.stat_hour == current_hour).first()
-        if hourly:
-            hourly.key_presses += 1
-            hourly.last_updated = now
-        else:
-            db.add(HourlyActivityStats(
-                stat_hour=current_hour,
-                key_presses=1,
-                hotkey_triggers=0,
-                last_updated=now
-            ))
-
-        try:
-            update_key_stats_in_db._gc_counter = getattr(update_key_stats_in_db, "_gc_counter", 0) + 1
-            if update_key_stats_in_db._gc_counter % 2000 == 0:
-                cutoff = (now - datetime.timedelta(days=10)).strftime("%Y-%m-%d %H")
-                db.query(HourlyActivityStats).filter(HourlyActivityStats.stat_hour < cutoff).delete(synchronize_session=False)
-        except Exception:
-            pass
-
-        db.commit()
+        with engine.begin() as conn:
+            save_hours(conn, hours)
     except Exception as e:
-        db.rollback()
-        print(f"Error updating key stats: {e}")
-    finally:
-        db.close()
+        print(f"[WARN] 打字速度摘要写入失败: {e}")
+
+
+def _load_buffer_config() -> Tuple[float, int]:
+    cfg = get_section("buffer")
+    try:
+        interval = float(cfg.get("flush_interval", DEFAULT_FLUSH_INTERVAL))
+        threshold = int(cfg.get("flush_threshold", DEFAULT_FLUSH_THRESHOLD))
+    except (TypeError, ValueError):
+        interval, threshold = DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_THRESHOLD
+    return interval, threshold
 
 
+stats_buffer = StatsBuffer(_write_delta, *_load_buffer_config())
 
-def update_hotkey_stats_in_db(hotkey_id: str, display_name: str):
+
+def update_key_stats_in_db(key_name: str, virtual_key_code: int, now: Optional[datetime.datetime] = None):
+    """只在内存里累加，由 stats_buffer 的后台线程批量落库"""
     if not DB_COMPONENTS_LOADED:
         return
+    stats_buffer.add_key(key_name, int(virtual_key_code), now or datetime.datetime.now())
 
-    db = SessionLocal()
-    now = datetime.datetime.now()
-    today = now.strftime("%Y-%m-%d")
-    current_hour = now.strftime("%Y-%m-%d %H")
 
-    try:
-        # hotkey 总计
-        total = db.query(HotkeyTotalStats).filter(HotkeyTotalStats.hotkey_id == hotkey_id).first()
-        if total:
-            total.total_count = (total.total_count or 0) + 1
-            total.last_updated = now
-            if display_name:
-                total.display_name = display_name
-        else:
-            db.add(HotkeyTotalStats(
-                hotkey_id=hotkey_id,
-                display_name=display_name,
-                total_count=1,
-                last_updated=now
-            ))
-
-        # hotkey 每日
-        daily_hot = db.query(HotkeyDailyStats).filter(
-            HotkeyDailyStats.hotkey_id == hotkey_id,
-            HotkeyDailyStats.stat_date == today
-        ).first()
-        if daily_hot:
-            daily_hot.daily_count = (daily_hot.daily_count or 0) + 1
-            daily_hot.last_triggered = now
-            if display_name:
-                daily_hot.display_name = display_name
-        else:
-            db.add(HotkeyDailyStats(
-                stat_date=today,
-                hotkey_id=hotkey_id,
-                daily_count=1,
-                display_name=display_name,
-                last_triggered=now
-            ))
-
-        # 日活跃度
-        daily = db.query(DailyActivityStats).filter(DailyActivityStats.stat_date == today).first()
-        if daily:
-            daily.hotkey_triggers += 1
-            daily.last_updated = now
-        else:
-            db.add(DailyActivityStats(
-                stat_date=today,
-                key_presses=0,
-                hotkey_triggers=1,
-                last_updated=now
-            ))
-
-        # 小时活跃度
-        hourly_hot = db.query(HourlyActivityStats).filter(HourlyActivityStats.stat_hour == current_hour).first()
-        if hourly_hot:
-            hourly_hot.hotkey_triggers += 1
-            hourly_hot.last_updated = now
-        else:
-            db.add(HourlyActivityStats(
-                stat_hour=current_hour,
-                key_presses=0,
-                hotkey_triggers=1,
-                last_updated=now
-            ))
-
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        print(f"Error updating hotkey stats: {e}")
-    finally:
-        db.close()
+def update_hotkey_stats_in_db(hotkey_id: str, display_name: str, now: Optional[datetime.datetime] = None):
+    if not DB_COMPONENTS_LOADED:
+        return
+    stats_buffer.add_hotkey(hotkey_id, display_name, now or datetime.datetime.now())
+
+
+def flush_stats():
+    """处理完队列中剩余事件，立即落库并停止后台线程（托盘退出时调用）"""
+    ingest_worker.stop()
+    if event_journal is not None:
+        event_journal.close()
+    if typing_analyzer is not None:
+        typing_analyzer.close(monotonic())
+    if DB_COMPONENTS_LOADED:
+        stats_buffer.stop()
+        _save_typing()
 
 
 def _extract_vk_and_name(key) -> Tuple[Optional[int], str]:
@@ -280,45 +176,179 @@ def _extract_vk_and_name(key) -> Tuple[Optional[int], str]:
     return vk, name
 
 
-def on_press(key):
+def _event_time(ts: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(ts + _WALL_OFFSET)
+
+
+def _event_ms(ts: float) -> int:
+    return int((ts + _WALL_OFFSET) * 1000)
+
+
+def _handle_event(event: KeyEvent) -> None:
+    """消费者线程：维护按下状态、判断快捷键并累加统计"""
+    global _mod_state
+    vk, key_name, ts, kind = event
+    mod_bit = vk_modifier_bit(vk)
+
+    if event_journal is not None:
+        # 原始事件（含长按重复）全部记录，回放时按同样的规则过滤
+        event_journal.append(_event_ms(ts), vk, FLAG_PRESS if kind == KIND_PRESS else 0, key_name)
+
+    if kind == KIND_RELEASE:
+        pressed_vks.discard(vk)
+        if mod_bit:
+            _mod_state &= ~mod_bit
+            _active_hotkeys.clear()
+        return
+
+    if vk in pressed_vks:
+        return
+
+    pressed_vks.add(vk)
+    _mod_state |= mod_bit
+    now = _event_time(ts)
+
+    update_key_stats_in_db(key_name, vk, now)
+    if typing_analyzer is not None:
+        typing_analyzer.observe(ts)
+    if bigram_tracker is not None and DB_COMPONENTS_LOADED:
+        pair = bigram_tracker.step(vk, int(ts * 1000))
+        if pair is not None:
+            stats_buffer.add_bigram(pair)
+
+    fired = _maybe_trigger_hotkeys(vk, logical_mods(_mod_state))
+    for hotkey_id, display in fired:
+        update_hotkey_stats_in_db(hotkey_id, display, now)
+        _active_hotkeys.add(hotkey_id)
+
+
+def _handle_coalesced(vk: int, key_name: str, count: int, ts: float) -> None:
+    """队列溢出时被合并的按下事件：只补记按键次数，不参与快捷键判断"""
+    if event_journal is not None:
+        event_journal.append(_event_ms(ts), vk, FLAG_PRESS | FLAG_COALESCED, key_name, count)
+    if bigram_tracker is not None:
+        bigram_tracker.reset()
+    if DB_COMPONENTS_LOADED:
+        stats_buffer.add_key(key_name, vk, _event_time(ts), count)
+
+
+def _load_ingest_config() -> Tuple[int, str]:
+    cfg = get_section("ingest")
     try:
-        vk, key_name = _extract_vk_and_name(key)
-        if not isinstance(vk, int):
-            return
+        capacity = int(cfg.get("capacity", DEFAULT_CAPACITY))
+    except (TypeError, ValueError):
+        capacity = DEFAULT_CAPACITY
+    overflow = str(cfg.get("overflow", OVERFLOW_DROP))
+    if overflow not in (OVERFLOW_DROP, OVERFLOW_COALESCE):
+        print(f"[WARN] 未知的 ingest.overflow: {overflow}，使用 {OVERFLOW_DROP}")
+        overflow = OVERFLOW_DROP
+    return capacity, overflow
 
-        if vk in pressed_vks:
-            return
 
-        pressed_vks.add(vk)
+def _load_journal() -> Optional[EventJournal]:
+    cfg = load_journal_config()
+    if not cfg["enabled"]:
+        return None
+    return EventJournal(cfg["dir"], cfg["segment_bytes"], cfg["flush_bytes"], cfg["flush_interval"])
+
+
+def _load_typing_analyzer() -> Optional[TypingAnalyzer]:
+    cfg = load_typing_config()
+    if not cfg["enabled"]:
+        return None
+    return TypingAnalyzer(_WALL_OFFSET, cfg["idle_gap"])
+
+
+def _load_bigram_tracker() -> Optional[BigramTracker]:
+    cfg = load_bigram_config()
+    if not cfg["enabled"]:
+        return None
+    return BigramTracker(cfg["max_gap"])
+
+
+def _on_idle() -> None:
+    if event_journal is not None:
+        event_journal.flush()
+    if typing_analyzer is not None:
+        typing_analyzer.tick(monotonic())
+
 
-        update_key_stats_in_db(key_name, vk)
+_WALL_OFFSET = monotonic_to_wall_offset()
+event_journal = _load_journal()
+typing_analyzer = _load_typing_analyzer()
+bigram_tracker = _load_bigram_tracker()
+event_ring = EventRing(*_load_ingest_config(), wall_offset=_WALL_OFFSET)
+ingest_worker = IngestWorker(event_ring, _handle_event, _handle_coalesced, idle_handler=_on_idle)
 
-        fired = _maybe_trigger_hotkeys(vk, pressed_vks)
-        for hotkey_id, display in fired:
-            update_hotkey_stats_in_db(hotkey_id, display)
-            _active_hotkeys.add(hotkey_id)
 
+def ingest_stats() -> Dict[str, object]:
+    """队列深度、丢弃 / 合并计数等，供接口与排查使用"""
+    stats = event_ring.stats()
+    stats["processed"] = ingest_worker.processed
+    stats["pending_flush"] = stats_buffer.pending()
+    if event_journal is not None:
+        stats["journal_records"] = event_journal.records
+    return stats
+
+
+def on_press(key):
+    # 钩子回调只做 O(1) 的入队，不碰数据库
+    try:
+        vk, key_name = _extract_vk_and_name(key)
+        if vk is None:
+            return
+        event_ring.push((vk, key_name, monotonic(), KIND_PRESS))
     except Exception as e:
         print(f"Error in on_press: {e}")
 
 
 def on_release(key):
     try:
-        vk, _ = _extract_vk_and_name(key)
-        if isinstance(vk, int) and vk in pressed_vks:
-            pressed_vks.remove(vk)
-
-        if isinstance(vk, int):
-            if vk in MOD_VK["CTRL"] or vk in MOD_VK["ALT"] or vk in MOD_VK["SHIFT"] or vk in MOD_VK["WIN"]:
-                _active_hotkeys.clear()
-
+        vk, key_name = _extract_vk_and_name(key)
+        if vk is None:
+            return
+        event_ring.push((vk, key_name, monotonic(), KIND_RELEASE))
     except Exception as e:
         print(f"Error in on_release: {e}")
 
 
+def _install_metrics() -> None:
+    """钩子回调计时与队列状态；未启用时不做任何包装"""
+    global on_press, on_release
+    if not metrics.ENABLED:
+        return
+    reg = metrics.REGISTRY
+    help_text = "键盘钩子回调耗时（样本数即事件数）"
+    on_press = metrics.timed(reg.histogram("hook_callback_seconds", help_text, kind="press"), on_press)
+    on_release = metrics.timed(reg.histogram("hook_callback_seconds", help_text, kind="release"), on_release)
+    reg.gauge("ingest_queue_depth", "事件队列当前长度", event_ring.depth)
+    reg.gauge("ingest_queue_high_watermark", "事件队列最大长度", lambda: event_ring.high_watermark)
+    reg.gauge("ingest_dropped_total", "队列满时丢弃的按下事件", lambda: event_ring.dropped, kind="counter")
+    reg.gauge("ingest_coalesced_total", "队列满时合并计数的按下事件", lambda: event_ring.coalesced, kind="counter")
+    reg.gauge("ingest_processed_total", "消费者线程处理的事件", lambda: ingest_worker.processed, kind="counter")
+    reg.gauge("stats_buffer_pending", "尚未落库的计数", stats_buffer.pending)
+    if event_journal is not None:
+        reg.gauge("journal_records_total", "写入原始日志的记录", lambda: event_journal.records, kind="counter")
+
+
+_install_metrics()
+
+
+def start_capture() -> keyboard.Listener:
+    """
+    不阻塞：先安装钩子（事件进入队列），再启动消费者与落库线程；钩子就绪后返回监听器。
+    这里只用到队列与内存缓冲，数据库在第一次落库时才打开。
+    """
+    listener = keyboard.Listener(on_press=on_press, on_release=on_release)
+    listener.start()
+    ingest_worker.start()
+    stats_buffer.start()
+    listener.wait()
+    return listener
+
+
 def start_listener():
-    with keyboard.Listener(on_press=on_press, on_release=on_release) as listener:
-        listener.join()
+    start_capture().join()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-typing_speed.py
+@Description : 打字速度的流式统计：按下间隔、连续输入段长度、空闲间隔与每分钟按键数，按钟面小时汇总
+"""
+
+from __future__ import annotations
+
+import datetime
+from collections import deque
+from typing import Dict, List, Optional
+
+from settings import get_section
+from storage.timekeys import epoch_hour
+from storage.typingstats import HourSummary
+
+DEFAULT_IDLE_GAP = 2.0   # 秒：间隔超过该值视为一段连续输入结束
+
+# 实时 KPM 使用最近 60 秒、每秒一格的计数环
+_RING_SECONDS = 60
+
+
+def load_typing_config() -> Dict[str, object]:
+    cfg = get_section("typing")
+    try:
+        idle_gap = float(cfg.get("idle_gap", DEFAULT_IDLE_GAP))
+    except (TypeError, ValueError):
+        idle_gap = DEFAULT_IDLE_GAP
+    return {"enabled": bool(cfg.get("enabled", True)), "idle_gap": max(0.1, idle_gap)}
+
+
+class TypingAnalyzer:
+    """
+    只在消费者线程中调用 observe / tick / close，状态无需加锁；每个事件只做几次整数运算，
+    内存固定（当前小时的几个直方图 + 60 格计数环）。
+    完成的小时摘要放入 pending，由落库线程通过 take_pending 取走，与按键统计在同一个事务写入。
+    时间戳为 time.monotonic()（与钩子回调记录的一致），wall_offset 换算为本地时间。
+    """
+
+    def __init__(self, wall_offset: float, idle_gap: float = DEFAULT_IDLE_GAP):
+        self._offset_ms = int(wall_offset * 1000)
+        self._idle_ms = int(idle_gap * 1000)
+        self._last_ms: Optional[int] = None
+        self._burst = 0
+        self._minute: Optional[int] = None
+        self._minute_count = 0
+        self._hour: Optional[HourSummary] = None
+        self._pending: deque = deque()
+        self._second = 0
+        self._ring = [0] * _RING_SECONDS
+
+    # ---- 消费者线程 ----
+
+    def observe(self, ts: float) -> None:
+        """一次计入统计的按下（长按重复已在调用前过滤）"""
+        ms = int(ts * 1000)
+        last = self._last_ms
+        self._last_ms = ms
+        gap = -1 if last is None else ms - last
+        if gap > self._idle_ms and self._burst:
+            # 上一段输入结束，记在它所在的小时
+            self._close_burst()
+
+        minute = (ms + self._offset_ms) // 60000
+        if minute != self._minute:
+            self._roll_minute(minute)
+        h = self._hour
+        h.key_presses += 1
+        self._minute_count += 1
+        self._burst += 1
+        if gap >= 0:
+            if gap <= self._idle_ms:
+                h.intervals.add(gap)
+            else:
+                h.idle.add(gap)
+
+        sec = ms // 1000
+        if sec != self._second:
+            self._advance_ring(sec)
+        self._ring[sec % _RING_SECONDS] += 1
+
+    def tick(self, ts: float) -> None:
+        """空闲时调用：结束已停顿的输入段；跨过分钟 / 小时时提交对应的计数"""
+        ms = int(ts * 1000)
+        if self._last_ms is not None and self._burst and ms - self._last_ms > self._idle_ms:
+            self._close_burst()
+        if self._minute is not None:
+            minute = (ms + self._offset_ms) // 60000
+            if minute != self._minute:
+                self._roll_minute(minute)
+
+    def close(self, ts: float) -> None:
+        """退出前调用：当前小时（含未满的一分钟与未结束的输入段）一并放入 pending"""
+        self.tick(ts)
+        if self._burst:
+            self._close_burst()
+        self._close_minute()
+        if self._hour is not None and self._hour.key_presses:
+            self._pending.append(self._hour)
+        self._hour = None
+        self._minute = None
+
+    def _close_burst(self) -> None:
+        h = self._hour
+        if h is not None:
+            h.burst_keys.add(self._burst)
+            h.bursts += 1
+        self._burst = 0
+
+    def _close_minute(self) -> None:
+        n = self._minute_count
+        if n and self._hour is not None:
+            h = self._hour
+            h.kpm.add(n)
+            h.active_minutes += 1
+            if n > h.peak_kpm:
+                h.peak_kpm = n
+        self._minute_count = 0
+
+    def _roll_minute(self, minute: int) -> None:
+        self._close_minute()
+        self._minute = minute
+        hour = epoch_hour(datetime.datetime.fromtimestamp(minute * 60))
+        if self._hour is None or self._hour.epoch_hour != hour:
+            if self._hour is not None and self._hour.key_presses:
+                self._pending.append(self._hour)
+            self._hour = HourSummary(hour)
+
+    def _advance_ring(self, sec: int) -> None:
+        ring = self._ring
+        if sec - self._second >= _RING_SECONDS:
+            ring[:] = [0] * _RING_SECONDS
+        else:
+            for s in range(self._second + 1, sec + 1):
+                ring[s % _RING_SECONDS] = 0
+        self._second = sec
+
+    # ---- 其他线程 ----
+
+    def take_pending(self) -> List[HourSummary]:
+        out = []
+        while self._pending:
+            out.append(self._pending.popleft())
+        return out
+
+    def restore_pending(self, summaries: List[HourSummary]) -> None:
+        """落库失败时放回，下次重试"""
+        self._pending.extendleft(reversed(summaries))
+
+    def unsaved(self) -> List[HourSummary]:
+        """尚未落库的小时摘要（pending + 当前小时的快照），供同进程的接口合并"""
+        out = [s.copy() for s in list(self._pending)]
+        current = self._hour
+        if current is not None and current.key_presses:
+            out.append(current.copy())
+        return out
+
+    def current_kpm(self, ts: float) -> int:
+        """最近 60 秒内的按键次数"""
+        now = int(ts)
+        last = self._second
+        if now - last >= _RING_SECONDS:
+            return 0
+        ring = self._ring
+        return sum(ring[s % _RING_SECONDS] for s in range(max(now, last) - _RING_SECONDS + 1, last + 1))
+
+
+if __name__ == '__main__':
+    pass
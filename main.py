@@ -1,102 +1,141 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-@Time        : 2024/11/13 23:16 
-@Author      : SiYuan 
-@Email       : 863909694@qq.com 
-@File        : TraceBoard-main.py 
-@Description : 
-"""
-
-import os
-
-import threading
-import webbrowser
-from pystray import Icon, MenuItem, Menu
-from PIL import Image, ImageDraw
-
-from uvicorn import Config, Server
-
-from listener.keyboard import start_listener
-from log import logger
-
-from server import app, static_dir
-
-from win10toast import ToastNotifier
-import tomllib
-
-# 启动键盘监听的同时运行FastAPI服务器
-def start_api():
-    # import uvicorn
-    # uvicorn.run(app, host="127.0.0.1", port=21315)
-    log_config = {
-        "version": 1,
-        "disable_existing_loggers": True,
-        "handlers": {
-            "file_handler": {
-                "class": "logging.FileHandler",
-                "filename": "app.log",
-            },
-        },
-        "root": {
-            "handlers": ["file_handler"],
-            "level": "ERROR",
-        },
-    }
-    config = Config(app=app, host="127.0.0.1", port=21315, log_config=log_config)
-    server = Server(config=config)
-    server.run()
-
-
-# 创建托盘图标图像
-def create_image(width: int, height: int, color1, color2):
-    image = Image.new("RGB", (width, height), color1)
-    dc = ImageDraw.Draw(image)
-    dc.rectangle(
-        [(width // 4, height // 4), (width * 3 // 4, height * 3 // 4)], fill=color2
-    )
-    image = Image.open(os.path.join(static_dir, 'logo3.0.ico'))
-    return image
-
-
-# 托盘图标菜单
-def setup_tray_icon():
-    icon_image = create_image(64, 64, "black", "white")
-    tray_icon = Icon("Keyboard Monitor", icon_image, '打开统计面板', menu=Menu(
-        MenuItem("查看统计", open_dashboard),
-        MenuItem("退出软件", exit_app)
-    ))
-    tray_icon.run()
-
-
-# 打开前端 HTML 页面
-def open_dashboard(icon, item):
-    webbrowser.open("http://127.0.0.1:21315/")
-
-
-# 退出程序
-def exit_app(icon, item):
-    icon.stop()
-    os._exit(0)
-
-
-# 主线程启动
-if __name__ == "__main__":
-    # 启动键盘监听器和 API 服务器
-    threading.Thread(target=start_listener).start()
-    threading.Thread(target=start_api).start()
-    with open("config.toml", "br") as f:
-        data = tomllib.load(f)
-    if data.get('startup_items', {}).get('open_web', False):
-        webbrowser.open("http://127.0.0.1:21315/")
-    if data.get('startup_items', {}).get('show_notification', False):
-        ToastNotifier().show_toast(
-        title="TraceBoard",
-        msg="启动成功",
-        icon_path="server\\static\\logo3.0.ico",
-        duration=1,
-        threaded=True
-        )
-    # 设置托盘图标
-    setup_tray_icon()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@Time        : 2024/11/13 23:16
+@Author      : SiYuan
+@Email       : 863909694@qq.com
+@File        : TraceBoard-main.py
+@Description : 启动顺序：先装键盘钩子（事件进入内存缓冲），再在后台加载 Web 服务与数据库，最后显示托盘图标
+"""
+
+import time
+
+_T0 = time.perf_counter()  # 启动报告的起点
+
+import os
+import threading
+import webbrowser
+
+from metrics.startup import StartupProfile
+from settings import PROJECT_ROOT, get_section
+
+# pystray / PIL / uvicorn / FastAPI / SQLAlchemy / win10toast 都在用到的地方才导入，不挡在钩子前面
+profile = StartupProfile(_T0)
+static_dir = os.path.join(PROJECT_ROOT, "server", "static")
+STARTUP_REPORT = os.path.join(PROJECT_ROOT, "startup.log")
+STARTUP_ITEMS = get_section("startup_items")
+
+
+# API 服务器（后台线程）：导入 server.app 时建表、检查结构并载入排名
+def start_api():
+    with profile.step("import log"):
+        from log import logger  # noqa: F401  配置 app.log
+    with profile.step("import uvicorn"):
+        from uvicorn import Config, Server
+    with profile.step("import server.app"):
+        from server import app
+
+    class _Server(Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if self.started:
+                on_api_ready()
+
+    log_config = {
+        "version": 1,
+        "disable_existing_loggers": True,
+        "handlers": {
+            "file_handler": {
+                "class": "logging.FileHandler",
+                "filename": "app.log",
+            },
+        },
+        "root": {
+            "handlers": ["file_handler"],
+            "level": "ERROR",
+        },
+    }
+    config = Config(app=app, host="127.0.0.1", port=21315, log_config=log_config)
+    server = _Server(config=config)
+    server.run()
+
+
+def on_api_ready():
+    profile.done("api ready")
+    if STARTUP_ITEMS.get('open_web', False):
+        webbrowser.open("http://127.0.0.1:21315/")
+    if STARTUP_ITEMS.get('show_notification', False):
+        show_notification()
+
+
+def show_notification():
+    try:
+        from win10toast import ToastNotifier
+        ToastNotifier().show_toast(
+            title="TraceBoard",
+            msg="启动成功",
+            icon_path="server\\static\\logo3.0.ico",
+            duration=1,
+            threaded=True
+        )
+    except Exception as e:
+        print(f"[WARN] 启动通知失败: {e}")
+
+
+# 创建托盘图标图像
+def create_image(width: int, height: int, color1, color2):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (width, height), color1)
+    dc = ImageDraw.Draw(image)
+    dc.rectangle(
+        [(width // 4, height // 4), (width * 3 // 4, height * 3 // 4)], fill=color2
+    )
+    image = Image.open(os.path.join(static_dir, 'logo3.0.ico'))
+    return image
+
+
+# 托盘图标菜单
+def setup_tray_icon():
+    with profile.step("import pystray"):
+        from pystray import Icon, MenuItem, Menu
+    with profile.step("tray icon image"):
+        icon_image = create_image(64, 64, "black", "white")
+    tray_icon = Icon("Keyboard Monitor", icon_image, '打开统计面板', menu=Menu(
+        MenuItem("查看统计", open_dashboard),
+        MenuItem("退出软件", exit_app)
+    ))
+    tray_icon.run(setup=on_tray_ready)
+
+
+def on_tray_ready(icon):
+    icon.visible = True
+    profile.done("tray ready")
+
+
+# 打开前端 HTML 页面
+def open_dashboard(icon, item):
+    webbrowser.open("http://127.0.0.1:21315/")
+
+
+# 退出程序
+def exit_app(icon, item):
+    icon.stop()
+    # 退出前把内存中尚未落库的统计写入数据库
+    flush_stats()
+    os._exit(0)
+
+
+# 主线程启动
+if __name__ == "__main__":
+    # 1. 键盘钩子：只依赖队列与内存缓冲，数据库在第一次落库时才打开
+    with profile.step("import listener.keyboard"):
+        from listener.keyboard import start_capture, flush_stats
+    with profile.step("start capture"):
+        start_capture()
+    profile.mark("capture live")
+
+    # 2. API 服务器与托盘图标并行加载；两者都就绪后写出启动报告（startup.log）
+    profile.expect("api ready", "tray ready", on_complete=lambda p: p.write(STARTUP_REPORT))
+    threading.Thread(target=start_api, name="api").start()
+    setup_tray_icon()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-__init__.py
+@Description : 进程内的轻量性能计数：计数器、log2 分桶的耗时直方图、抓取时求值的仪表，输出 Prometheus 文本格式
+
+config.toml 的 [metrics] enabled = false 时，各处在导入阶段就不安装计时包装，热路径上没有任何额外开销。
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from settings import get_section
+
+ENABLED = bool(get_section("metrics").get("enabled", True))
+
+PREFIX = "traceboard_"
+
+# 纳秒耗时的 bit_length 最多 64
+_BUCKETS = 65
+
+# Prometheus 输出的桶边界固定为 2^10 ns（约 1 µs）到 2^36 ns（约 69 s），
+# 每次抓取的 le 序列都相同，rate() / histogram_quantile 才能跨时间窗口计算
+_LE_MIN, _LE_MAX = 10, 36
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    """单调递增计数；+= 不是原子操作，只能由一个线程写入（多个线程写入的用 SharedCounter）"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+
+class SharedCounter(Counter):
+    """多个线程写入的计数，inc 加锁"""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1) -> None:
+        with self._lock:
+            self.value += n
+
+
+class Histogram:
+    """
+    纳秒耗时直方图：第 i 个桶统计 bit_length 为 i 的样本，即 [2^(i-1), 2^i) ns。
+    observe 只做一次 bit_length 和三次整数加法；分位数按桶内对数插值估算（相对误差小于 2 倍）。
+    """
+
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self):
+        self.buckets = [0] * _BUCKETS
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, ns: int) -> None:
+        self.buckets[ns.bit_length()] += 1
+        self.count += 1
+        self.sum += ns
+
+    def quantile(self, q: float) -> float:
+        """q 为 0..1，返回秒；没有样本时为 NaN"""
+        total = self.count
+        if not total:
+            return math.nan
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lo, hi = (1 << (i - 1)) if i else 0, 1 << i
+                frac = (rank - seen) / n
+                est = lo * (hi / lo) ** frac if lo else hi * frac
+                return est / 1e9
+            seen += n
+        return (1 << (_BUCKETS - 1)) / 1e9
+
+    def mean(self) -> float:
+        return self.sum / self.count / 1e9 if self.count else math.nan
+
+
+class SharedHistogram(Histogram):
+    """多个线程写入的直方图（如各线程都会调用的 write_delta），observe 加锁"""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def observe(self, ns: int) -> None:
+        with self._lock:
+            self.buckets[ns.bit_length()] += 1
+            self.count += 1
+            self.sum += ns
+
+
+class Registry:
+    """按 (名称, 标签) 取得或创建指标；同名指标共享 HELP / TYPE"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}                  # name -> (type, help)
+        self._counters: Dict[Tuple[str, LabelKey], Counter] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._callbacks: Dict[Tuple[str, LabelKey], Callable[[], Optional[float]]] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        if name not in self._meta:
+            self._meta[name] = (kind, help_text)
+
+    def counter(self, name: str, help_text: str = "", shared: bool = False, **labels) -> Counter:
+        """shared=True：会被多个线程写入，返回加锁的 SharedCounter"""
+        key = (PREFIX + name, _label_key(labels))
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                self._declare(key[0], "counter", help_text)
+                metric = self._counters.setdefault(key, SharedCounter() if shared else Counter())
+        return metric
+
+    def histogram(self, name: str, help_text: str = "", shared: bool = False, **labels) -> Histogram:
+        """shared=True：会被多个线程写入，返回加锁的 SharedHistogram"""
+        key = (PREFIX + name, _label_key(labels))
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                self._declare(key[0], "histogram", help_text)
+                metric = self._histograms.setdefault(key, SharedHistogram() if shared else Histogram())
+        return metric
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], Optional[float]],
+              kind: str = "gauge", **labels) -> None:
+        """抓取时调用 fn() 取值（返回 None 表示暂无数据）；kind 可为 counter，用于读取已有的累计值"""
+        with self._lock:
+            self._declare(PREFIX + name, kind, help_text)
+            self._callbacks[(PREFIX + name, _label_key(labels))] = fn
+
+    def _callback_values(self) -> List[Tuple[str, LabelKey, float]]:
+        out = []
+        for (name, labels), fn in list(self._callbacks.items()):
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if value is not None:
+                out.append((name, labels, float(value)))
+        return out
+
+    def render(self) -> str:
+        """Prometheus 文本格式（version 0.0.4）"""
+        series: Dict[str, List[str]] = {}
+
+        for (name, labels), c in list(self._counters.items()):
+            series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {c.value}")
+        for name, labels, value in self._callback_values():
+            series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), h in list(self._histograms.items()):
+            lines = series.setdefault(name, [])
+            buckets = list(h.buckets)
+            cumulative = sum(buckets[:_LE_MIN])
+            for i in range(_LE_MIN, _LE_MAX + 1):
+                cumulative += buckets[i]
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{(1 << i) / 1e9:g}'))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {h.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h.sum / 1e9:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+
+        out = []
+        for name in sorted(series):
+            kind, help_text = self._meta.get(name, ("untyped", ""))
+            if help_text:
+                out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(series[name])
+        return "\n".join(out) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        """面板用的 JSON：耗时换算成毫秒并附带 p50 / p99 估算"""
+        def entry(name, labels, **values):
+            return {"name": name[len(PREFIX):], "labels": dict(labels), **values}
+
+        def ms(seconds: float) -> Optional[float]:
+            return None if math.isnan(seconds) else round(seconds * 1000, 4)
+
+        values = [entry(n, l, value=c.value) for (n, l), c in list(self._counters.items())]
+        values += [entry(n, l, value=v) for n, l, v in self._callback_values()]
+        timings = [
+            entry(n, l, count=h.count, mean_ms=ms(h.mean()), p50_ms=ms(h.quantile(0.5)), p99_ms=ms(h.quantile(0.99)))
+            for (n, l), h in list(self._histograms.items())
+        ]
+        return {"time": time.time(), "values": values, "timings": timings}
+
+
+REGISTRY = Registry()
+
+
+def timed(hist: Histogram, fn: Callable) -> Callable:
+    """返回记录每次调用耗时的包装函数；未启用时原样返回 fn"""
+    if not ENABLED:
+        return fn
+    clock = time.perf_counter_ns
+    observe = hist.observe
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe(clock() - t0)
+
+    return wrapper
+
+
+class Timer:
+    """with 块计时：with Timer(hist): ...；hist 为 None 时不计时"""
+
+    __slots__ = ("_hist", "_t0")
+
+    def __init__(self, hist: Optional[Histogram]):
+        self._hist = hist
+        self._t0 = 0
+
+    def __enter__(self):
+        if self._hist is not None:
+            self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        if self._hist is not None:
+            self._hist.observe(time.perf_counter_ns() - self._t0)
+        return False
+
+
+if __name__ == '__main__':
+    pass
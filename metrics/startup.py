@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-startup.py
+@Description : 启动过程计时：各线程中嵌套的导入 / 初始化步骤与关键节点，报告格式仿照 python -X importtime
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import metrics
+
+HEADER = "startup time: self [us] | cumulative [us] | modules | thread       | step"
+
+
+class StartupProfile:
+    """
+    t0 为进程入口（main.py 第一行）的 perf_counter，不含解释器自身的启动。
+    step 可以嵌套，按线程分别记录深度；报告按结束顺序输出（子步骤在父步骤之前，与 -X importtime 相同），
+    self 为扣除子步骤后的耗时。modules 是步骤期间 sys.modules 的增量，其他线程同时导入时会算进来，只作参考。
+    mark 记录关键节点（如钩子就绪）距 t0 的时间；expect 的节点全部 done 之后写出报告。
+    """
+
+    def __init__(self, t0: Optional[float] = None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._steps: List[Tuple[str, int, str, float, float, int]] = []
+        self._marks: List[Tuple[str, float]] = []
+        self._pending: set = set()
+        self._on_complete: Optional[Callable[["StartupProfile"], None]] = None
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        children = [0.0]
+        stack.append(children)
+        n_modules = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += total
+            entry = (threading.current_thread().name, len(stack), name, total - children[0], total,
+                     len(sys.modules) - n_modules)
+            with self._lock:
+                self._steps.append(entry)
+
+    def mark(self, name: str) -> float:
+        elapsed = time.perf_counter() - self.t0
+        with self._lock:
+            self._marks.append((name, elapsed))
+        if metrics.ENABLED:
+            metrics.REGISTRY.gauge("startup_seconds", "启动关键节点距进程入口的时间", lambda: elapsed, milestone=name)
+        return elapsed
+
+    def expect(self, *names: str, on_complete: Callable[["StartupProfile"], None]) -> None:
+        with self._lock:
+            self._pending.update(names)
+            self._on_complete = on_complete
+
+    def done(self, name: str) -> None:
+        """标记节点；expect 的节点都已标记时调用 on_complete（只调用一次）"""
+        self.mark(name)
+        with self._lock:
+            self._pending.discard(name)
+            callback = self._on_complete if not self._pending else None
+            if callback is not None:
+                self._on_complete = None
+        if callback is not None:
+            callback(self)
+
+    def report(self) -> str:
+        with self._lock:
+            steps, marks = list(self._steps), sorted(self._marks, key=lambda m: m[1])
+        lines = [f"startup: {name:<16} +{elapsed * 1000:8.1f} ms" for name, elapsed in marks]
+        lines.append(HEADER)
+        for thread, depth, name, self_s, total_s, modules in steps:
+            lines.append(f"startup time: {int(self_s * 1e6):>9} | {int(total_s * 1e6):>15} | {modules:>7} | "
+                         f"{thread[:12]:<12} | {'  ' * depth}{name}")
+        return "\n".join(lines)
+
+    def write(self, path: str) -> None:
+        text = self.report()
+        print(text)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        except OSError as e:
+            print(f"[WARN] 启动报告写入失败: {e}")
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-replay_journal.py
+@Description : 从原始按键日志（listener.journal）回放，重建一份全新的统计数据库
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+from sqlalchemy import create_engine
+
+from listener.bigrams import BigramTracker, load_bigram_config
+from listener.hotkeys import HotkeyIndex, compile_hotkeys, load_hotkey_defs, logical_mods, match, vk_modifier_bit
+from listener.journal import FLAG_COALESCED, FLAG_PRESS, JournalRecord, iter_journal, load_journal_config, load_names
+from settings import PROJECT_ROOT
+from storage import StatsDelta, apply_delta, install_profile, load_profile, rollup
+from storage.models import Base
+from upgrade_db_v3 import SCHEMA_LATEST, _report_rate
+
+REPLAY_CHUNK = 200_000   # 每累计多少次计数写一次事务
+
+
+def replay_deltas(records: Iterable[JournalRecord], names: Dict[int, str], index: HotkeyIndex,
+                  chunk: int = REPLAY_CHUNK, bigrams: Optional[BigramTracker] = None) -> Iterator[StatsDelta]:
+    """
+    按监听器的规则重放事件：长按重复的按下只算一次，修饰键状态随按下 / 松开维护，
+    快捷键用当前配置重新匹配（因此修改快捷键定义后也能重算历史）。
+    传入 bigrams 时按同样的规则统计按键转移。
+    """
+    pressed = set()
+    mods = 0
+    delta = StatsDelta()
+    for ms, vk, flags in records:
+        bit = vk_modifier_bit(vk)
+        if not flags & FLAG_PRESS:
+            pressed.discard(vk)
+            mods &= ~bit
+            continue
+
+        now = datetime.datetime.fromtimestamp(ms / 1000)
+        if flags & FLAG_COALESCED:
+            delta.add_key(names.get(vk, ""), vk, now)
+            if bigrams is not None:
+                bigrams.reset()
+        elif vk not in pressed:
+            pressed.add(vk)
+            mods |= bit
+            delta.add_key(names.get(vk, ""), vk, now)
+            if bigrams is not None:
+                pair = bigrams.step(vk, ms)
+                if pair is not None:
+                    delta.add_bigram(pair)
+            for hotkey_id, display in match(index, vk, logical_mods(mods)):
+                delta.add_hotkey(hotkey_id, display, now)
+
+        if delta.events >= chunk:
+            yield delta
+            delta = StatsDelta()
+    if delta.events:
+        yield delta
+
+
+def _parse_day(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    return int(datetime.datetime.strptime(value, "%Y-%m-%d").timestamp() * 1000)
+
+
+def replay(journal_dir: str, out_path: str, since: Optional[str] = None, until: Optional[str] = None,
+           chunk: int = REPLAY_CHUNK) -> int:
+    engine = create_engine(f"sqlite:///{out_path}")
+    install_profile(engine, load_profile())
+    Base.metadata.create_all(bind=engine)
+
+    names = load_names(journal_dir)
+    index = compile_hotkeys(load_hotkey_defs())
+    records = iter_journal(journal_dir, _parse_day(since), _parse_day(until))
+    bigram_cfg = load_bigram_config()
+    bigrams = BigramTracker(bigram_cfg["max_gap"]) if bigram_cfg["enabled"] else None
+
+    started = time.perf_counter()
+    events = 0
+    for delta in replay_deltas(records, names, index, chunk, bigrams):
+        with engine.begin() as conn:
+            apply_delta(conn, delta)
+        events += delta.events
+        print(f"  已回放 {events} 次计数")
+
+    # 明细写完后一次汇总出日 / 月 / 总计等粗粒度表
+    with engine.begin() as conn:
+        rollup(conn)
+        conn.exec_driver_sql(
+            "INSERT OR REPLACE INTO db_meta(key, value, updated_at) VALUES ('schema_version', ?, ?)",
+            (str(SCHEMA_LATEST), datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+    engine.dispose()
+    _report_rate("回放日志", events, started)
+    return events
+
+
+def main():
+    cfg = load_journal_config()
+    ap = argparse.ArgumentParser(description="从按键日志重建统计数据库")
+    ap.add_argument("--journal", default=cfg["dir"], help="日志分段所在目录（默认取 config.toml 的 [journal] dir）")
+    ap.add_argument("--out", default=os.path.join(PROJECT_ROOT, "key_events.replay.db"),
+                    help="输出的新数据库文件，确认无误后可替换 key_events.db")
+    ap.add_argument("--force", action="store_true", help="输出文件已存在时覆盖")
+    ap.add_argument("--since", help="只回放该日期（YYYY-MM-DD）及之后的事件")
+    ap.add_argument("--until", help="只回放该日期（YYYY-MM-DD）之前的事件")
+    ap.add_argument("--chunk", type=int, default=REPLAY_CHUNK, help="每个写事务累计的计数次数")
+    args = ap.parse_args()
+
+    if os.path.exists(args.out):
+        if not args.force:
+            print(f"❌ {args.out} 已存在，使用 --force 覆盖")
+            sys.exit(1)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.out + suffix):
+                os.remove(args.out + suffix)
+
+    replay(args.journal, args.out, args.since, args.until, max(1, args.chunk))
+    print(f"✅ 已写入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
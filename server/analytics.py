@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-analytics.py
+@Description : 按整数天 / 小时键索引的列式时间序列：补零、滑动平均、周环比、分位数（有 NumPy 时向量化计算）
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+from array import array
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时退回纯 Python 实现，结果一致，只是长区间较慢
+    np = None
+
+HAS_NUMPY = np is not None
+
+# 一列数值：有 NumPy 时为 ndarray，否则为 list
+Column = Sequence
+
+
+def day_labels(start: date, n: int) -> List[str]:
+    """从 start 开始连续 n 天的 YYYY-MM-DD"""
+    if np is not None:
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(start + timedelta(days=n), "D"))
+        return np.datetime_as_string(days, unit="D").tolist()
+    return [(start + timedelta(days=i)).isoformat() for i in range(n)]
+
+
+def fill_series(rows: Iterable[tuple], origin: int, n: int, width: int) -> List[Column]:
+    """
+    rows 为 (整数时间键, v1, ..., v_width)，每个键至多一行（时间键见 storage.timekeys）；
+    按 键 - origin 放入长度为 n 的整数列，缺失的位置为 0，超出范围的行忽略。
+    """
+    rows = list(rows)
+    if np is not None:
+        out = np.zeros((width, n), dtype=np.int64)
+        if rows:
+            data = np.array([[v or 0 for v in r[:width + 1]] for r in rows], dtype=np.int64).T
+            idx = data[0] - origin
+            keep = (idx >= 0) & (idx < n)
+            out[:, idx[keep]] = data[1:, keep]
+        return list(out)
+
+    out = [[0] * n for _ in range(width)]
+    for r in rows:
+        i = r[0] - origin
+        if 0 <= i < n:
+            for c in range(width):
+                out[c][i] = int(r[c + 1] or 0)
+    return out
+
+
+def fill_matrix(cells: Iterable[tuple], n_rows: int, n_cols: int) -> List[List[int]]:
+    """cells 为 (行号, 列号, 值)，同一格出现多次时累加；返回 n_rows × n_cols 的稠密矩阵（嵌套 list），越界的格子忽略"""
+    cells = list(cells)
+    if np is not None:
+        out = np.zeros((n_rows, n_cols), dtype=np.int64)
+        if cells:
+            data = np.array([[r, c, v or 0] for r, c, v in cells], dtype=np.int64).T
+            keep = (data[0] >= 0) & (data[0] < n_rows) & (data[1] >= 0) & (data[1] < n_cols)
+            np.add.at(out, (data[0, keep], data[1, keep]), data[2, keep])
+        return out.tolist()
+
+    out = [[0] * n_cols for _ in range(n_rows)]
+    for r, c, v in cells:
+        if 0 <= r < n_rows and 0 <= c < n_cols:
+            out[r][c] += int(v or 0)
+    return out
+
+
+UINT32_MAX = (1 << 32) - 1
+
+
+def pack_uint32(cells: Iterable[tuple], n: int) -> bytes:
+    """cells 为 (下标, 值)，每个下标至多一次；返回长度为 n 的小端 uint32 数组的字节（行优先展开的稠密矩阵），超过 uint32 的值截断为最大值"""
+    cells = list(cells)
+    if np is not None:
+        out = np.zeros(n, dtype="<u4")
+        if cells:
+            data = np.array(cells, dtype=np.int64).T
+            keep = (data[0] >= 0) & (data[0] < n)
+            out[data[0, keep]] = np.minimum(data[1, keep], UINT32_MAX)
+        return out.tobytes()
+
+    out = array("I", bytes(4 * n))
+    for i, v in cells:
+        if 0 <= i < n:
+            out[i] = min(int(v or 0), UINT32_MAX)
+    if sys.byteorder == "big":
+        out.byteswap()
+    return out.tobytes()
+
+
+def to_list(col: Column, digits: Optional[int] = None) -> list:
+    """转成可直接 JSON 序列化的 list；浮点列按 digits 位小数取整，NaN 输出为 null"""
+    if np is not None and isinstance(col, np.ndarray):
+        if digits is None:
+            return col.tolist()
+        values = np.round(col, digits).tolist()
+    else:
+        values = list(col) if digits is None else [round(v, digits) for v in col]
+    if digits is None:
+        return values
+    return [None if v != v else v for v in values]
+
+
+def rolling_mean(values: Column, window: int) -> Column:
+    """与输入等长的滑动平均；开头不足 window 天的位置用已有的天数求平均"""
+    window = max(1, int(window))
+    if np is not None:
+        v = np.asarray(values, dtype=np.float64)
+        csum = np.concatenate(([0.0], np.cumsum(v)))
+        out = np.empty_like(v)
+        k = min(window, len(v))
+        out[:k] = csum[1:k + 1] / np.arange(1, k + 1)
+        out[k:] = (csum[k + 1:] - csum[1:len(v) - k + 1]) / window
+        return out
+
+    out, running = [], 0.0
+    for i, x in enumerate(values):
+        running += x
+        if i >= window:
+            running -= values[i - window]
+        out.append(running / min(i + 1, window))
+    return out
+
+
+def week_over_week(values: Column, lag: int = 7) -> Tuple[Column, Column]:
+    """
+    values 需在前面多带 lag 天；返回 (差值, 变化率)，长度为 len(values) - lag。
+    前一周同一天为 0 时变化率为 NaN（输出为 null）。
+    """
+    if np is not None:
+        v = np.asarray(values, dtype=np.int64)
+        cur, prev = v[lag:], v[:-lag] if lag else v
+        delta = cur - prev
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(prev > 0, delta / np.where(prev > 0, prev, 1), np.nan)
+        return delta, ratio
+
+    cur, prev = values[lag:], values[:len(values) - lag]
+    delta = [a - b for a, b in zip(cur, prev)]
+    ratio = [d / b if b > 0 else math.nan for d, b in zip(delta, prev)]
+    return delta, ratio
+
+
+def percentiles(values: Column, qs: Sequence[float]) -> List[float]:
+    """线性插值分位数（与 numpy.percentile 的默认方法一致）；空序列返回 NaN"""
+    if not len(values):
+        return [math.nan] * len(qs)
+    if np is not None:
+        return np.percentile(np.asarray(values, dtype=np.float64), list(qs)).tolist()
+
+    ordered = sorted(values)
+    out = []
+    for q in qs:
+        pos = (len(ordered) - 1) * q / 100.0
+        lo = int(math.floor(pos))
+        hi = min(lo + 1, len(ordered) - 1)
+        out.append(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo))
+    return out
+
+
+def nonzero(values: Column) -> Column:
+    if np is not None:
+        v = np.asarray(values)
+        return v[v > 0]
+    return [x for x in values if x > 0]
+
+
+def summary(values: Column) -> Tuple[int, int, float, int]:
+    """(天数, 有数据的天数, 日均, 最大值)"""
+    n = len(values)
+    if not n:
+        return 0, 0, 0.0, 0
+    if np is not None:
+        v = np.asarray(values)
+        return n, int(np.count_nonzero(v)), float(v.mean()), int(v.max())
+    return n, sum(1 for x in values if x), sum(values) / n, max(values)
+
+
+if __name__ == '__main__':
+    pass
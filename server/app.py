@@ -9,110 +9,155 @@
 @Description : 新增快捷键,月度,日,小时统计表,解决卡顿问题
 """
 
+import base64
+import json
 import os
+import sys
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, date, timedelta
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from starlette.responses import HTMLResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import HTMLResponse, Response, StreamingResponse
 from starlette.staticfiles import StaticFiles
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Index, func
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker
 
-# 数据库
+import metrics
+from server import analytics
+from server.cache import DEFAULT_MAX_ENTRIES, ResponseCache, etag_matches, make_etag
+from server.instrument import MetricsMiddleware
+from server.live import LiveFeed
+from server.ranking import KeyRanking
+from server.responses import FastJSONResponse, dumps
+from settings import get_section
+from storage import (
+    DEFAULT_ROLLUP_INTERVAL,
+    Maintenance,
+    Retention,
+    Rollup,
+    StatsDelta,
+    add_write_listener,
+    current_generation,
+    install_profile,
+    load_profile,
+    read_only_url,
+    write_delta,
+)
+from storage.models import (
+    Base,
+    DBMeta,
+    KeyTotalStats,
+    MonthlyKeyStats,
+    DailyActivityStats,
+    HourlyActivityStats,
+    HotkeyTotalStats,
+    HotkeyDailyStats,
+    SixHourActivityStats,
+    MonthlyActivityStats,
+    DailyKeyStats,
+    KeyWeekHourStats,
+    KeyBigramStats,
+    TypingHourlyStats,
+    HourlyKeyStats,
+    HourlyHotkeyStats,
+)
+from storage.timekeys import epoch_day, epoch_hour, epoch_month, hour_label, month_label
+from storage.typingstats import HourSummary, load_range
+
+# 数据库（环境变量 TRACEBOARD_DB 可指定其他数据库文件，基准测试用）
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-DB_PATH = os.path.join(PROJECT_ROOT, "key_events.db")
+DB_PATH = os.environ.get("TRACEBOARD_DB") or os.path.join(PROJECT_ROOT, "key_events.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+DB_PROFILE = load_profile()
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-Base = declarative_base()
-
-
-class DBMeta(Base):
-    __tablename__ = "db_meta"
-
-    key = Column(String, primary_key=True)
-    value = Column(String, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow)
+install_profile(engine, DB_PROFILE)
 
 
-# 统计表
-class KeyTotalStats(Base):
-    __tablename__ = "key_total_stats"
+SCHEMA_VERSION = 4  # 与 upgrade_db_v3.SCHEMA_LATEST 保持一致
 
-    id = Column(Integer, primary_key=True)
-    key_name = Column(String)
-    virtual_key_code = Column(Integer, index=True, unique=True)
-    total_count = Column(Integer, default=0)
-    last_updated = Column(DateTime, default=datetime.utcnow)
 
+def _upgrade_legacy_db():
+    """
+    旧版本的数据库（逐条事件表 / 字符串时间键）在建表之前就地升级到最新结构，与手动运行
+    upgrade_db_v3.py 相同。托盘程序没有控制台，升级失败时直接抛出，不带着旧结构启动
+    （否则各接口报 no such column，汇总任务反复失败，明细无限堆积）。
+    """
+    import upgrade_db_v3
 
-class MonthlyKeyStats(Base):
-    __tablename__ = "monthly_key_stats"
-
-    id = Column(Integer, primary_key=True)
-    key_name = Column(String)
-    virtual_key_code = Column(Integer, index=True)
-    stat_month = Column(String(7), index=True)  # YYYY-MM
-    monthly_count = Column(Integer, default=0)
-
-    __table_args__ = (
-        Index("idx_month_key_code", stat_month, virtual_key_code, unique=True),
-    )
+    if not upgrade_db_v3.needs_upgrade(DB_PATH):
+        return
+    print(f"ℹ️ 检测到旧结构的数据库，自动升级: {DB_PATH}")
+    try:
+        upgrade_db_v3.migrate(DB_PATH, drop_old=False)
+    except Exception as e:
+        raise RuntimeError(f"数据库自动升级失败，请手动运行: python upgrade_db_v3.py {DB_PATH}（{e}）") from e
+    if upgrade_db_v3.needs_upgrade(DB_PATH):
+        raise RuntimeError(f"数据库升级后仍为旧结构，请检查: {DB_PATH}")
 
 
-# 活跃度 & 快捷键统计
-class DailyActivityStats(Base):
-    __tablename__ = "daily_activity_stats"
+def _check_schema():
+    """新库直接记为最新版本"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT OR IGNORE INTO db_meta(key, value, updated_at) VALUES ('schema_version', ?, ?)",
+            (str(SCHEMA_VERSION), datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")),
+        )
 
-    stat_date = Column(String(10), primary_key=True)  # YYYY-MM-DD
 
-    key_presses = Column(Integer, default=0)
-    hotkey_triggers = Column(Integer, default=0)
-    last_updated = Column(DateTime, default=datetime.utcnow)
+# 创建数据库表（如果不存在）
+_upgrade_legacy_db()
+Base.metadata.create_all(bind=engine)
+_check_schema()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-class HourlyActivityStats(Base):
-    __tablename__ = "hourly_activity_stats"
+# 面板查询走独立的只读连接池（mode=ro + query_only）：
+# WAL 下与监听器的写入并行，永远不会拿写锁；连接在请求之间复用
+read_engine = create_engine(
+    read_only_url(DB_PATH),
+    connect_args={"check_same_thread": False},
+    pool_size=DB_PROFILE["read_pool_size"],
+    max_overflow=DB_PROFILE["read_pool_size"],
+)
+install_profile(read_engine, DB_PROFILE, read_only=True)
+ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
-    stat_hour = Column(String(13), primary_key=True)  # YYYY-MM-DD HH
+db_maintenance = Maintenance(engine, DB_PROFILE)
 
-    key_presses = Column(Integer, default=0)
-    hotkey_triggers = Column(Integer, default=0)
-    last_updated = Column(DateTime, default=datetime.utcnow)
-class HotkeyTotalStats(Base):
-    __tablename__ = "hotkey_total_stats"
 
-    id = Column(Integer, primary_key=True)
-    hotkey_id = Column(String, index=True, unique=True)  # e.g. "CTRL+C"
-    display_name = Column(String, default="")
-    total_count = Column(Integer, default=0)
-    last_updated = Column(DateTime, default=datetime.utcnow)
+def _rollup_interval() -> float:
+    try:
+        return float(get_section("rollup").get("interval", DEFAULT_ROLLUP_INTERVAL))
+    except (TypeError, ValueError):
+        return DEFAULT_ROLLUP_INTERVAL
 
 
-class HotkeyDailyStats(Base):
-    __tablename__ = "hotkey_daily_stats"
+# 分级保留：小时 -> 6 小时 -> 天，后台分批清理
+stats_retention = Retention(engine)
 
-    id = Column(Integer, primary_key=True)
-    stat_date = Column(String(10), index=True)  # YYYY-MM-DD
-    hotkey_id = Column(String, index=True)
-    display_name = Column(String, default="")
-    daily_count = Column(Integer, default=0)
-    last_triggered = Column(DateTime, default=datetime.utcnow)
+# 粗粒度统计表的汇总：定期执行，本进程写入后在下一次查询前执行
+stats_rollup = Rollup(engine, _rollup_interval())
+add_write_listener(stats_rollup.mark_dirty)
 
-    __table_args__ = (
-        Index("idx_hotkey_date_id", stat_date, hotkey_id, unique=True),
-    )
 
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    db_maintenance.start()
+    stats_rollup.start()
+    stats_retention.start()
+    yield
+    stats_retention.stop()
+    stats_rollup.stop()
+    db_maintenance.stop()
 
-# 创建数据库表（如果不存在）
-Base.metadata.create_all(bind=engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=_lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -122,6 +167,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if metrics.ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 if os.path.exists(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
@@ -139,6 +187,12 @@ class KeyEventCreate(BaseModel):
     virtual_key_code: int
 
 
+class KeyEventBatchResult(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[str] = []  # 仅返回前若干条被拒原因
+
+
 class ActivityDay(BaseModel):
     date: str  # YYYY-MM-DD
     key_presses: int
@@ -149,6 +203,8 @@ class ActivityHour(BaseModel):
     hour: str  # YYYY-MM-DD HH
     key_presses: int
     hotkey_triggers: int
+    # 数据粒度（小时）：超出保留期的数据已合并为 6 小时 / 天，整段的计数记在该段的第一个小时上
+    resolution: int = 1
 
 
 class ActivityMonth(BaseModel):
@@ -169,11 +225,206 @@ class HotkeyDay(BaseModel):
 
 
 # 工具函数
-def _daterange(start: date, end: date):
-    d = start
-    while d <= end:
-        yield d
-        d += timedelta(days=1)
+ANALYTICS_METRICS = ("key_presses", "hotkey_triggers")
+
+# 时间序列接口的输出格式：records 为对象数组；
+# columnar 为 {start, step（秒）, 各列数组}，不重复字段名与日期，第 i 个点的时间为 start + i * step
+FORMAT_RECORDS = "records"
+FORMAT_COLUMNAR = "columnar"
+SERIES_FORMATS = (FORMAT_RECORDS, FORMAT_COLUMNAR)
+
+
+def _check_format(fmt: str) -> str:
+    if fmt not in SERIES_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(SERIES_FORMATS)}")
+    return fmt
+
+
+def _series_payload(fmt: str, start: str, step: int, label_key: str, labels, columns: dict):
+    """columns 为 {字段名: 列}；records 格式才需要 labels()（逐点的时间标签）"""
+    if fmt == FORMAT_COLUMNAR:
+        return {"start": start, "step": step, **columns}
+    keys = (label_key,) + tuple(columns)
+    values = [analytics.to_list(col) for col in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(labels(), *values)]
+
+
+def _parse_end_date(end_date: Optional[str]) -> date:
+    if not end_date:
+        return date.today()
+    try:
+        return datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="end_date must be YYYY-MM-DD")
+
+
+def _daily_metric(metric: str, start: date, end: date):
+    """daily_activity_stats 中 [start, end] 的一列，按天补零"""
+    if metric not in ANALYTICS_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(ANALYTICS_METRICS)}")
+    column = getattr(DailyActivityStats, metric)
+    lo, hi = epoch_day(start), epoch_day(end)
+    db = ReadSession()
+    try:
+        rows = (
+            db.query(DailyActivityStats.epoch_day, column)
+            .filter(DailyActivityStats.epoch_day >= lo, DailyActivityStats.epoch_day <= hi)
+            .all()
+        )
+    finally:
+        db.close()
+    (values,) = analytics.fill_series(rows, lo, hi - lo + 1, 1)
+    return values
+
+
+MAX_BATCH_EVENTS = 100_000
+MAX_BATCH_ERRORS = 20
+MAX_CLOCK_SKEW = timedelta(days=1)
+
+
+def _parse_event_time(value: Any, now: datetime) -> datetime:
+    """
+    客户端时间戳：ISO-8601 字符串，或 Unix 时间（秒 / 毫秒）。
+    带时区的时间换算为本机本地时间，与监听器的分桶口径一致；缺省时使用服务器当前时间。
+    """
+    if value is None:
+        return now
+    if isinstance(value, bool):
+        raise ValueError("invalid timestamp")
+    if isinstance(value, (int, float)):
+        ts = float(value)
+        if ts > 1e11:  # 毫秒
+            ts /= 1000.0
+        return datetime.fromtimestamp(ts)
+    if isinstance(value, str):
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if dt.tzinfo is not None:
+            dt = dt.astimezone().replace(tzinfo=None)
+        return dt
+    raise ValueError("invalid timestamp")
+
+
+def _parse_batch_body(body: bytes, content_type: str) -> List[Any]:
+    """JSON 数组或 NDJSON（每行一个事件）；无法解析的 NDJSON 行原样保留，由调用方计为拒绝"""
+    text = body.decode("utf-8")
+    if "ndjson" not in content_type and ("json" in content_type or text.lstrip().startswith("[")):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("body must be a JSON array")
+        return items
+
+    items: List[Any] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(line)
+    return items
+
+
+def _aggregate_batch(items: List[Any]) -> Tuple[StatsDelta, List[str]]:
+    """按事件自身时间聚合到 StatsDelta（即按 vk / 月 / 日 / 小时分桶）"""
+    delta = StatsDelta()
+    errors: List[str] = []
+    now = datetime.now()
+    latest = now + MAX_CLOCK_SKEW
+
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("event must be an object")
+            vk = item.get("virtual_key_code")
+            if isinstance(vk, bool) or not isinstance(vk, int) or not 0 <= vk <= 255:
+                raise ValueError("virtual_key_code must be an integer within 0..255")
+            # 缺省时记为空串：不覆盖已有名称，读取时再显示为 "-"
+            key_name = item.get("key_name") or ""
+            if not isinstance(key_name, str):
+                raise ValueError("key_name must be a string")
+            ts = _parse_event_time(item.get("timestamp"), now)
+            if ts > latest:
+                raise ValueError("timestamp is too far in the future")
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            errors.append(f"#{i}: {e}")
+            continue
+        delta.add_key(key_name, vk, ts)
+
+    return delta, errors
+
+
+# 响应缓存：同一写入代数内直接返回上次序列化好的 JSON，不再查库、不再构造模型
+# 各接口的 TTL 上限（秒），用于兜住代数感知不到的变化
+CACHE_TTL = {
+    "activity_daily": 60,
+    "activity_hourly": 60,
+    "activity_monthly": 300,
+    "hotkey_totals": 60,
+    "hotkey_series": 60,
+    "key_week_hour": 300,
+    "key_day_matrix": 60,
+    "key_bigrams": 60,
+    "key_bigram_matrix": 60,
+    "analytics_rolling_mean": 60,
+    "analytics_week_over_week": 60,
+    "analytics_percentiles": 60,
+}
+_cache_cfg = get_section("cache")
+response_cache = ResponseCache(
+    max_entries=_cache_cfg.get("max_entries", DEFAULT_MAX_ENTRIES),
+    enabled=bool(_cache_cfg.get("enabled", True)),
+)
+
+
+# 实时推送：每次提交统计后把增量推给打开的面板
+live_feed = LiveFeed()
+add_write_listener(live_feed.publish)
+
+# 按键排名常驻内存：导入时（监听器开始写入之前）从数据库载入，之后随每次提交增量更新
+key_ranking = KeyRanking()
+try:
+    key_ranking.seed_from_db(read_engine, current_generation())
+except Exception as e:
+    print(f"[WARN] 载入按键排名失败: {e}")
+add_write_listener(key_ranking.apply)
+
+
+def _file_size(path: str) -> Optional[int]:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _cache_hit_ratio() -> Optional[float]:
+    total = response_cache.hits + response_cache.misses
+    return response_cache.hits / total if total else None
+
+
+if metrics.ENABLED:
+    metrics.REGISTRY.gauge("db_size_bytes", "数据库文件大小", lambda: _file_size(DB_PATH))
+    metrics.REGISTRY.gauge("db_wal_size_bytes", "WAL 文件大小", lambda: _file_size(DB_PATH + "-wal"))
+    metrics.REGISTRY.gauge("cache_hits_total", "响应缓存命中次数", lambda: response_cache.hits, kind="counter")
+    metrics.REGISTRY.gauge("cache_misses_total", "响应缓存未命中次数", lambda: response_cache.misses, kind="counter")
+    metrics.REGISTRY.gauge("cache_hit_ratio", "响应缓存命中率", _cache_hit_ratio)
+    metrics.REGISTRY.gauge("write_generation", "统计数据的写入代数", current_generation, kind="counter")
+
+
+def _cached_json(request: Request, endpoint: str, params: tuple, build) -> Response:
+    """
+    build() 返回可 JSON 序列化的数据；参数需是已解析后的值（如默认的“今天”要换成具体日期）。
+    带 ETag 返回；客户端的 If-None-Match 命中时返回 304，不再传输响应体。
+    """
+    stats_rollup.ensure_fresh()
+    generation = current_generation()
+    body, etag = response_cache.get_or_build(
+        (endpoint,) + params, generation, CACHE_TTL.get(endpoint, 60), lambda: dumps(build())
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # 路由
@@ -187,135 +438,138 @@ async def read_dashboard():
 
 
 @app.get("/key_counts", response_model=List[KeyCount])
-def get_key_counts():
-    db = SessionLocal()
-    try:
-        results = (
-            db.query(KeyTotalStats.key_name, KeyTotalStats.virtual_key_code, KeyTotalStats.total_count)
-            .order_by(KeyTotalStats.total_count.desc())
-            .all()
-        )
-        return [{"key_name": r[0], "count": r[2], "virtual_key_code": r[1]} for r in results]
-    finally:
-        db.close()
+def get_key_counts(request: Request, limit: Optional[int] = None, since_generation: Optional[int] = None):
+    """
+    按次数降序的按键统计，limit 只取前几名。
+    带 since_generation 时返回 {"generation", "max", "keys"}：keys 只含该代数之后变化过的按键（计数为总数），
+    客户端保存 generation 供下次请求；since_generation=0 返回全部。
+    """
+    if limit is not None and (limit <= 0 or limit > 1000):
+        raise HTTPException(status_code=400, detail="limit must be within 1..1000")
+    if since_generation is not None:
+        return Response(content=dumps(key_ranking.changes(since_generation, limit)), media_type="application/json",
+                        headers={"Cache-Control": "no-cache"})
+
+    generation, rows = key_ranking.top(limit)
+    body = dumps(rows)
+    etag = make_etag(generation, body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.post("/key_events", response_model=KeyEventCreate)
 def record_key_event(key_event: KeyEventCreate):
-    db = SessionLocal()
+    delta = StatsDelta()
+    delta.add_key(key_event.key_name, key_event.virtual_key_code, datetime.now())
     try:
-        vk = key_event.virtual_key_code
-        key_name = key_event.key_name
-        current_time = datetime.now()
-
-        current_month = current_time.strftime("%Y-%m")
-        today = current_time.strftime("%Y-%m-%d")
-        current_hour = current_time.strftime("%Y-%m-%d %H")
-
-        total_stat = db.query(KeyTotalStats).filter(KeyTotalStats.virtual_key_code == vk).first()
-        if total_stat:
-            total_stat.total_count = (total_stat.total_count or 0) + 1
-            total_stat.key_name = key_name or total_stat.key_name
-            total_stat.last_updated = current_time
-        else:
-            db.add(
-                KeyTotalStats(
-                    key_name=key_name,
-                    virtual_key_code=vk,
-                    total_count=1,
-                    last_updated=current_time,
-                )
-            )
+        write_delta(engine, delta)
+        return key_event
+    except Exception as e:
+        print(f"[WARN] record_key_event 失败: {e}")
+        raise HTTPException(status_code=500, detail="record_key_event failed")
 
-        monthly_stat = (
-            db.query(MonthlyKeyStats)
-            .filter(MonthlyKeyStats.virtual_key_code == vk, MonthlyKeyStats.stat_month == current_month)
-            .first()
-        )
-        if monthly_stat:
-            monthly_stat.monthly_count = (monthly_stat.monthly_count or 0) + 1
-            monthly_stat.key_name = key_name or monthly_stat.key_name
-        else:
-            db.add(
-                MonthlyKeyStats(
-                    key_name=key_name,
-                    virtual_key_code=vk,
-                    stat_month=current_month,
-                    monthly_count=1,
-                )
-            )
 
-        daily = db.query(DailyActivityStats).filter(DailyActivityStats.stat_date == today).first()
-        if daily:
-            daily.key_presses = (daily.key_presses or 0) + 1
-            daily.last_updated = current_time
-        else:
-            db.add(
-                DailyActivityStats(
-                    stat_date=today,
-                    key_presses=1,
-                    hotkey_triggers=0,
-                    last_updated=current_time,
-                )
-            )
+@app.post("/key_events/batch", response_model=KeyEventBatchResult)
+async def record_key_events_batch(request: Request):
+    """
+    批量写入远端转发的按键事件，请求体为 JSON 数组或 NDJSON：
+    {"key_name": "a", "virtual_key_code": 65, "timestamp": "2024-11-15T01:02:03+08:00"}
+    整批在内存中聚合后，一个事务写入。
+    """
+    body = await request.body()
+    try:
+        items = _parse_batch_body(body, request.headers.get("content-type", ""))
+    except ValueError as e:  # 包括 UnicodeDecodeError / JSONDecodeError
+        raise HTTPException(status_code=400, detail=f"invalid batch body: {e}")
+    if len(items) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_BATCH_EVENTS} events per batch")
+
+    delta, errors = _aggregate_batch(items)
+    if delta.events:
+        try:
+            await run_in_threadpool(write_delta, engine, delta)
+        except Exception as e:
+            print(f"[WARN] record_key_events_batch 失败: {e}")
+            raise HTTPException(status_code=500, detail="record_key_events_batch failed")
+
+    return KeyEventBatchResult(accepted=delta.events, rejected=len(errors), errors=errors[:MAX_BATCH_ERRORS])
+
+
+@app.get("/live")
+async def live_updates(request: Request):
+    """
+    SSE：事件 delta 为每次落库的增量（见 server.live.delta_payload），
+    resync 表示推送积压被丢弃，客户端应重新拉取完整数据
+    """
+    return StreamingResponse(
+        live_feed.stream(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        hourly = db.query(HourlyActivityStats).filter(HourlyActivityStats.stat_hour == current_hour).first()
-        if hourly:
-            hourly.key_presses = (hourly.key_presses or 0) + 1
-            hourly.last_updated = current_time
-        else:
-            db.add(
-                HourlyActivityStats(
-                    stat_hour=current_hour,
-                    key_presses=1,
-                    hotkey_triggers=0,
-                    last_updated=current_time,
-                )
-            )
 
-        db.commit()
-        return key_event
+@app.get("/ingest_stats")
+def get_ingest_stats():
+    # 监听器与服务同进程运行时才有数据；这里不主动导入，避免反向依赖 pynput
+    kb = sys.modules.get("listener.keyboard")
+    if kb is None:
+        raise HTTPException(status_code=404, detail="keyboard listener is not running in this process")
+    return kb.ingest_stats()
 
-    except Exception as e:
-        db.rollback()
-        print(f"[WARN] record_key_event 失败: {e}")
-        raise HTTPException(status_code=500, detail="record_key_event failed")
 
-    finally:
-        db.close()
+@app.get("/metrics")
+def get_metrics(format: str = "prometheus"):
+    """
+    Prometheus 文本格式的性能指标；format=json 返回面板使用的摘要（耗时为毫秒，附 p50 / p99）。
+    监听器与服务同进程运行时包含钩子回调、队列深度等采集侧指标。
+    """
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="metrics are disabled in config.toml")
+    if format == "json":
+        return metrics.REGISTRY.snapshot()
+    if format != "prometheus":
+        raise HTTPException(status_code=400, detail="format must be 'prometheus' or 'json'")
+    return Response(content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/activity_daily", response_model=List[ActivityDay])
-def get_activity_daily(days: int = 120, end_date: Optional[str] = None):
+def get_activity_daily(request: Request, days: int = 120, end_date: Optional[str] = None,
+                       fmt: str = Query(FORMAT_RECORDS, alias="format")):
     if days <= 0 or days > 3650:
         raise HTTPException(status_code=400, detail="days must be within 1..3650")
+    _check_format(fmt)
 
-    end = date.today() if not end_date else datetime.strptime(end_date, "%Y-%m-%d").date()
+    end = _parse_end_date(end_date)
     start = end - timedelta(days=days - 1)
 
-    db = SessionLocal()
-    try:
-        rows = (
-            db.query(DailyActivityStats.stat_date, DailyActivityStats.key_presses, DailyActivityStats.hotkey_triggers)
-            .filter(DailyActivityStats.stat_date >= start.strftime("%Y-%m-%d"))
-            .filter(DailyActivityStats.stat_date <= end.strftime("%Y-%m-%d"))
-            .all()
-        )
-        mp = {r[0]: (r[1] or 0, r[2] or 0) for r in rows}
-        out: List[ActivityDay] = []
-        for d in _daterange(start, end):
-            ds = d.strftime("%Y-%m-%d")
-            kp, hk = mp.get(ds, (0, 0))
-            out.append(ActivityDay(date=ds, key_presses=int(kp), hotkey_triggers=int(hk)))
-        return out
-    finally:
-        db.close()
+    def build():
+        db = ReadSession()
+        try:
+            rows = (
+                db.query(DailyActivityStats.epoch_day, DailyActivityStats.key_presses, DailyActivityStats.hotkey_triggers)
+                .filter(DailyActivityStats.epoch_day >= epoch_day(start), DailyActivityStats.epoch_day <= epoch_day(end))
+                .all()
+            )
+        finally:
+            db.close()
+
+        # 按天序号补零（向量化）
+        n = (end - start).days + 1
+        kp, hk = analytics.fill_series(rows, epoch_day(start), n, 2)
+        return _series_payload(fmt, start.isoformat(), 86400, "date", lambda: analytics.day_labels(start, n),
+                               {"key_presses": kp, "hotkey_triggers": hk})
+
+    return _cached_json(request, "activity_daily", (start, end, fmt), build)
 
 
 @app.get("/activity_hourly", response_model=List[ActivityHour])
-def get_activity_hourly(hours: int = 24, end_hour: Optional[str] = None):
+def get_activity_hourly(request: Request, hours: int = 24, end_hour: Optional[str] = None,
+                        fmt: str = Query(FORMAT_RECORDS, alias="format")):
     if hours <= 0 or hours > 24 * 60:
         raise HTTPException(status_code=400, detail="hours must be within 1..1440")
+    _check_format(fmt)
 
     # 末尾小时：默认当前小时（整点）
     if end_hour:
@@ -328,38 +582,84 @@ def get_activity_hourly(hours: int = 24, end_hour: Optional[str] = None):
         end_dt = now.replace(minute=0, second=0, microsecond=0)
 
     start_dt = end_dt - timedelta(hours=hours - 1)
-    start_key = start_dt.strftime("%Y-%m-%d %H")
-    end_key = end_dt.strftime("%Y-%m-%d %H")
+    start_key = epoch_hour(start_dt)
+    end_key = epoch_hour(end_dt)
 
-    db = SessionLocal()
-    try:
-        rows = (
-            db.query(HourlyActivityStats.stat_hour, HourlyActivityStats.key_presses, HourlyActivityStats.hotkey_triggers)
-            .filter(HourlyActivityStats.stat_hour >= start_key, HourlyActivityStats.stat_hour <= end_key)
-            .order_by(HourlyActivityStats.stat_hour.asc())
-            .all()
-        )
-        mp = {r[0]: (int(r[1] or 0), int(r[2] or 0)) for r in rows}
-
-        out: List[ActivityHour] = []
-        cur = start_dt
-        for _ in range(hours):
-            hk = cur.strftime("%Y-%m-%d %H")
-            kp, ht = mp.get(hk, (0, 0))
-            out.append(ActivityHour(hour=hk, key_presses=kp, hotkey_triggers=ht))
-            cur += timedelta(hours=1)
-        return out
-    finally:
-        db.close()
+    def build():
+        # 超出保留期的部分改读 6 小时桶 / 日统计（见 storage.retention）
+        raw_start, six_start = (None if c is None else epoch_hour(c) for c in stats_retention.cutoffs())
+        db = ReadSession()
+        try:
+            rows = (
+                db.query(HourlyActivityStats.epoch_hour, HourlyActivityStats.key_presses, HourlyActivityStats.hotkey_triggers)
+                .filter(HourlyActivityStats.epoch_hour >= start_key, HourlyActivityStats.epoch_hour <= end_key)
+                .all()
+            )
+            buckets = []
+            if raw_start is not None and start_key < raw_start:
+                buckets = (
+                    db.query(SixHourActivityStats.epoch_hour, SixHourActivityStats.key_presses, SixHourActivityStats.hotkey_triggers)
+                    .filter(SixHourActivityStats.epoch_hour >= start_key - start_key % 6,
+                            SixHourActivityStats.epoch_hour < raw_start)
+                    .all()
+                )
+            days = []
+            if six_start is not None and start_key < six_start:
+                days = (
+                    db.query(DailyActivityStats.epoch_day, DailyActivityStats.key_presses, DailyActivityStats.hotkey_triggers)
+                    .filter(DailyActivityStats.epoch_day >= start_key // 24, DailyActivityStats.epoch_day < six_start // 24)
+                    .all()
+                )
+        finally:
+            db.close()
+
+        key_presses = [0] * hours
+        hotkey_triggers = [0] * hours
+        resolution = [1] * hours
+
+        def add(first: int, span: int, kp, ht):
+            # 整段计数记在段内第一个落在查询范围里的小时上，段内各小时标记粒度
+            pos = max(first, start_key) - start_key
+            if pos >= hours:
+                return
+            key_presses[pos] += int(kp or 0)
+            hotkey_triggers[pos] += int(ht or 0)
+            if span > 1:
+                covered = min(first + span, end_key + 1) - start_key - pos
+                resolution[pos:pos + covered] = [span] * covered
+
+        for h, kp, ht in rows:
+            # 日统计覆盖的范围内以日表为准（尚未清理的小时行不重复计数）
+            if six_start is None or h >= six_start:
+                add(h, 1, kp, ht)
+        for b, kp, ht in buckets:
+            if six_start is None or b >= six_start:
+                add(b, 6, kp, ht)
+        for d, kp, ht in days:
+            add(d * 24, 24, kp, ht)
+
+        def labels():
+            return [hour_label(h) for h in range(start_key, end_key + 1)]
+
+        return _series_payload(fmt, hour_label(start_key), 3600, "hour", labels, {
+            "key_presses": key_presses,
+            "hotkey_triggers": hotkey_triggers,
+            "resolution": resolution,
+        })
+
+    return _cached_json(request, "activity_hourly", (start_key, end_key, fmt), build)
 
 
 @app.get("/activity_monthly", response_model=List[ActivityMonth])
-def get_activity_monthly(months: int = 24, end_month: Optional[str] = None):
+def get_activity_monthly(request: Request, months: int = 24, end_month: Optional[str] = None):
     if months <= 0 or months > 240:
         raise HTTPException(status_code=400, detail="months must be within 1..240")
 
     if end_month:
-        end_dt = datetime.strptime(end_month + "-01", "%Y-%m-%d").date()
+        try:
+            end_dt = datetime.strptime(end_month + "-01", "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="end_month must be YYYY-MM")
     else:
         today = date.today()
         end_dt = today.replace(day=1)
@@ -377,103 +677,427 @@ def get_activity_monthly(months: int = 24, end_month: Optional[str] = None):
     next_month_first = date(end_y, end_m, 1)
     end_last = next_month_first - timedelta(days=1)
 
-    db = SessionLocal()
-    try:
-        rows = (
-            db.query(DailyActivityStats.stat_date, DailyActivityStats.key_presses, DailyActivityStats.hotkey_triggers)
-            .filter(DailyActivityStats.stat_date >= start_dt.strftime("%Y-%m-%d"))
-            .filter(DailyActivityStats.stat_date <= end_last.strftime("%Y-%m-%d"))
-            .all()
-        )
+    def build():
+        db = ReadSession()
+        try:
+            rows = (
+                db.query(MonthlyActivityStats.epoch_month, MonthlyActivityStats.key_presses, MonthlyActivityStats.hotkey_triggers)
+                .filter(MonthlyActivityStats.epoch_month >= epoch_month(start_dt))
+                .filter(MonthlyActivityStats.epoch_month <= epoch_month(end_last))
+                .all()
+            )
+        finally:
+            db.close()
 
-        agg = {}
-        for ds, kp, hk in rows:
-            month = ds[:7]
-            a = agg.get(month, (0, 0))
-            agg[month] = (a[0] + int(kp or 0), a[1] + int(hk or 0))
-
-        out: List[ActivityMonth] = []
-        cur_y, cur_m = start_dt.year, start_dt.month
-        for _ in range(months):
-            month_str = f"{cur_y:04d}-{cur_m:02d}"
-            kp, hk = agg.get(month_str, (0, 0))
-            out.append(ActivityMonth(month=month_str, key_presses=kp, hotkey_triggers=hk))
-
-            cur_m += 1
-            if cur_m == 13:
-                cur_m = 1
-                cur_y += 1
-
-        return out
-    finally:
-        db.close()
+        first = epoch_month(start_dt)
+        kp, hk = analytics.fill_series(rows, first, months, 2)
+        return [
+            {"month": month_label(first + i), "key_presses": a, "hotkey_triggers": b}
+            for i, (a, b) in enumerate(zip(analytics.to_list(kp), analytics.to_list(hk)))
+        ]
+
+    return _cached_json(request, "activity_monthly", (start_dt, months), build)
 
 
 @app.get("/hotkey_totals", response_model=List[HotkeyTotal])
-def get_hotkey_totals(limit: int = 20):
+def get_hotkey_totals(request: Request, limit: int = 20):
     if limit <= 0 or limit > 200:
         raise HTTPException(status_code=400, detail="limit must be within 1..200")
-    db = SessionLocal()
-    try:
-        rows = (
-            db.query(HotkeyTotalStats.hotkey_id, HotkeyTotalStats.display_name, HotkeyTotalStats.total_count)
-            .order_by(HotkeyTotalStats.total_count.desc())
-            .limit(limit)
-            .all()
-        )
-        return [HotkeyTotal(hotkey_id=r[0], display_name=r[1] or r[0], total_count=int(r[2] or 0)) for r in rows]
-    finally:
-        db.close()
+
+    def build():
+        db = ReadSession()
+        try:
+            rows = (
+                db.query(HotkeyTotalStats.hotkey_id, HotkeyTotalStats.display_name, HotkeyTotalStats.total_count)
+                .order_by(HotkeyTotalStats.total_count.desc())
+                .limit(limit)
+                .all()
+            )
+        finally:
+            db.close()
+        return [{"hotkey_id": r[0], "display_name": r[1] or r[0], "total_count": int(r[2] or 0)} for r in rows]
+
+    return _cached_json(request, "hotkey_totals", (limit,), build)
 
 
 @app.get("/hotkey_series", response_model=List[HotkeyDay])
-def get_hotkey_series(hotkey_id: str, days: int = 120, end_date: Optional[str] = None):
+def get_hotkey_series(request: Request, hotkey_id: str, days: int = 120, end_date: Optional[str] = None,
+                      fmt: str = Query(FORMAT_RECORDS, alias="format")):
     if not hotkey_id:
         raise HTTPException(status_code=400, detail="hotkey_id is required")
     if days <= 0 or days > 3650:
         raise HTTPException(status_code=400, detail="days must be within 1..3650")
+    _check_format(fmt)
 
     is_all = (hotkey_id == "__ALL__") or (hotkey_id.strip().upper() in ("ALL", "ALL_HOTKEYS"))
 
-    end = date.today() if not end_date else datetime.strptime(end_date, "%Y-%m-%d").date()
+    end = _parse_end_date(end_date)
     start = end - timedelta(days=days - 1)
 
-    db = SessionLocal()
-    try:
-        if not is_all:
-            rows = (
-                db.query(HotkeyDailyStats.stat_date, HotkeyDailyStats.daily_count)
-                .filter(
-                    HotkeyDailyStats.hotkey_id == hotkey_id,
-                    HotkeyDailyStats.stat_date >= start.strftime("%Y-%m-%d"),
-                    HotkeyDailyStats.stat_date <= end.strftime("%Y-%m-%d"),
+    def build():
+        db = ReadSession()
+        try:
+            if not is_all:
+                rows = (
+                    db.query(HotkeyDailyStats.epoch_day, HotkeyDailyStats.daily_count)
+                    .filter(
+                        HotkeyDailyStats.hotkey_id == hotkey_id,
+                        HotkeyDailyStats.epoch_day >= epoch_day(start),
+                        HotkeyDailyStats.epoch_day <= epoch_day(end),
+                    )
+                    .all()
                 )
-                .order_by(HotkeyDailyStats.stat_date.asc())
-                .all()
-            )
-        else:
-            rows = (
-                db.query(
-                    HotkeyDailyStats.stat_date,
-                    func.sum(HotkeyDailyStats.daily_count).label("daily_count"),
+            else:
+                rows = (
+                    db.query(
+                        HotkeyDailyStats.epoch_day,
+                        func.sum(HotkeyDailyStats.daily_count).label("daily_count"),
+                    )
+                    .filter(
+                        HotkeyDailyStats.epoch_day >= epoch_day(start),
+                        HotkeyDailyStats.epoch_day <= epoch_day(end),
+                    )
+                    .group_by(HotkeyDailyStats.epoch_day)
+                    .all()
                 )
-                .filter(
-                    HotkeyDailyStats.stat_date >= start.strftime("%Y-%m-%d"),
-                    HotkeyDailyStats.stat_date <= end.strftime("%Y-%m-%d"),
+        finally:
+            db.close()
+
+        n = (end - start).days + 1
+        (counts,) = analytics.fill_series(rows, epoch_day(start), n, 1)
+        return _series_payload(fmt, start.isoformat(), 86400, "date", lambda: analytics.day_labels(start, n),
+                               {"count": counts})
+
+    return _cached_json(request, "hotkey_series", ("__ALL__" if is_all else hotkey_id, start, end, fmt), build)
+
+
+# 长区间分析：整列在 NumPy 中计算，结果直接输出为数组
+WEEKDAYS = 7
+HOURS_PER_DAY = 24
+
+
+def _parse_vks(vk: Optional[str]) -> Optional[List[int]]:
+    if not vk:
+        return None
+    try:
+        vks = [int(x) for x in vk.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="vk must be comma separated virtual key codes")
+    if not vks or len(vks) > 256:
+        raise HTTPException(status_code=400, detail="vk must list 1..256 virtual key codes")
+    return vks
+
+
+@app.get("/key_matrix/week_hour")
+def get_key_week_hour(request: Request, vk: Optional[int] = None, days: Optional[int] = None,
+                      end_date: Optional[str] = None):
+    """
+    星期 × 钟点（7 × 24，行 0 为周一）的按键次数，vk 缺省时为全部按键之和。
+    不带 days 时为全部历史（读 key_weekhour_stats）；带 days 时按 [end_date - days + 1, end_date]
+    读小时 × 按键明细的主键范围，最长为明细的保留天数。
+    """
+    fact_days = stats_retention.policy["fact_days"] or 3650
+    if days is not None and (days <= 0 or days > fact_days):
+        raise HTTPException(status_code=400, detail=f"days must be within 1..{fact_days} (omit it for all history)")
+    end = _parse_end_date(end_date) if days is not None else None
+    start = end - timedelta(days=days - 1) if days is not None else None
+
+    def build():
+        db = ReadSession()
+        try:
+            if start is None:
+                q = db.query(KeyWeekHourStats.weekday, KeyWeekHourStats.hour, func.sum(KeyWeekHourStats.count))
+                if vk is not None:
+                    q = q.filter(KeyWeekHourStats.virtual_key_code == vk)
+                cells = q.group_by(KeyWeekHourStats.weekday, KeyWeekHourStats.hour).all()
+            else:
+                lo, hi = epoch_day(start) * 24, epoch_day(end) * 24 + 23
+                q = (
+                    db.query(HourlyKeyStats.epoch_hour, func.sum(HourlyKeyStats.count))
+                    .filter(HourlyKeyStats.epoch_hour >= lo, HourlyKeyStats.epoch_hour <= hi)
                 )
-                .group_by(HotkeyDailyStats.stat_date)
-                .order_by(HotkeyDailyStats.stat_date.asc())
-                .all()
+                if vk is not None:
+                    q = q.filter(HourlyKeyStats.virtual_key_code == vk)
+                # 1970-01-01 是周四：(epoch_day + 3) % 7 得到以周一为 0 的星期
+                cells = [((h // 24 + 3) % WEEKDAYS, h % 24, n)
+                         for h, n in q.group_by(HourlyKeyStats.epoch_hour).all()]
+        finally:
+            db.close()
+
+        counts = analytics.fill_matrix(cells, WEEKDAYS, HOURS_PER_DAY)
+        return {
+            "vk": vk,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "counts": counts,
+            "max": max(max(row) for row in counts),
+            "total": sum(map(sum, counts)),
+        }
+
+    return _cached_json(request, "key_week_hour", (vk, start, end), build)
+
+
+@app.get("/key_matrix/day_key")
+def get_key_day_matrix(request: Request, days: int = 7, end_date: Optional[str] = None, top: int = 20,
+                       vk: Optional[str] = None):
+    """
+    天 × 按键的稠密矩阵：keys 按区间内总次数降序，counts[i][j] 为第 i 个按键在 start + j 天的次数。
+    vk 为逗号分隔的虚拟键码时只返回这些按键，否则取区间内前 top 名。
+    """
+    if days <= 0 or days > 3650:
+        raise HTTPException(status_code=400, detail="days must be within 1..3650")
+    if top <= 0 or top > 256:
+        raise HTTPException(status_code=400, detail="top must be within 1..256")
+    vks = _parse_vks(vk)
+    end = _parse_end_date(end_date)
+    start = end - timedelta(days=days - 1)
+
+    def build():
+        lo, hi = epoch_day(start), epoch_day(end)
+        db = ReadSession()
+        try:
+            q = (
+                db.query(DailyKeyStats.epoch_day, DailyKeyStats.virtual_key_code, DailyKeyStats.daily_count)
+                .filter(DailyKeyStats.epoch_day >= lo, DailyKeyStats.epoch_day <= hi)
             )
+            if vks is not None:
+                q = q.filter(DailyKeyStats.virtual_key_code.in_(vks))
+            rows = q.all()
+            names = dict(db.query(KeyTotalStats.virtual_key_code, KeyTotalStats.key_name).all())
+        finally:
+            db.close()
+
+        totals: dict = {}
+        for _, code, n in rows:
+            totals[code] = totals.get(code, 0) + int(n or 0)
+        order = sorted(totals, key=lambda code: (-totals[code], code))
+        if vks is None:
+            order = order[:top]
+        row_of = {code: i for i, code in enumerate(order)}
+        counts = analytics.fill_matrix(
+            ((row_of[code], d - lo, n) for d, code, n in rows if code in row_of), len(order), hi - lo + 1
+        )
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": hi - lo + 1,
+            "keys": [{"virtual_key_code": code, "key_name": names.get(code) or "-", "total": totals[code]} for code in order],
+            "counts": counts,
+            "max": max((max(r) for r in counts), default=0),
+        }
 
-        mp = {r[0]: int(r[1] or 0) for r in rows}
-        out: List[HotkeyDay] = []
-        for d in _daterange(start, end):
-            ds = d.strftime("%Y-%m-%d")
-            out.append(HotkeyDay(date=ds, count=mp.get(ds, 0)))
-        return out
-    finally:
-        db.close()
+    return _cached_json(request, "key_day_matrix", (start, end, top, tuple(vks) if vks else None), build)
+
+
+BIGRAM_SIZE = 256
+
+
+@app.get("/key_bigrams")
+def get_key_bigrams(request: Request, limit: int = 20, prev_vk: Optional[int] = None):
+    """次数最多的按键转移（前一个键 → 后一个键）；带 prev_vk 时只看该键之后按下的键（主键范围查询）"""
+    if limit <= 0 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit must be within 1..1000")
+    if prev_vk is not None and not 0 <= prev_vk < BIGRAM_SIZE:
+        raise HTTPException(status_code=400, detail=f"prev_vk must be within 0..{BIGRAM_SIZE - 1}")
+
+    def build():
+        db = ReadSession()
+        try:
+            q = db.query(KeyBigramStats.pair, KeyBigramStats.count)
+            total_q = db.query(func.sum(KeyBigramStats.count))
+            if prev_vk is not None:
+                lo, hi = prev_vk << 8, (prev_vk << 8) | 0xFF
+                q = q.filter(KeyBigramStats.pair >= lo, KeyBigramStats.pair <= hi)
+                total_q = total_q.filter(KeyBigramStats.pair >= lo, KeyBigramStats.pair <= hi)
+            rows = q.order_by(KeyBigramStats.count.desc(), KeyBigramStats.pair).limit(limit).all()
+            total = int(total_q.scalar() or 0)
+            names = dict(db.query(KeyTotalStats.virtual_key_code, KeyTotalStats.key_name).all())
+        finally:
+            db.close()
+
+        pairs = []
+        for pair, n in rows:
+            prev, vk_ = pair >> 8, pair & 0xFF
+            pairs.append({
+                "prev_vk": prev, "prev_name": names.get(prev) or "-",
+                "vk": vk_, "key_name": names.get(vk_) or "-",
+                "count": int(n or 0),
+            })
+        return {"prev_vk": prev_vk, "total": total, "pairs": pairs}
+
+    return _cached_json(request, "key_bigrams", (limit, prev_vk), build)
+
+
+@app.get("/key_bigrams/matrix")
+def get_key_bigram_matrix(request: Request):
+    """
+    256 × 256 的转移矩阵，行为前一个键、列为后一个键；data 为行优先的小端 uint32 数组的 base64
+    （256 KiB，客户端可直接 new Uint32Array(bytes.buffer) 使用）。
+    """
+    def build():
+        db = ReadSession()
+        try:
+            rows = [(pair, int(n or 0)) for pair, n in db.query(KeyBigramStats.pair, KeyBigramStats.count)]
+        finally:
+            db.close()
+        counts = [n for _, n in rows]
+        data = analytics.pack_uint32(rows, BIGRAM_SIZE * BIGRAM_SIZE)
+        return {
+            "size": BIGRAM_SIZE,
+            "dtype": "uint32",
+            "byteorder": "little",
+            "pairs": len(rows),
+            "total": sum(counts),
+            "max": max(counts, default=0),
+            "data": base64.b64encode(data).decode("ascii"),
+        }
+
+    return _cached_json(request, "key_bigram_matrix", (), build)
+
+
+def _hist_summary(hist, qs: List[float], scale: float = 1.0, digits: int = 1) -> dict:
+    mean = hist.mean()
+    return {
+        "count": hist.count,
+        "mean": None if mean is None else round(mean * scale, digits),
+        "values": [None if v is None else round(v * scale, digits) for v in (hist.quantile(q) for q in qs)],
+    }
+
+
+@app.get("/typing/speed")
+def get_typing_speed(days: int = 1, end_date: Optional[str] = None, q: str = "50,90,99"):
+    """
+    [end_date - days + 1, end_date] 内的打字速度分布：每分钟按键数（KPM，WPM 按 5 键一词折算）、
+    连续输入中的按下间隔、连续输入段长度与空闲间隔的分位数。
+    监听器与服务同进程运行时，合并尚未落库的小时，并返回最近 60 秒的实时 KPM。
+    """
+    if days <= 0 or days > 366:
+        raise HTTPException(status_code=400, detail="days must be within 1..366")
+    try:
+        qs = [float(x) for x in q.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be comma separated numbers")
+    if not qs or len(qs) > 20 or any(not 0 <= x <= 100 for x in qs):
+        raise HTTPException(status_code=400, detail="q must be 1..20 numbers within 0..100")
+
+    end = _parse_end_date(end_date)
+    start = end - timedelta(days=days - 1)
+    lo, hi = epoch_day(start) * 24, epoch_day(end) * 24 + 23
+
+    total = HourSummary(lo)
+    with read_engine.connect() as conn:
+        load_range(conn, lo, hi, total)
+
+    current_kpm = None
+    kb = sys.modules.get("listener.keyboard")
+    analyzer = getattr(kb, "typing_analyzer", None)
+    if analyzer is not None:
+        for s in analyzer.unsaved():
+            if lo <= s.epoch_hour <= hi:
+                total.merge(s)
+        current_kpm = analyzer.current_kpm(time.monotonic())
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "q": qs,
+        "key_presses": total.key_presses,
+        "active_minutes": total.active_minutes,
+        "bursts": total.bursts,
+        "kpm": {**_hist_summary(total.kpm, qs), "peak": total.peak_kpm},
+        "wpm": {**_hist_summary(total.kpm, qs, 1 / 5), "peak": round(total.peak_kpm / 5, 1)},
+        "interval_ms": _hist_summary(total.intervals, qs),
+        "burst_keys": _hist_summary(total.burst_keys, qs),
+        "idle_seconds": _hist_summary(total.idle, qs, 1 / 1000, 2),
+        "current_kpm": current_kpm,
+    }
+
+
+@app.get("/analytics/rolling_mean")
+def get_rolling_mean(request: Request, metric: str = "key_presses", days: int = 365, window: int = 7,
+                     end_date: Optional[str] = None):
+    if days <= 0 or days > 3650:
+        raise HTTPException(status_code=400, detail="days must be within 1..3650")
+    if window <= 0 or window > 365:
+        raise HTTPException(status_code=400, detail="window must be within 1..365")
+
+    end = _parse_end_date(end_date)
+    start = end - timedelta(days=days - 1)
+
+    def build():
+        # 多取 window - 1 天，区间开头的平均值也是完整窗口
+        padded = _daily_metric(metric, start - timedelta(days=window - 1), end)
+        mean = analytics.rolling_mean(padded, window)[window - 1:]
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "metric": metric,
+            "window": window,
+            "values": analytics.to_list(padded[window - 1:]),
+            "rolling_mean": analytics.to_list(mean, 3),
+        }
+
+    return _cached_json(request, "analytics_rolling_mean", (metric, start, end, window), build)
+
+
+@app.get("/analytics/week_over_week")
+def get_week_over_week(request: Request, metric: str = "key_presses", days: int = 90,
+                       end_date: Optional[str] = None):
+    if days <= 0 or days > 3650:
+        raise HTTPException(status_code=400, detail="days must be within 1..3650")
+
+    end = _parse_end_date(end_date)
+    start = end - timedelta(days=days - 1)
+
+    def build():
+        # 每天与上周同一天比较；多取 7 天作为第一周的对照
+        padded = _daily_metric(metric, start - timedelta(days=7), end)
+        delta, ratio = analytics.week_over_week(padded, 7)
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "metric": metric,
+            "values": analytics.to_list(padded[7:]),
+            "delta": analytics.to_list(delta),
+            "ratio": analytics.to_list(ratio, 4),
+        }
+
+    return _cached_json(request, "analytics_week_over_week", (metric, start, end), build)
+
+
+@app.get("/analytics/percentiles")
+def get_percentiles(request: Request, metric: str = "key_presses", days: int = 365, q: str = "50,90,99",
+                    active_only: bool = False, end_date: Optional[str] = None):
+    if days <= 0 or days > 3650:
+        raise HTTPException(status_code=400, detail="days must be within 1..3650")
+    try:
+        qs = [float(x) for x in q.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be comma separated numbers")
+    if not qs or len(qs) > 20 or any(not 0 <= x <= 100 for x in qs):
+        raise HTTPException(status_code=400, detail="q must be 1..20 numbers within 0..100")
+
+    end = _parse_end_date(end_date)
+    start = end - timedelta(days=days - 1)
+
+    def build():
+        values = _daily_metric(metric, start, end)
+        n, active, mean, peak = analytics.summary(values)
+        # active_only：只统计有按键的天，避免长期不用的日子把分位数拉到 0
+        sample = analytics.nonzero(values) if active_only else values
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "metric": metric,
+            "days": n,
+            "active_days": active,
+            "mean": round(mean, 3),
+            "max": peak,
+            "q": qs,
+            "values": analytics.to_list(analytics.percentiles(sample, qs), 3),
+        }
+
+    return _cached_json(request, "analytics_percentiles", (metric, start, end, tuple(qs), active_only), build)
 
 
 if __name__ == "__main__":
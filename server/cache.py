@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-cache.py
+@Description : 统计接口的响应缓存：按写入代数失效，带 TTL 上限与 LRU 容量限制
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+def make_etag(generation: int, body: bytes) -> str:
+    """强 ETag：写入代数 + 响应体校验和（只在构建响应时计算一次）"""
+    return f'"{generation:x}-{zlib.crc32(body):08x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀，支持逗号分隔的多个值与 *"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    key -> (generation, 写入时间, 响应体, ETag)。
+    命中条件：缓存时的写入代数等于当前代数，且未超过该接口的 TTL 上限。
+    TTL 用来兜住代数感知不到的变化（跨天、其他进程写库等）。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, enabled: bool = True):
+        self.max_entries = max(1, int(max_entries))
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, bytes, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, generation: int, ttl: float) -> Optional[Tuple[bytes, str]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation or time.monotonic() - entry[1] > ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key: Hashable, generation: int, body: bytes, etag: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic(), body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key: Hashable, generation: int, ttl: float,
+                     build: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """返回 (响应体, ETag)"""
+        hit = self.get(key, generation, ttl)
+        if hit is not None:
+            return hit
+        # 先取代数再查询：查询期间若有新提交，代数已变，下次请求会重新查询
+        body = build()
+        etag = make_etag(generation, body)
+        self.put(key, generation, body, etag)
+        return body, etag
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-live.py
+@Description : Server-Sent Events 实时推送：每次落库后把增量推给所有打开的面板
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from storage import StatsDelta
+from storage.timekeys import day_label, hour_label
+
+HEARTBEAT_SECONDS = 15.0
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+def delta_payload(delta: StatsDelta, generation: int) -> Dict[str, object]:
+    """
+    紧凑的增量：
+    keys    [[vk, +n, key_name], ...]
+    days    {YYYY-MM-DD: [+key_presses, +hotkey_triggers]}
+    hours   {YYYY-MM-DD HH: [+key_presses, +hotkey_triggers]}
+    hotkeys {hotkey_id: +n}
+    增量内部使用整数时间键，推送时换成与接口一致的日期字符串。
+    """
+    names = delta.key_names
+    return {
+        "gen": generation,
+        "keys": [[vk, n, names.get(vk) or ""] for vk, n in delta.key_total.items()],
+        "days": {day_label(d): [delta.daily_keys.get(d, 0), delta.daily_hotkeys.get(d, 0)]
+                 for d in delta.daily_keys.keys() | delta.daily_hotkeys.keys()},
+        "hours": {hour_label(h): [delta.hourly_keys.get(h, 0), delta.hourly_hotkeys.get(h, 0)]
+                  for h in delta.hourly_keys.keys() | delta.hourly_hotkeys.keys()},
+        "hotkeys": dict(delta.hotkey_total),
+    }
+
+
+def sse_frame(event: str, data: str, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, frame: bytes) -> None:
+        # 在事件循环线程中执行
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # 客户端太慢：丢掉积压，通知它整体重新拉取
+            self.overflowed = True
+
+
+class LiveFeed:
+    """
+    写入线程每次提交只调用一次 publish：增量只聚合、序列化一次，
+    同一份字节分发给所有订阅者。没有订阅者时什么也不做。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Set[_Subscriber] = set()
+        self.published = 0
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, delta: StatsDelta, generation: int) -> None:
+        with self._lock:
+            subscribers: List[_Subscriber] = list(self._subscribers)
+        if not subscribers or not delta.events:
+            return
+
+        data = json.dumps(delta_payload(delta, generation), ensure_ascii=False, separators=(",", ":"))
+        frame = sse_frame("delta", data, generation)
+        self.published += 1
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, frame)
+            except RuntimeError:
+                # 事件循环已关闭
+                self._discard(sub)
+
+    def _discard(self, sub: _Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    async def stream(self, is_disconnected) -> AsyncIterator[bytes]:
+        """单个客户端的 SSE 字节流；is_disconnected 为 request.is_disconnected"""
+        sub = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(sub)
+        try:
+            yield sse_frame("hello", "{}")
+            while True:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield b": ping\n\n"
+                    continue
+
+                if sub.overflowed:
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.overflowed = False
+                    yield sse_frame("resync", "{}")
+                    continue
+                yield frame
+        finally:
+            self._discard(sub)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-ranking.py
+@Description : 按键总次数的内存排名：启动时从数据库载入一次，之后由写入路径的增量逐键更新
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from storage import StatsDelta
+
+# 已汇总进总计表的次数 + 尚未汇总的小时明细（rolled 之后的部分），两条语句在同一个读事务内执行
+_TOTALS_SQL = "SELECT virtual_key_code, key_name, total_count FROM key_total_stats"
+_PENDING_SQL = """
+SELECT virtual_key_code, SUM(count - rolled)
+FROM hourly_key_stats
+WHERE count > rolled
+GROUP BY virtual_key_code
+"""
+
+
+class KeyRanking:
+    """
+    按次数降序排列的按键列表。计数只增不减，一次增量里的按键只需向前冒泡到新位置，
+    通常移动零到几位；最大值即第一名，不必遍历。
+    每个按键记录最近一次变化时的写入代数，用于只返回某个代数之后变化过的按键。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[int, int] = {}
+        self._names: Dict[int, str] = {}
+        self._changed: Dict[int, int] = {}          # vk -> 最近一次变化的写入代数
+        self._order: List[int] = []                 # 按次数降序的 vk
+        self._pos: Dict[int, int] = {}              # vk -> 在 _order 中的下标
+        self.generation = 0
+
+    def seed(self, rows: List[Tuple[int, Optional[str], int]], generation: int) -> None:
+        """rows 为 (vk, key_name, count)，同一 vk 可出现多次（累加）"""
+        with self._lock:
+            counts: Dict[int, int] = {}
+            names: Dict[int, str] = {}
+            for vk, name, n in rows:
+                counts[vk] = counts.get(vk, 0) + int(n or 0)
+                if name:
+                    names[vk] = name
+            self._counts, self._names = counts, names
+            self._order = sorted(counts, key=lambda vk: (-counts[vk], vk))
+            self._pos = {vk: i for i, vk in enumerate(self._order)}
+            self._changed = {vk: generation for vk in counts}
+            self.generation = generation
+
+    def seed_from_db(self, engine, generation: int) -> None:
+        with engine.connect() as conn, conn.begin():
+            rows = [(int(vk), name, n) for vk, name, n in conn.exec_driver_sql(_TOTALS_SQL)]
+            rows += [(int(vk), None, n) for vk, n in conn.exec_driver_sql(_PENDING_SQL)]
+        self.seed(rows, generation)
+
+    def apply(self, delta: StatsDelta, generation: int) -> None:
+        """写入监听：每次提交后调用，只处理本次增量涉及的按键"""
+        with self._lock:
+            if generation > self.generation:
+                self.generation = generation
+            counts, order, pos = self._counts, self._order, self._pos
+            for vk, n in delta.key_total.items():
+                name = delta.key_names.get(vk)
+                if name:
+                    self._names[vk] = name
+                self._changed[vk] = generation
+                if vk not in pos:
+                    pos[vk] = len(order)
+                    order.append(vk)
+                count = counts[vk] = counts.get(vk, 0) + n
+                i = pos[vk]
+                while i > 0 and counts[order[i - 1]] < count:
+                    above = order[i - 1]
+                    order[i] = above
+                    pos[above] = i
+                    i -= 1
+                order[i] = vk
+                pos[vk] = i
+
+    def _entry(self, vk: int) -> Dict[str, object]:
+        return {"key_name": self._names.get(vk) or "-", "count": self._counts[vk], "virtual_key_code": vk}
+
+    def top(self, limit: Optional[int] = None) -> Tuple[int, List[Dict[str, object]]]:
+        """(写入代数, 前 limit 名)；limit 为 None 时返回全部"""
+        with self._lock:
+            order = self._order if limit is None else self._order[:limit]
+            return self.generation, [self._entry(vk) for vk in order]
+
+    def changes(self, since: int, limit: Optional[int] = None) -> Dict[str, object]:
+        """
+        since 之后变化过的按键（按名次排列，limit 只看前 limit 名）。
+        since 为 0 或大于当前代数（服务重启后代数从头计）时返回全部。
+        """
+        with self._lock:
+            order = self._order if limit is None else self._order[:limit]
+            if 0 < since <= self.generation:
+                changed = self._changed
+                order = [vk for vk in order if changed[vk] > since]
+            return {
+                "generation": self.generation,
+                "max": self._counts[self._order[0]] if self._order else 0,
+                "keys": [self._entry(vk) for vk in order],
+            }
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-responses.py
+@Description : JSON 序列化：安装了 orjson 时使用 orjson（可直接序列化 NumPy 数组），否则使用标准库 json
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def _default(obj: Any):
+    # 标准库 json 不认识 NumPy 数组 / 标量
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """紧凑的 UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(data, option=_ORJSON_OPTIONS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """替代 JSONResponse，作为应用的默认响应类"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+if __name__ == '__main__':
+    pass
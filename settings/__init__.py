@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-__init__.py
+@Description : 读取项目根目录下的 config.toml
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10 及以下
+    tomllib = None
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+CONFIG_PATH = os.path.join(PROJECT_ROOT, "config.toml")
+
+_config: Optional[Dict[str, Any]] = None
+
+
+def load_config() -> Dict[str, Any]:
+    """读取 config.toml（只读一次），文件不存在或解析失败时返回空字典"""
+    global _config
+    if _config is not None:
+        return _config
+
+    data: Dict[str, Any] = {}
+    try:
+        if tomllib is not None:
+            with open(CONFIG_PATH, "rb") as f:
+                data = tomllib.load(f)
+        else:
+            import toml
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                data = toml.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[WARN] 读取 config.toml 失败: {e}")
+
+    _config = data
+    return _config
+
+
+def get_section(name: str) -> Dict[str, Any]:
+    section = load_config().get(name, {})
+    return section if isinstance(section, dict) else {}
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-__init__.py
+@Description : 统计数据的写入层，监听器与 HTTP 接口共用
+"""
+from .delta import StatsDelta
+from .engine import Maintenance, apply_pragmas, apply_read_pragmas, install_profile, load_profile, read_only_url
+from .generation import (
+    add_write_listener,
+    bump_generation,
+    current_generation,
+    remove_write_listener,
+    write_delta,
+)
+from .retention import Retention, load_retention, six_hour_bucket, tier_cutoffs
+from .rollup import DEFAULT_ROLLUP_INTERVAL, Rollup, rollup
+from .upsert import apply_delta
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-delta.py
+@Description : 统计增量：按各统计表的唯一键累加的计数器
+"""
+
+from __future__ import annotations
+
+import datetime
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from storage.timekeys import EPOCH_ORDINAL
+
+
+class StatsDelta:
+    """
+    一段时间内的统计增量。
+    落库只写 key_hours / hotkey_hours 两张明细表（见 storage.rollup），
+    其余粗粒度计数供实时推送直接使用，不再逐表写入。
+    """
+
+    def __init__(self):
+        # 时间键为整数（见 storage.timekeys）：小时 / 天 / 月均从 1970-01-01 起计
+        self.key_hours: Counter = Counter()            # (epoch_hour, vk) -> n，落库的唯一粒度
+        self.key_total: Counter = Counter()            # vk -> n
+        self.key_names: Dict[int, str] = {}            # vk -> 最近一次的 key_name
+        self.monthly: Counter = Counter()              # (epoch_month, vk) -> n
+        self.daily_keys: Counter = Counter()           # epoch_day -> n
+        self.hourly_keys: Counter = Counter()          # epoch_hour -> n
+
+        self.hotkey_hours: Counter = Counter()         # (epoch_hour, hotkey_id) -> n，落库的唯一粒度
+        self.hotkey_total: Counter = Counter()         # hotkey_id -> n
+        self.hotkey_names: Dict[str, str] = {}         # hotkey_id -> display_name
+        self.hotkey_daily: Counter = Counter()         # (epoch_day, hotkey_id) -> n
+        self.daily_hotkeys: Counter = Counter()        # epoch_day -> n
+        self.hourly_hotkeys: Counter = Counter()       # epoch_hour -> n
+
+        self.bigrams: Counter = Counter()              # (prev_vk << 8) | vk -> n，见 listener.bigrams
+
+        self.events = 0
+        self.last_ts: Optional[datetime.datetime] = None
+
+        self._hour_cache: Tuple[Optional[tuple], Tuple[int, int, int]] = (None, (0, 0, 0))
+
+    def __len__(self) -> int:
+        return self.events
+
+    def _time_keys(self, now: datetime.datetime) -> Tuple[int, int, int]:
+        # 同一小时内的事件复用 (epoch_hour, epoch_day, epoch_month)
+        stamp = (now.year, now.month, now.day, now.hour)
+        if self._hour_cache[0] != stamp:
+            day = now.toordinal() - EPOCH_ORDINAL
+            self._hour_cache = (stamp, (day * 24 + now.hour, day, (now.year - 1970) * 12 + now.month - 1))
+        return self._hour_cache[1]
+
+    def add_key(self, key_name: str, vk: int, now: datetime.datetime, n: int = 1) -> None:
+        hour, day, month = self._time_keys(now)
+        self.key_hours[(hour, vk)] += n
+        self.key_total[vk] += n
+        if key_name:
+            self.key_names[vk] = key_name
+        self.monthly[(month, vk)] += n
+        self.daily_keys[day] += n
+        self.hourly_keys[hour] += n
+        self.events += n
+        if self.last_ts is None or now > self.last_ts:
+            self.last_ts = now
+
+    def add_hotkey(self, hotkey_id: str, display_name: str, now: datetime.datetime, n: int = 1) -> None:
+        hour, day, _ = self._time_keys(now)
+        self.hotkey_hours[(hour, hotkey_id)] += n
+        self.hotkey_total[hotkey_id] += n
+        if display_name:
+            self.hotkey_names[hotkey_id] = display_name
+        self.hotkey_daily[(day, hotkey_id)] += n
+        self.daily_hotkeys[day] += n
+        self.hourly_hotkeys[hour] += n
+        self.events += n
+        if self.last_ts is None or now > self.last_ts:
+            self.last_ts = now
+
+    def add_bigram(self, pair: int, n: int = 1) -> None:
+        """按键转移只是附带的计数，不计入 events"""
+        self.bigrams[pair] += n
+
+    def merge(self, other: "StatsDelta") -> None:
+        """把 other 的增量并入自身（同名键以 other 为准，视为更新的数据）"""
+        self.key_hours.update(other.key_hours)
+        self.key_total.update(other.key_total)
+        self.key_names.update(other.key_names)
+        self.monthly.update(other.monthly)
+        self.daily_keys.update(other.daily_keys)
+        self.hourly_keys.update(other.hourly_keys)
+        self.hotkey_hours.update(other.hotkey_hours)
+        self.hotkey_total.update(other.hotkey_total)
+        self.hotkey_names.update(other.hotkey_names)
+        self.hotkey_daily.update(other.hotkey_daily)
+        self.daily_hotkeys.update(other.daily_hotkeys)
+        self.hourly_hotkeys.update(other.hourly_hotkeys)
+        self.bigrams.update(other.bigrams)
+        self.events += other.events
+        if other.last_ts is not None and (self.last_ts is None or other.last_ts > self.last_ts):
+            self.last_ts = other.last_ts
+
+
+if __name__ == '__main__':
+    pass
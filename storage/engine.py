@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-engine.py
+@Description : SQLite 连接参数（PRAGMA）配置与定期维护（checkpoint / optimize）
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from settings import get_section
+
+# config.toml 的 [database] 段可覆盖这些值；profile = "off" 时保持 SQLite 默认行为
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "profile": "tuned",
+    "journal_mode": "WAL",          # 读写互不阻塞
+    "synchronous": "NORMAL",        # WAL 下只在 checkpoint 时 fsync
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16000,           # 负数表示 KiB，约 16 MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,           # 毫秒
+    "auto_vacuum": "INCREMENTAL",   # 只对新建的数据库生效；已有数据库需手动 VACUUM 一次才会切换
+    "read_pool_size": 4,            # 面板查询使用的只读连接数
+    "checkpoint_interval": 300,     # 秒，0 表示不做定期 checkpoint
+    "optimize_interval": 3600,      # 秒，0 表示不做定期 PRAGMA optimize
+}
+
+_CHOICES = {
+    "journal_mode": ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"),
+    "synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+    "temp_store": ("DEFAULT", "FILE", "MEMORY"),
+    "auto_vacuum": ("NONE", "FULL", "INCREMENTAL"),
+}
+_INTS = ("mmap_size", "cache_size", "busy_timeout", "read_pool_size", "checkpoint_interval", "optimize_interval")
+
+
+def load_profile(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值与 [database] 配置，并校验取值（PRAGMA 不能用参数绑定，只接受白名单内的值）"""
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(get_section("database"))
+    if overrides:
+        profile.update(overrides)
+
+    for key, choices in _CHOICES.items():
+        value = str(profile[key]).upper()
+        if value not in choices:
+            print(f"[WARN] database.{key} = {profile[key]!r} 无效，使用 {DEFAULT_PROFILE[key]}")
+            value = DEFAULT_PROFILE[key]
+        profile[key] = value
+    for key in _INTS:
+        try:
+            profile[key] = int(profile[key])
+        except (TypeError, ValueError):
+            print(f"[WARN] database.{key} = {profile[key]!r} 无效，使用 {DEFAULT_PROFILE[key]}")
+            profile[key] = DEFAULT_PROFILE[key]
+    return profile
+
+
+def profile_enabled(profile: Dict[str, Any]) -> bool:
+    return str(profile.get("profile", "tuned")).lower() != "off"
+
+
+def apply_pragmas(dbapi_conn, profile: Dict[str, Any]) -> None:
+    """对一个原始 sqlite3 连接执行配置中的 PRAGMA"""
+    if not profile_enabled(profile):
+        return
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"PRAGMA busy_timeout={profile['busy_timeout']}")
+        # 必须在建表之前设置；数据库已有表时只记录设置，不改变现有文件
+        cur.execute(f"PRAGMA auto_vacuum={profile['auto_vacuum']}")
+        cur.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+        cur.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        cur.execute(f"PRAGMA mmap_size={profile['mmap_size']}")
+        cur.execute(f"PRAGMA cache_size={profile['cache_size']}")
+        cur.execute(f"PRAGMA temp_store={profile['temp_store']}")
+    finally:
+        cur.close()
+
+
+def apply_read_pragmas(dbapi_conn, profile: Dict[str, Any]) -> None:
+    """
+    只读连接：journal_mode 是数据库级设置，由写连接负责；
+    这里只设缓存相关参数，并用 query_only 兜底禁止任何写操作
+    """
+    cur = dbapi_conn.cursor()
+    try:
+        if profile_enabled(profile):
+            cur.execute(f"PRAGMA busy_timeout={profile['busy_timeout']}")
+            cur.execute(f"PRAGMA mmap_size={profile['mmap_size']}")
+            cur.execute(f"PRAGMA cache_size={profile['cache_size']}")
+            cur.execute(f"PRAGMA temp_store={profile['temp_store']}")
+        cur.execute("PRAGMA query_only=1")
+    finally:
+        cur.close()
+
+
+def install_profile(engine, profile: Dict[str, Any], read_only: bool = False) -> None:
+    """让 engine 新建的每个连接都执行一遍 PRAGMA"""
+    from sqlalchemy import event
+
+    apply = apply_read_pragmas if read_only else apply_pragmas
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        apply(dbapi_conn, profile)
+
+
+def read_only_url(db_path: str) -> str:
+    """以 mode=ro 的 URI 方式打开同一个数据库文件"""
+    from pathlib import Path
+
+    return f"sqlite:///{Path(db_path).absolute().as_uri()}?mode=ro&uri=true"
+
+
+class Maintenance:
+    """后台线程：定期 wal_checkpoint(PASSIVE) 与 PRAGMA optimize，都不会阻塞写入"""
+
+    def __init__(self, engine, profile: Dict[str, Any]):
+        self._engine = engine
+        self.checkpoint_interval = profile["checkpoint_interval"]
+        self.optimize_interval = profile["optimize_interval"]
+        self.wal = profile["journal_mode"] == "WAL" and profile_enabled(profile)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _tick(self) -> float:
+        intervals = [i for i in (self.checkpoint_interval if self.wal else 0, self.optimize_interval) if i > 0]
+        return min(intervals) if intervals else 0
+
+    def checkpoint(self) -> None:
+        with self._engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def optimize(self) -> None:
+        with self._engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+
+    def _run(self) -> None:
+        tick = self._tick()
+        last_checkpoint = last_optimize = time.monotonic()
+        while not self._stopped.wait(tick):
+            now = time.monotonic()
+            try:
+                if self.wal and self.checkpoint_interval > 0 and now - last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+                    last_checkpoint = now
+                if self.optimize_interval > 0 and now - last_optimize >= self.optimize_interval:
+                    self.optimize()
+                    last_optimize = now
+            except Exception as e:
+                print(f"[WARN] 数据库维护失败: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None or not self._tick():
+            return
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-generation.py
+@Description : 写入代数（generation）：每次提交统计数据后递增，读缓存据此判断数据是否变化
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, List, Optional
+
+import metrics
+from storage.delta import StatsDelta
+from storage.upsert import apply_delta
+
+_lock = threading.Lock()
+_generation = 0
+_write_listeners: List[Callable[[StatsDelta, int], None]] = []
+
+# write_delta 由落库线程、/key_events 的线程池与批量接口并发调用，计数需加锁
+_commit_seconds = (metrics.REGISTRY.histogram("db_commit_seconds", "统计增量写入事务耗时", shared=True)
+                   if metrics.ENABLED else None)
+_written_events = (metrics.REGISTRY.counter("db_written_events_total", "已落库的计数", shared=True)
+                   if metrics.ENABLED else None)
+
+
+def current_generation() -> int:
+    return _generation
+
+
+def bump_generation() -> int:
+    global _generation
+    with _lock:
+        _generation += 1
+        return _generation
+
+
+def add_write_listener(callback: Callable[[StatsDelta, int], None]) -> None:
+    """注册提交后的回调 callback(delta, generation)，在写入线程中同步调用，应尽快返回"""
+    _write_listeners.append(callback)
+
+
+def remove_write_listener(callback: Callable[[StatsDelta, int], None]) -> None:
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+
+def write_delta(engine, delta: StatsDelta, extra: Optional[Callable] = None) -> int:
+    """
+    一个事务写入增量（extra(conn) 在同一事务内执行附加语句），提交后递增写入代数，
+    并通知已注册的监听者。返回新的代数。
+    """
+    with metrics.Timer(_commit_seconds):
+        with engine.begin() as conn:
+            apply_delta(conn, delta)
+            if extra is not None:
+                extra(conn)
+    if _written_events is not None:
+        _written_events.inc(delta.events)
+    generation = bump_generation()
+    for callback in list(_write_listeners):
+        try:
+            callback(delta, generation)
+        except Exception as e:
+            print(f"[WARN] write listener 失败: {e}")
+    return generation
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-models.py
+@Description : 统计表的 ORM 定义；导入时不连接任何数据库，服务、回放与基准脚本共用
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class DBMeta(Base):
+    __tablename__ = "db_meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# 统计表
+class KeyTotalStats(Base):
+    __tablename__ = "key_total_stats"
+
+    id = Column(Integer, primary_key=True)
+    key_name = Column(String)
+    virtual_key_code = Column(Integer, index=True, unique=True)
+    total_count = Column(Integer, default=0)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+
+class MonthlyKeyStats(Base):
+    __tablename__ = "monthly_key_stats"
+
+    epoch_month = Column(Integer, primary_key=True)  # 自 1970-01 起的月数（见 storage.timekeys）
+    virtual_key_code = Column(Integer, primary_key=True)
+    key_name = Column(String)
+    monthly_count = Column(Integer, default=0)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+# 活跃度 & 快捷键统计
+# 时间键为整数并作为 WITHOUT ROWID 表的聚簇主键：范围查询直接按主键顺序扫描，无需另建索引
+class DailyActivityStats(Base):
+    __tablename__ = "daily_activity_stats"
+
+    epoch_day = Column(Integer, primary_key=True)  # 自 1970-01-01 起的天数
+
+    key_presses = Column(Integer, default=0)
+    hotkey_triggers = Column(Integer, default=0)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class HourlyActivityStats(Base):
+    __tablename__ = "hourly_activity_stats"
+
+    epoch_hour = Column(Integer, primary_key=True)  # 自 1970-01-01 00 点起的小时数
+
+    key_presses = Column(Integer, default=0)
+    hotkey_triggers = Column(Integer, default=0)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class HotkeyTotalStats(Base):
+    __tablename__ = "hotkey_total_stats"
+
+    id = Column(Integer, primary_key=True)
+    hotkey_id = Column(String, index=True, unique=True)  # e.g. "CTRL+C"
+    display_name = Column(String, default="")
+    total_count = Column(Integer, default=0)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+
+class HotkeyDailyStats(Base):
+    __tablename__ = "hotkey_daily_stats"
+
+    epoch_day = Column(Integer, primary_key=True)
+    hotkey_id = Column(String, primary_key=True)
+    display_name = Column(String, default="")
+    daily_count = Column(Integer, default=0)
+    last_triggered = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class SixHourActivityStats(Base):
+    # 超出小时级保留期的数据按 6 小时合并（见 storage.retention）
+    __tablename__ = "activity_6h_stats"
+
+    epoch_hour = Column(Integer, primary_key=True)  # 桶内第一个小时，即钟面 00/06/12/18 点
+
+    key_presses = Column(Integer, default=0)
+    hotkey_triggers = Column(Integer, default=0)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class MonthlyActivityStats(Base):
+    __tablename__ = "monthly_activity_stats"
+
+    epoch_month = Column(Integer, primary_key=True)
+
+    key_presses = Column(Integer, default=0)
+    hotkey_triggers = Column(Integer, default=0)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+# 按键 × 时间的矩阵：天 × 按键（按日期范围查询走主键），星期 × 钟点 × 按键（全部历史累计）
+class DailyKeyStats(Base):
+    __tablename__ = "daily_key_stats"
+
+    epoch_day = Column(Integer, primary_key=True)
+    virtual_key_code = Column(Integer, primary_key=True)
+    daily_count = Column(Integer, default=0)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class KeyWeekHourStats(Base):
+    __tablename__ = "key_weekhour_stats"
+
+    virtual_key_code = Column(Integer, primary_key=True)
+    weekday = Column(Integer, primary_key=True)  # 0 = 周一
+    hour = Column(Integer, primary_key=True)     # 钟面小时 0..23
+    count = Column(Integer, default=0)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+# 按键转移：pair = (前一个 vk << 8) | vk，全部历史累计（见 listener.bigrams）
+class KeyBigramStats(Base):
+    __tablename__ = "key_bigram_stats"
+
+    pair = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+# 打字速度的每小时摘要：直方图为 storage.typingstats.LogHistogram 的编码
+class TypingHourlyStats(Base):
+    __tablename__ = "typing_hourly_stats"
+
+    epoch_hour = Column(Integer, primary_key=True)
+    key_presses = Column(Integer, default=0)
+    active_minutes = Column(Integer, default=0)
+    bursts = Column(Integer, default=0)
+    peak_kpm = Column(Integer, default=0)
+    intervals = Column(LargeBinary)   # 连续输入中的按下间隔（毫秒）
+    idle = Column(LargeBinary)        # 两段输入之间的空闲（毫秒）
+    kpm = Column(LargeBinary)         # 每个有输入的分钟的按键数
+    burst_keys = Column(LargeBinary)  # 每段连续输入的按键数
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+# 明细表：写入路径只更新这两张表，其余统计表由 storage.rollup 汇总得到
+class HourlyKeyStats(Base):
+    __tablename__ = "hourly_key_stats"
+
+    epoch_hour = Column(Integer, primary_key=True)
+    virtual_key_code = Column(Integer, primary_key=True)
+    key_name = Column(String)
+    count = Column(Integer, default=0)
+    rolled = Column(Integer, default=0)  # 已汇总进粗粒度表的部分
+    seq = Column(Integer, default=0, index=True)  # 最近一次写入的序号
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class HourlyHotkeyStats(Base):
+    __tablename__ = "hourly_hotkey_stats"
+
+    epoch_hour = Column(Integer, primary_key=True)
+    hotkey_id = Column(String, primary_key=True)
+    display_name = Column(String, default="")
+    count = Column(Integer, default=0)
+    rolled = Column(Integer, default=0)
+    seq = Column(Integer, default=0, index=True)
+    last_triggered = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-retention.py
+@Description : 小时活跃度的分级保留：近期按小时，较早按 6 小时，更早只保留日统计
+"""
+
+from __future__ import annotations
+
+import datetime
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+from settings import get_section
+from storage.generation import bump_generation
+from storage.timekeys import epoch_hour
+
+# config.toml 的 [retention] 段可覆盖；天数为 0 表示该级别永久保留
+DEFAULT_RETENTION: Dict[str, int] = {
+    "hourly_days": 14,        # hourly_activity_stats 保留的天数，更早的合并进 6 小时桶
+    "six_hour_days": 180,     # activity_6h_stats 保留的天数，更早的只剩 daily_activity_stats
+    "fact_days": 400,         # hourly_key_stats / hourly_hotkey_stats 明细保留的天数（只删已汇总的行）
+    "interval": 600,          # 秒，两次清理之间的间隔
+    "batch_size": 500,        # 每个事务最多处理的行数，保证写锁只被占用很短时间
+    "max_batches": 200,       # 每轮每项任务最多执行的批次，剩余的留到下一轮
+    "vacuum_pages": 2000,     # 每轮 incremental_vacuum 最多归还的页数
+}
+
+# 同一事务内先把最早的一批小时行加到 6 小时桶，再删除同一批行。
+# 6 小时桶以桶内第一个小时的 epoch_hour 为键：一天 24 小时可被 6 整除，即钟面上的 00 / 06 / 12 / 18 点
+DOWNSAMPLE_HOURLY = """
+WITH old AS (
+  SELECT epoch_hour, key_presses, hotkey_triggers, last_updated
+  FROM hourly_activity_stats
+  WHERE epoch_hour < :cutoff
+  ORDER BY epoch_hour
+  LIMIT :batch
+)
+INSERT INTO activity_6h_stats(epoch_hour, key_presses, hotkey_triggers, last_updated)
+SELECT epoch_hour - epoch_hour % 6 AS bucket, SUM(COALESCE(key_presses, 0)), SUM(COALESCE(hotkey_triggers, 0)),
+       MAX(last_updated)
+FROM old
+WHERE true
+GROUP BY bucket
+ON CONFLICT(epoch_hour) DO UPDATE SET
+  key_presses = COALESCE(key_presses, 0) + excluded.key_presses,
+  hotkey_triggers = COALESCE(hotkey_triggers, 0) + excluded.hotkey_triggers,
+  last_updated = CASE WHEN last_updated IS NULL OR excluded.last_updated > last_updated
+                      THEN excluded.last_updated ELSE last_updated END
+"""
+
+DELETE_HOURLY = """
+DELETE FROM hourly_activity_stats WHERE epoch_hour IN (
+  SELECT epoch_hour FROM hourly_activity_stats WHERE epoch_hour < :cutoff ORDER BY epoch_hour LIMIT :batch
+)
+"""
+
+# 6 小时桶过期后直接删除：对应的天已完整记录在 daily_activity_stats
+EXPIRE_SIX_HOUR = """
+DELETE FROM activity_6h_stats WHERE epoch_hour IN (
+  SELECT epoch_hour FROM activity_6h_stats WHERE epoch_hour < :cutoff ORDER BY epoch_hour LIMIT :batch
+)
+"""
+
+# 明细只删除已经汇总进粗粒度表的行（count = rolled）
+EXPIRE_KEY_FACTS = """
+DELETE FROM hourly_key_stats WHERE (epoch_hour, virtual_key_code) IN (
+  SELECT epoch_hour, virtual_key_code FROM hourly_key_stats WHERE epoch_hour < :cutoff AND count = rolled LIMIT :batch
+)
+"""
+
+EXPIRE_HOTKEY_FACTS = """
+DELETE FROM hourly_hotkey_stats WHERE (epoch_hour, hotkey_id) IN (
+  SELECT epoch_hour, hotkey_id FROM hourly_hotkey_stats WHERE epoch_hour < :cutoff AND count = rolled LIMIT :batch
+)
+"""
+
+
+# 每批一个写事务，耗时即占用写锁的时间
+_batch_seconds = metrics.REGISTRY.histogram("retention_batch_seconds", "过期数据清理单批事务耗时") if metrics.ENABLED else None
+
+
+def load_retention(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    policy = dict(DEFAULT_RETENTION)
+    policy.update(get_section("retention"))
+    if overrides:
+        policy.update(overrides)
+    for key, default in DEFAULT_RETENTION.items():
+        try:
+            policy[key] = max(0, int(policy[key]))
+        except (TypeError, ValueError):
+            print(f"[WARN] retention.{key} = {policy[key]!r} 无效，使用 {default}")
+            policy[key] = default
+    # 6 小时级别必须覆盖到小时级别之后
+    if policy["hourly_days"] and policy["six_hour_days"] and policy["six_hour_days"] < policy["hourly_days"]:
+        print("[WARN] retention.six_hour_days 小于 hourly_days，按 hourly_days 处理")
+        policy["six_hour_days"] = policy["hourly_days"]
+    policy["batch_size"] = max(1, policy["batch_size"])
+    return policy
+
+
+def six_hour_bucket(dt: datetime.datetime) -> datetime.datetime:
+    return dt.replace(hour=dt.hour - dt.hour % 6, minute=0, second=0, microsecond=0)
+
+
+def tier_cutoffs(policy: Dict[str, int], now: datetime.datetime) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+    """
+    返回 (小时级起点, 6 小时级起点)：早于前者的小时数据按 6 小时桶读取，早于后者的按天读取。
+    小时级起点对齐到 6 小时边界，6 小时级起点对齐到零点，保证每个桶只落在一个级别里。
+    """
+    raw = six_hour_bucket(now - datetime.timedelta(days=policy["hourly_days"])) if policy["hourly_days"] else None
+    six = None
+    if raw is not None and policy["six_hour_days"]:
+        six = (now - datetime.timedelta(days=policy["six_hour_days"])).replace(hour=0, minute=0, second=0, microsecond=0)
+        six = min(six, raw.replace(hour=0))
+    return raw, six
+
+
+class Retention:
+    """
+    后台线程：按配置分批降采样 / 删除过期数据，每批一个短事务，批与批之间让出写锁；
+    数据库为 auto_vacuum=INCREMENTAL 时随后用 incremental_vacuum 归还空闲页。
+    """
+
+    def __init__(self, engine, policy: Optional[Dict[str, int]] = None):
+        self._engine = engine
+        self.policy = policy or load_retention()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Dict[str, int] = {}
+
+    def cutoffs(self, now: Optional[datetime.datetime] = None):
+        return tier_cutoffs(self.policy, now or datetime.datetime.now())
+
+    def _batched(self, statements, cutoff: int) -> int:
+        params = {"cutoff": cutoff, "batch": self.policy["batch_size"]}
+        done = 0
+        for _ in range(self.policy["max_batches"]):
+            if self._stopped.is_set():
+                break
+            with metrics.Timer(_batch_seconds), self._engine.begin() as conn:
+                n = 0
+                for sql in statements:
+                    n = conn.exec_driver_sql(sql, params).rowcount
+            done += max(n, 0)
+            if n < self.policy["batch_size"]:
+                break
+            time.sleep(0.01)
+        return done
+
+    def run_once(self, now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+        now = now or datetime.datetime.now()
+        raw, six = tier_cutoffs(self.policy, now)
+        result = {"hourly_downsampled": 0, "six_hour_expired": 0, "facts_expired": 0, "pages_freed": 0}
+
+        if raw is not None:
+            # 最后一条语句（删除）的行数即本批处理的小时行数
+            result["hourly_downsampled"] = self._batched((DOWNSAMPLE_HOURLY, DELETE_HOURLY), epoch_hour(raw))
+        if six is not None:
+            result["six_hour_expired"] = self._batched((EXPIRE_SIX_HOUR,), epoch_hour(six))
+        if self.policy["fact_days"]:
+            fact_cutoff = epoch_hour((now - datetime.timedelta(days=self.policy["fact_days"])).replace(hour=0))
+            result["facts_expired"] = (self._batched((EXPIRE_KEY_FACTS,), fact_cutoff)
+                                       + self._batched((EXPIRE_HOTKEY_FACTS,), fact_cutoff))
+
+        if any(result.values()):
+            # 降采样改变了超出保留期部分的读取结果：让响应缓存失效
+            bump_generation()
+            result["pages_freed"] = self.incremental_vacuum()
+        self.last_run = result
+        return result
+
+    def incremental_vacuum(self) -> int:
+        """返回归还的页数；数据库不是 INCREMENTAL 模式时什么也不做"""
+        with self._engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                return 0
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+            # 每一步只归还一页，需要在驱动游标上取完结果才会执行完
+            cur = conn.connection.cursor()
+            try:
+                cur.execute(f"PRAGMA incremental_vacuum({int(self.policy['vacuum_pages'])})").fetchall()
+            finally:
+                cur.close()
+            conn.commit()
+            after = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        return max(before - after, 0)
+
+    def _run(self) -> None:
+        # 启动后稍等片刻再做第一轮，避开启动时的其他 IO
+        delay = min(self.policy["interval"], 60)
+        while not self._stopped.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[WARN] 过期数据清理失败: {e}")
+            delay = self.policy["interval"]
+
+    def start(self) -> None:
+        if self._thread is not None or not self.policy["interval"]:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-rollup.py
+@Description : 由“小时 × 按键 / 快捷键”明细表增量汇总出日、月、总计等粗粒度统计表
+"""
+
+from __future__ import annotations
+
+import datetime
+import threading
+from typing import Optional
+
+import metrics
+from storage.generation import bump_generation
+
+# 高水位：db_meta.rollup_hwm 记录已汇总到的写入序号。
+# 每次汇总处理 rollup_hwm < seq <= fact_seq 的明细行，把 count - rolled（上次之后新增的部分）
+# 加到各粗粒度表，再把 rolled 置为 count。整个过程在同一个写事务内完成。
+# 时间键均为整数（见 storage.timekeys）：天 = epoch_hour / 24，月由天换算。
+
+DEFAULT_ROLLUP_INTERVAL = 5.0
+
+_rollup_seconds = metrics.REGISTRY.histogram("rollup_seconds", "粗粒度统计表汇总耗时") if metrics.ENABLED else None
+
+
+def _month_of_day(day: str) -> str:
+    """epoch_day 表达式 -> epoch_month 表达式（unixepoch 不带 localtime，得到的就是钟面日期）"""
+    date = f"({day}) * 86400, 'unixepoch'"
+    return (f"((CAST(strftime('%Y', {date}) AS INTEGER) - 1970) * 12"
+            f" + CAST(strftime('%m', {date}) AS INTEGER) - 1)")
+
+
+_KEY_DIRTY = """
+SELECT epoch_hour, virtual_key_code AS vk, key_name, count - rolled AS n, seq, last_updated
+FROM hourly_key_stats
+WHERE seq > :lo AND seq <= :hi AND count > rolled
+"""
+
+_HOTKEY_DIRTY = """
+SELECT epoch_hour, hotkey_id, display_name, count - rolled AS n, seq, last_triggered
+FROM hourly_hotkey_stats
+WHERE seq > :lo AND seq <= :hi AND count > rolled
+"""
+
+# 名称取 seq 最大（最近写入）的一行；SQLite 保证与 MAX() 同时出现的裸列取自该行
+_KEY_NAMES = "SELECT vk, key_name, MAX(seq) FROM d WHERE key_name <> '' GROUP BY vk"
+_HOTKEY_NAMES = "SELECT hotkey_id, display_name, MAX(seq) FROM d WHERE display_name <> '' GROUP BY hotkey_id"
+
+# INSERT ... SELECT 与 ON CONFLICT 连用时，SELECT 需带 WHERE 子句以避免语法歧义
+
+KEY_TOTAL_ROLLUP = f"""
+WITH d AS ({_KEY_DIRTY}), names AS ({_KEY_NAMES})
+INSERT INTO key_total_stats(virtual_key_code, key_name, total_count, last_updated)
+SELECT d.vk, COALESCE(names.key_name, ''), SUM(d.n), MAX(d.last_updated)
+FROM d LEFT JOIN names ON names.vk = d.vk
+WHERE true
+GROUP BY d.vk
+ON CONFLICT(virtual_key_code) DO UPDATE SET
+  total_count = COALESCE(total_count, 0) + excluded.total_count,
+  key_name = COALESCE(NULLIF(excluded.key_name, ''), key_name),
+  last_updated = CASE WHEN last_updated IS NULL OR excluded.last_updated > last_updated
+                      THEN excluded.last_updated ELSE last_updated END
+"""
+
+MONTHLY_KEY_ROLLUP = f"""
+WITH d AS ({_KEY_DIRTY}), names AS ({_KEY_NAMES})
+INSERT INTO monthly_key_stats(epoch_month, virtual_key_code, key_name, monthly_count)
+SELECT {_month_of_day("d.epoch_hour / 24")} AS month, d.vk, COALESCE(names.key_name, ''), SUM(d.n)
+FROM d LEFT JOIN names ON names.vk = d.vk
+WHERE true
+GROUP BY month, d.vk
+ON CONFLICT(epoch_month, virtual_key_code) DO UPDATE SET
+  monthly_count = COALESCE(monthly_count, 0) + excluded.monthly_count,
+  key_name = COALESCE(NULLIF(key_name, ''), excluded.key_name)
+"""
+
+# 1970-01-01 是周四：(epoch_day + 3) % 7 得到以周一为 0 的星期
+def _weekday_of_day(day: str) -> str:
+    return f"(({day}) + 3) % 7"
+
+
+DAILY_KEY_ROLLUP = f"""
+WITH d AS ({_KEY_DIRTY})
+INSERT INTO daily_key_stats(epoch_day, virtual_key_code, daily_count)
+SELECT d.epoch_hour / 24 AS day, d.vk, SUM(d.n)
+FROM d
+WHERE true
+GROUP BY day, d.vk
+ON CONFLICT(epoch_day, virtual_key_code) DO UPDATE SET
+  daily_count = COALESCE(daily_count, 0) + excluded.daily_count
+"""
+
+WEEKHOUR_KEY_ROLLUP = f"""
+WITH d AS ({_KEY_DIRTY})
+INSERT INTO key_weekhour_stats(virtual_key_code, weekday, hour, count)
+SELECT d.vk, {_weekday_of_day("d.epoch_hour / 24")} AS wd, d.epoch_hour % 24 AS hr, SUM(d.n)
+FROM d
+WHERE true
+GROUP BY d.vk, wd, hr
+ON CONFLICT(virtual_key_code, weekday, hour) DO UPDATE SET
+  count = COALESCE(count, 0) + excluded.count
+"""
+
+HOTKEY_TOTAL_ROLLUP = f"""
+WITH d AS ({_HOTKEY_DIRTY}), names AS ({_HOTKEY_NAMES})
+INSERT INTO hotkey_total_stats(hotkey_id, display_name, total_count, last_updated)
+SELECT d.hotkey_id, names.display_name, SUM(d.n), MAX(d.last_triggered)
+FROM d LEFT JOIN names ON names.hotkey_id = d.hotkey_id
+WHERE true
+GROUP BY d.hotkey_id
+ON CONFLICT(hotkey_id) DO UPDATE SET
+  total_count = COALESCE(total_count, 0) + excluded.total_count,
+  display_name = COALESCE(NULLIF(excluded.display_name, ''), display_name),
+  last_updated = CASE WHEN last_updated IS NULL OR excluded.last_updated > last_updated
+                      THEN excluded.last_updated ELSE last_updated END
+"""
+
+HOTKEY_DAILY_ROLLUP = f"""
+WITH d AS ({_HOTKEY_DIRTY}), names AS ({_HOTKEY_NAMES})
+INSERT INTO hotkey_daily_stats(epoch_day, hotkey_id, display_name, daily_count, last_triggered)
+SELECT d.epoch_hour / 24 AS day, d.hotkey_id, names.display_name, SUM(d.n), MAX(d.last_triggered)
+FROM d LEFT JOIN names ON names.hotkey_id = d.hotkey_id
+WHERE true
+GROUP BY day, d.hotkey_id
+ON CONFLICT(epoch_day, hotkey_id) DO UPDATE SET
+  daily_count = COALESCE(daily_count, 0) + excluded.daily_count,
+  display_name = COALESCE(NULLIF(excluded.display_name, ''), display_name),
+  last_triggered = CASE WHEN last_triggered IS NULL OR excluded.last_triggered > last_triggered
+                        THEN excluded.last_triggered ELSE last_triggered END
+"""
+
+
+def _activity_rollup(table: str, key_col: str, bucket: str) -> str:
+    """日 / 小时 / 月活跃度：按 bucket（epoch_hour 的表达式）分桶，按键与快捷键一起汇总"""
+    return f"""
+WITH a AS (
+  SELECT epoch_hour, n AS kp, 0 AS hk, last_updated AS ts FROM ({_KEY_DIRTY})
+  UNION ALL
+  SELECT epoch_hour, 0, n, last_triggered FROM ({_HOTKEY_DIRTY})
+)
+INSERT INTO {table}({key_col}, key_presses, hotkey_triggers, last_updated)
+SELECT {bucket} AS bucket, SUM(kp), SUM(hk), MAX(ts)
+FROM a
+WHERE true
+GROUP BY bucket
+ON CONFLICT({key_col}) DO UPDATE SET
+  key_presses = COALESCE(key_presses, 0) + excluded.key_presses,
+  hotkey_triggers = COALESCE(hotkey_triggers, 0) + excluded.hotkey_triggers,
+  last_updated = CASE WHEN last_updated IS NULL OR excluded.last_updated > last_updated
+                      THEN excluded.last_updated ELSE last_updated END
+"""
+
+
+ROLLUP_STATEMENTS = (
+    KEY_TOTAL_ROLLUP,
+    MONTHLY_KEY_ROLLUP,
+    HOTKEY_TOTAL_ROLLUP,
+    HOTKEY_DAILY_ROLLUP,
+    DAILY_KEY_ROLLUP,
+    WEEKHOUR_KEY_ROLLUP,
+    _activity_rollup("hourly_activity_stats", "epoch_hour", "epoch_hour"),
+    _activity_rollup("daily_activity_stats", "epoch_day", "epoch_hour / 24"),
+    _activity_rollup("monthly_activity_stats", "epoch_month", _month_of_day("epoch_hour / 24")),
+)
+
+MARK_ROLLED = (
+    "UPDATE hourly_key_stats SET rolled = count WHERE seq > :lo AND seq <= :hi AND count > rolled",
+    "UPDATE hourly_hotkey_stats SET rolled = count WHERE seq > :lo AND seq <= :hi AND count > rolled",
+)
+
+# monthly_activity_stats 首次出现时用已有的日表补齐历史，只执行一次
+MONTHLY_ACTIVITY_SEED = f"""
+INSERT OR IGNORE INTO monthly_activity_stats(epoch_month, key_presses, hotkey_triggers, last_updated)
+SELECT {_month_of_day("epoch_day")} AS month, SUM(COALESCE(key_presses, 0)), SUM(COALESCE(hotkey_triggers, 0)),
+       MAX(last_updated)
+FROM daily_activity_stats
+GROUP BY month
+"""
+
+# 按键矩阵表首次出现时用明细表中已汇总的部分（rolled）补齐，未汇总的部分由随后的增量汇总计入。
+# 早于明细保留期（retention.fact_days）的历史已无小时 × 按键粒度，无法补回
+KEY_MATRIX_SEED = (
+    """
+INSERT OR IGNORE INTO daily_key_stats(epoch_day, virtual_key_code, daily_count)
+SELECT epoch_hour / 24 AS day, virtual_key_code, SUM(rolled)
+FROM hourly_key_stats
+WHERE rolled > 0
+GROUP BY day, virtual_key_code
+""",
+    f"""
+INSERT OR IGNORE INTO key_weekhour_stats(virtual_key_code, weekday, hour, count)
+SELECT virtual_key_code, {_weekday_of_day("epoch_hour / 24")} AS wd, epoch_hour % 24 AS hr, SUM(rolled)
+FROM hourly_key_stats
+WHERE rolled > 0
+GROUP BY virtual_key_code, wd, hr
+""",
+)
+
+_META_GET = "SELECT value FROM db_meta WHERE key = ?"
+_META_SET = """
+INSERT INTO db_meta(key, value, updated_at) VALUES (?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+"""
+
+
+def _meta_int(conn, key: str) -> Optional[int]:
+    value = conn.exec_driver_sql(_META_GET, (key,)).scalar()
+    return None if value is None else int(value)
+
+
+def _set_meta(conn, key: str, value) -> None:
+    now = datetime.datetime.now().isoformat(sep=" ", timespec="microseconds")
+    conn.exec_driver_sql(_META_SET, (key, str(value), now))
+
+
+def rollup(conn) -> int:
+    """
+    在调用方的写事务中执行一次增量汇总，返回处理的写入序号个数（0 表示没有新数据）。
+    """
+    if _meta_int(conn, "monthly_activity_seeded") is None:
+        conn.exec_driver_sql(MONTHLY_ACTIVITY_SEED)
+        _set_meta(conn, "monthly_activity_seeded", 1)
+    if _meta_int(conn, "key_matrix_seeded") is None:
+        for sql in KEY_MATRIX_SEED:
+            conn.exec_driver_sql(sql)
+        _set_meta(conn, "key_matrix_seeded", 1)
+
+    lo = _meta_int(conn, "rollup_hwm") or 0
+    hi = _meta_int(conn, "fact_seq") or 0
+    if hi <= lo:
+        return 0
+
+    params = {"lo": lo, "hi": hi}
+    for sql in ROLLUP_STATEMENTS:
+        conn.exec_driver_sql(sql, params)
+    for sql in MARK_ROLLED:
+        conn.exec_driver_sql(sql, params)
+    _set_meta(conn, "rollup_hwm", hi)
+    return hi - lo
+
+
+class Rollup:
+    """
+    定期汇总的后台线程，同时提供读前物化：本进程写入明细后 mark_dirty()，
+    接口查询粗粒度表前调用 ensure_fresh()，保证读到自己刚写入的数据。
+    其他进程写入的明细由定期任务兜底。
+    """
+
+    def __init__(self, engine, interval: float = DEFAULT_ROLLUP_INTERVAL):
+        self._engine = engine
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.folded = 0
+
+    def mark_dirty(self, *_args) -> None:
+        # 可直接注册为 write listener：callback(delta, generation)
+        self._dirty = True
+
+    def run(self) -> int:
+        with self._lock:
+            self._dirty = False
+            try:
+                with metrics.Timer(_rollup_seconds), self._engine.begin() as conn:
+                    folded = rollup(conn)
+            except Exception:
+                self._dirty = True
+                raise
+            self.runs += 1
+            if folded:
+                self.folded += folded
+                # 粗粒度表变了：让响应缓存与 ETag 失效
+                bump_generation()
+            return folded
+
+    def ensure_fresh(self) -> None:
+        if self._dirty:
+            try:
+                self.run()
+            except Exception as e:
+                print(f"[WARN] 统计汇总失败: {e}")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                print(f"[WARN] 统计汇总失败: {e}")
+            if self._stopped.wait(self.interval):
+                break
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止定期任务并做最后一次汇总"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+        self.ensure_fresh()
+
+
+if __name__ == '__main__':
+    pass
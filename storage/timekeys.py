@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-timekeys.py
+@Description : 统计表的整数时间键：自 1970-01-01 起的天数 / 小时数 / 月数（按本地钟面时间，不做时区换算）
+"""
+
+from __future__ import annotations
+
+import datetime
+from typing import Tuple
+
+EPOCH = datetime.date(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+def epoch_day(d: datetime.date) -> int:
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def epoch_hour(dt: datetime.datetime) -> int:
+    return (dt.toordinal() - EPOCH_ORDINAL) * 24 + dt.hour
+
+
+def epoch_month(d: datetime.date) -> int:
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def day_of(n: int) -> datetime.date:
+    return datetime.date.fromordinal(n + EPOCH_ORDINAL)
+
+
+def hour_of(n: int) -> datetime.datetime:
+    day, hour = divmod(n, 24)
+    d = day_of(day)
+    return datetime.datetime(d.year, d.month, d.day, hour)
+
+
+def year_month_of(n: int) -> Tuple[int, int]:
+    year, month = divmod(n, 12)
+    return year + 1970, month + 1
+
+
+# 接口仍输出原来的字符串格式
+
+def day_label(n: int) -> str:
+    return day_of(n).isoformat()
+
+
+def hour_label(n: int) -> str:
+    day, hour = divmod(n, 24)
+    return f"{day_of(day).isoformat()} {hour:02d}"
+
+
+def month_label(n: int) -> str:
+    year, month = year_month_of(n)
+    return f"{year:04d}-{month:02d}"
+
+
+def parse_day(label: str) -> int:
+    return epoch_day(datetime.date.fromisoformat(label))
+
+
+def parse_hour(label: str) -> int:
+    return parse_day(label[:10]) * 24 + int(label[11:13])
+
+
+def parse_month(label: str) -> int:
+    return (int(label[:4]) - 1970) * 12 + int(label[5:7]) - 1
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-typingstats.py
+@Description : 打字速度的每小时摘要：对数-线性分桶直方图（HDR 风格）的编码、合并与落库
+"""
+
+from __future__ import annotations
+
+import datetime
+import struct
+from typing import Iterable, Optional
+
+# 每个 2 的幂区间再均分 16 个子桶：[0, 32) 逐个整数一桶，之后相对误差不超过 1/16
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+LINEAR_MAX = SUB_COUNT * 2
+MAX_VALUE = (1 << 32) - 1
+N_BUCKETS = ((MAX_VALUE.bit_length() - SUB_BITS) << SUB_BITS) + SUB_COUNT
+
+
+def bucket_of(v: int) -> int:
+    if v < LINEAR_MAX:
+        return v if v > 0 else 0
+    if v > MAX_VALUE:
+        v = MAX_VALUE
+    e = v.bit_length() - SUB_BITS - 1
+    return (e << SUB_BITS) + (v >> e)
+
+
+def bucket_bounds(i: int):
+    """第 i 个桶覆盖的 [lo, hi)"""
+    if i < LINEAR_MAX:
+        return i, i + 1
+    e = (i >> SUB_BITS) - 1
+    m = (i & (SUB_COUNT - 1)) + SUB_COUNT
+    return m << e, (m + 1) << e
+
+
+class LogHistogram:
+    """
+    非负整数的计数直方图，内存固定为 N_BUCKETS 个计数。
+    落库时只保存非零的桶：8 字节总和 + 4 字节最大值 + 每个非零桶 (uint16 桶号, uint32 计数)。
+    """
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, v: int) -> None:
+        self.counts[bucket_of(v)] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def merge(self, other: "LogHistogram") -> None:
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def copy(self) -> "LogHistogram":
+        h = LogHistogram()
+        h.counts = list(self.counts)
+        h.count = self.count
+        h.sum = self.sum
+        h.max = self.max
+        return h
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q 为 0..100；桶内按线性插值估算，不超过记录到的最大值"""
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo, hi = bucket_bounds(i)
+                if hi - lo == 1:
+                    return float(lo)
+                return min(lo + (hi - lo) * max(0.0, rank - seen) / n, float(self.max))
+            seen += n
+        return float(self.max)
+
+    def encode(self) -> bytes:
+        idx = [i for i, n in enumerate(self.counts) if n]
+        return struct.pack(f"<QI{len(idx)}H{len(idx)}I", self.sum, min(self.max, MAX_VALUE), *idx,
+                           *(self.counts[i] for i in idx))
+
+    def merge_encoded(self, blob: Optional[bytes]) -> None:
+        """直接把编码后的直方图累加进来（不必先展开成完整的桶数组）"""
+        if not blob:
+            return
+        n = (len(blob) - 12) // 6
+        values = struct.unpack(f"<QI{n}H{n}I", blob)
+        counts = self.counts
+        for i, c in zip(values[2:n + 2], values[n + 2:]):
+            counts[i] += c
+            self.count += c
+        self.sum += values[0]
+        self.max = max(self.max, values[1])
+
+    @classmethod
+    def decode(cls, blob: Optional[bytes]) -> "LogHistogram":
+        h = cls()
+        h.merge_encoded(blob)
+        return h
+
+
+class HourSummary:
+    """
+    一个钟面小时的打字摘要：
+    intervals  连续输入中相邻两次按下的间隔（毫秒）
+    idle       超过停顿阈值的间隔（毫秒），即两段连续输入之间的空闲
+    kpm        每个有输入的分钟内的按键次数
+    burst_keys 每段连续输入的按键数
+    """
+
+    __slots__ = ("epoch_hour", "key_presses", "active_minutes", "bursts", "peak_kpm",
+                 "intervals", "idle", "kpm", "burst_keys")
+
+    def __init__(self, epoch_hour: int):
+        self.epoch_hour = epoch_hour
+        self.key_presses = 0
+        self.active_minutes = 0
+        self.bursts = 0
+        self.peak_kpm = 0
+        self.intervals = LogHistogram()
+        self.idle = LogHistogram()
+        self.kpm = LogHistogram()
+        self.burst_keys = LogHistogram()
+
+    def copy(self) -> "HourSummary":
+        s = HourSummary(self.epoch_hour)
+        s.merge(self)
+        return s
+
+    def merge(self, other: "HourSummary") -> None:
+        self.key_presses += other.key_presses
+        self.active_minutes += other.active_minutes
+        self.bursts += other.bursts
+        self.peak_kpm = max(self.peak_kpm, other.peak_kpm)
+        self.intervals.merge(other.intervals)
+        self.idle.merge(other.idle)
+        self.kpm.merge(other.kpm)
+        self.burst_keys.merge(other.burst_keys)
+
+
+_HIST_FIELDS = ("intervals", "idle", "kpm", "burst_keys")
+
+_SELECT_HOUR = """
+SELECT key_presses, active_minutes, bursts, peak_kpm, intervals, idle, kpm, burst_keys
+FROM typing_hourly_stats WHERE epoch_hour = ?
+"""
+
+_UPSERT_HOUR = """
+INSERT OR REPLACE INTO typing_hourly_stats(
+  epoch_hour, key_presses, active_minutes, bursts, peak_kpm, intervals, idle, kpm, burst_keys, last_updated
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SELECT_RANGE = """
+SELECT epoch_hour, key_presses, active_minutes, bursts, peak_kpm, intervals, idle, kpm, burst_keys
+FROM typing_hourly_stats WHERE epoch_hour >= ? AND epoch_hour <= ?
+"""
+
+
+def _merge_row(s: HourSummary, row) -> None:
+    key_presses, active_minutes, bursts, peak_kpm = row[:4]
+    s.key_presses += int(key_presses or 0)
+    s.active_minutes += int(active_minutes or 0)
+    s.bursts += int(bursts or 0)
+    s.peak_kpm = max(s.peak_kpm, int(peak_kpm or 0))
+    for name, blob in zip(_HIST_FIELDS, row[4:]):
+        getattr(s, name).merge_encoded(blob)
+
+
+def save_hours(conn, summaries: Iterable[HourSummary]) -> None:
+    """在调用方的事务中写入；同一小时已有的摘要（例如重启前的部分）与之合并"""
+    now = datetime.datetime.now()
+    for s in summaries:
+        row = conn.exec_driver_sql(_SELECT_HOUR, (s.epoch_hour,)).fetchone()
+        if row is not None:
+            s = s.copy()
+            _merge_row(s, row)
+        conn.exec_driver_sql(_UPSERT_HOUR, (
+            s.epoch_hour, s.key_presses, s.active_minutes, s.bursts, s.peak_kpm,
+            s.intervals.encode(), s.idle.encode(), s.kpm.encode(), s.burst_keys.encode(), now,
+        ))
+
+
+def load_range(conn, lo_hour: int, hi_hour: int, into: Optional[HourSummary] = None) -> HourSummary:
+    """把 [lo_hour, hi_hour] 内各小时的摘要合并成一个（epoch_hour 取 lo_hour）"""
+    total = into if into is not None else HourSummary(lo_hour)
+    for row in conn.exec_driver_sql(_SELECT_RANGE, (lo_hour, hi_hour)):
+        _merge_row(total, row[1:])
+    return total
+
+
+if __name__ == '__main__':
+    pass
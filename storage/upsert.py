@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-upsert.py
+@Description : 统计表的单语句 UPSERT 写入（INSERT ... ON CONFLICT DO UPDATE）
+"""
+
+from __future__ import annotations
+
+import datetime
+from typing import List, Tuple
+
+from storage.delta import StatsDelta
+
+# 计数一律在 SQL 里做加法：不需要先 SELECT，也不会因为两个线程各自读到旧值而丢失更新。
+# 语句文本固定不变，sqlite3 会缓存其预编译结果，executemany 一次绑定多组参数。
+# 写入路径只更新“小时 × 按键 / 快捷键”两张明细表；日、月、总计等粗粒度表由
+# storage.rollup 依据 seq 增量汇总，每次按键不再放大为多张表的写入。
+# seq 为本次事务的写入序号（db_meta.fact_seq），汇总任务据此找出上次之后变化的明细行。
+# 时间键为整数 epoch_hour（见 storage.timekeys），写入路径上没有任何日期格式化。
+
+FACT_SEQ_BUMP = """
+INSERT INTO db_meta(key, value, updated_at) VALUES ('fact_seq', '1', ?)
+ON CONFLICT(key) DO UPDATE SET
+  value = CAST(CAST(value AS INTEGER) + 1 AS TEXT),
+  updated_at = excluded.updated_at
+"""
+
+FACT_SEQ_SELECT = "SELECT CAST(value AS INTEGER) FROM db_meta WHERE key = 'fact_seq'"
+
+HOURLY_KEY_UPSERT = """
+INSERT INTO hourly_key_stats(epoch_hour, virtual_key_code, key_name, count, rolled, seq, last_updated)
+VALUES (?, ?, ?, ?, 0, ?, ?)
+ON CONFLICT(epoch_hour, virtual_key_code) DO UPDATE SET
+  count = COALESCE(count, 0) + excluded.count,
+  key_name = COALESCE(NULLIF(excluded.key_name, ''), key_name),
+  seq = excluded.seq,
+  last_updated = CASE WHEN last_updated IS NULL OR excluded.last_updated > last_updated
+                      THEN excluded.last_updated ELSE last_updated END
+"""
+
+HOURLY_HOTKEY_UPSERT = """
+INSERT INTO hourly_hotkey_stats(epoch_hour, hotkey_id, display_name, count, rolled, seq, last_triggered)
+VALUES (?, ?, ?, ?, 0, ?, ?)
+ON CONFLICT(epoch_hour, hotkey_id) DO UPDATE SET
+  count = COALESCE(count, 0) + excluded.count,
+  display_name = COALESCE(NULLIF(excluded.display_name, ''), display_name),
+  seq = excluded.seq,
+  last_triggered = CASE WHEN last_triggered IS NULL OR excluded.last_triggered > last_triggered
+                        THEN excluded.last_triggered ELSE last_triggered END
+"""
+
+KEY_BIGRAM_UPSERT = """
+INSERT INTO key_bigram_stats(pair, count) VALUES (?, ?)
+ON CONFLICT(pair) DO UPDATE SET count = count + excluded.count
+"""
+
+def _ts(dt: datetime.datetime) -> str:
+    # 与 SQLAlchemy DateTime 列在 SQLite 中的存储格式一致
+    return dt.isoformat(sep=" ", timespec="microseconds")
+
+
+def delta_params(delta: StatsDelta, seq: int) -> List[Tuple[str, list]]:
+    """把增量展开为 (语句, 参数列表)，空表跳过"""
+    now = _ts(delta.last_ts or datetime.datetime.now())
+    names = delta.key_names
+    hk_names = delta.hotkey_names
+
+    batches: List[Tuple[str, list]] = [
+        (HOURLY_KEY_UPSERT,
+         [(hour, vk, names.get(vk, ""), n, seq, now) for (hour, vk), n in delta.key_hours.items()]),
+        (HOURLY_HOTKEY_UPSERT,
+         [(hour, hid, hk_names.get(hid), n, seq, now) for (hour, hid), n in delta.hotkey_hours.items()]),
+        (KEY_BIGRAM_UPSERT, list(delta.bigrams.items())),
+    ]
+    return [(sql, params) for sql, params in batches if params]
+
+
+def apply_delta(conn, delta: StatsDelta) -> int:
+    """
+    在调用方的事务里写入整批增量，返回本次的写入序号。
+    conn 为 SQLAlchemy Connection（例如 engine.begin() 得到的连接），提交由调用方负责。
+    """
+    conn.exec_driver_sql(FACT_SEQ_BUMP, (_ts(datetime.datetime.now()),))
+    seq = int(conn.exec_driver_sql(FACT_SEQ_SELECT).scalar())
+    for sql, params in delta_params(delta, seq):
+        conn.exec_driver_sql(sql, params)
+    return seq
+
+
+if __name__ == '__main__':
+    pass
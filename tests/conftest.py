@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-conftest.py
+@Description : 测试共用的临时数据库：TRACEBOARD_DB 指向 tmp_path，不会碰到 key_events.db
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from storage import generation, install_profile, load_profile  # noqa: E402
+from storage.models import Base  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "key_events.db")
+    monkeypatch.setenv("TRACEBOARD_DB", path)
+    return path
+
+
+@pytest.fixture
+def engine(db_path):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    install_profile(engine, load_profile())
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def table_sum(engine):
+    """table_sum(表, 列表达式, where=None) -> SUM 的整数值"""
+    def _sum(table: str, column: str, where: str = None) -> int:
+        sql = f"SELECT COALESCE(SUM({column}), 0) FROM {table}" + (f" WHERE {where}" if where else "")
+        with engine.connect() as conn:
+            return int(conn.exec_driver_sql(sql).scalar())
+    return _sum
+
+
+@pytest.fixture
+def server_app(db_path):
+    """
+    按当前 TRACEBOARD_DB 重新导入 server.app（模块级的引擎、缓存、排名都绑定在导入时的库上）。
+    不进入 lifespan，后台汇总 / 清理线程不会启动；结束时撤销本次导入注册的写入监听。
+    """
+    listeners = list(generation._write_listeners)
+    for name in ("server.app", "server"):
+        sys.modules.pop(name, None)
+    module = importlib.import_module("server.app")
+    yield module
+    generation._write_listeners[:] = listeners
+    module.read_engine.dispose()
+    module.engine.dispose()
+    for name in ("server.app", "server"):
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def client(server_app):
+    from fastapi.testclient import TestClient
+    return TestClient(server_app.app)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_batch_events.py
+@Description : /key_events/batch：JSON 数组与 NDJSON、逐条校验与计数、缺省名称不覆盖已有名称
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from storage import rollup
+
+
+def _rows(server_app, sql: str):
+    with server_app.engine.connect() as conn:
+        return [tuple(r) for r in conn.exec_driver_sql(sql)]
+
+
+def _rollup(server_app) -> None:
+    with server_app.engine.begin() as conn:
+        rollup(conn)
+
+
+def test_json_array_counts_per_event_time(client, server_app):
+    day = datetime(2024, 3, 5, 13, 20)
+    events = [
+        {"key_name": "a", "virtual_key_code": 65, "timestamp": day.isoformat()},
+        {"key_name": "a", "virtual_key_code": 65, "timestamp": int((day + timedelta(hours=1)).timestamp() * 1000)},
+        {"key_name": "b", "virtual_key_code": 66, "timestamp": (day + timedelta(days=1)).timestamp()},
+    ]
+    resp = client.post("/key_events/batch", json=events)
+    assert resp.status_code == 200
+    assert resp.json() == {"accepted": 3, "rejected": 0, "errors": []}
+
+    # 按各自的时间分桶，而不是收到请求的时间
+    assert sorted(_rows(server_app, "SELECT epoch_hour % 24, virtual_key_code, count FROM hourly_key_stats")) == [
+        (13, 65, 1), (13, 66, 1), (14, 65, 1)]
+    _rollup(server_app)
+    assert _rows(server_app, "SELECT key_presses FROM daily_activity_stats ORDER BY epoch_day") == [(2,), (1,)]
+
+
+def test_ndjson_keeps_good_lines_and_rejects_bad_ones(client):
+    future = (datetime.now() + timedelta(days=3)).isoformat()
+    lines = [
+        json.dumps({"key_name": "a", "virtual_key_code": 65}),
+        "not json",
+        json.dumps({"key_name": "x", "virtual_key_code": 256}),
+        json.dumps({"key_name": "x", "virtual_key_code": True}),
+        json.dumps({"key_name": 5, "virtual_key_code": 65}),
+        json.dumps({"key_name": "a", "virtual_key_code": 65, "timestamp": "yesterday"}),
+        json.dumps({"key_name": "a", "virtual_key_code": 65, "timestamp": future}),
+        "",
+        json.dumps({"key_name": "b", "virtual_key_code": 66}),
+    ]
+    resp = client.post("/key_events/batch", content="\n".join(lines),
+                       headers={"Content-Type": "application/x-ndjson"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["accepted"], body["rejected"]) == (2, 6)
+    assert [e.split(":")[0] for e in body["errors"]] == ["#1", "#2", "#3", "#4", "#5", "#6"]
+    assert "0..255" in body["errors"][1]
+    assert "future" in body["errors"][5]
+
+    counts = {k["virtual_key_code"]: k["count"] for k in client.get("/key_counts").json()}
+    assert counts == {65: 1, 66: 1}
+
+
+def test_malformed_body_is_rejected(client):
+    assert client.post("/key_events/batch", content='{"virtual_key_code": 65}',
+                       headers={"Content-Type": "application/json"}).status_code == 400
+    assert client.post("/key_events/batch", content=b"\xff\xfe",
+                       headers={"Content-Type": "application/json"}).status_code == 400
+
+
+def test_missing_name_does_not_rename_key(client, server_app):
+    assert client.post("/key_events", json={"key_name": "a", "virtual_key_code": 65}).status_code == 200
+    resp = client.post("/key_events/batch", json=[{"virtual_key_code": 65}, {"virtual_key_code": 66, "key_name": ""}])
+    assert resp.json()["accepted"] == 2
+
+    assert client.get("/key_counts").json() == [
+        {"key_name": "a", "count": 2, "virtual_key_code": 65},
+        {"key_name": "-", "count": 1, "virtual_key_code": 66},
+    ]
+    _rollup(server_app)
+    # 缺省名称在库中保持为空串，只在读取时显示为 "-"
+    assert _rows(server_app, "SELECT virtual_key_code, key_name FROM hourly_key_stats ORDER BY 1") == [
+        (65, "a"), (66, "")]
+    assert _rows(server_app, "SELECT virtual_key_code, key_name FROM key_total_stats ORDER BY 1") == [
+        (65, "a"), (66, "")]
+    assert _rows(server_app, "SELECT virtual_key_code, key_name FROM monthly_key_stats ORDER BY 1") == [
+        (65, "a"), (66, "")]
+
+    # 排名重新从库载入时同样回退为 "-"
+    # server 包在导入时就会打开数据库，排名类从夹具重新导入的模块取
+    ranking = server_app.KeyRanking()
+    ranking.seed_from_db(server_app.engine, 0)
+    assert [(k["virtual_key_code"], k["key_name"]) for k in ranking.top()[1]] == [(65, "a"), (66, "-")]
+
+    # 之后带名称的事件补上名称
+    client.post("/key_events/batch", json=[{"virtual_key_code": 66, "key_name": "b"}])
+    _rollup(server_app)
+    assert _rows(server_app, "SELECT key_name FROM key_total_stats WHERE virtual_key_code = 66") == [("b",)]
+    assert _rows(server_app, "SELECT key_name FROM monthly_key_stats WHERE virtual_key_code = 66") == [("b",)]
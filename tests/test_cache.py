@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_cache.py
+@Description : server.cache.ResponseCache：按写入代数失效、TTL 上限、LRU 容量，以及统计接口的缓存命中
+"""
+
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def cache_module(server_app):
+    # server 包在导入时会打开数据库：等夹具按临时库导入之后再取子模块
+    return importlib.import_module("server.cache")
+
+
+@pytest.fixture
+def clock(cache_module, monkeypatch):
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now.t))
+    return now
+
+
+def _build(calls, body=b"[]"):
+    def build():
+        calls.append(1)
+        return body
+    return build
+
+
+def test_hit_until_generation_changes(cache_module, clock):
+    cache, calls = cache_module.ResponseCache(), []
+    body, etag = cache.get_or_build("k", 1, 60, _build(calls, b"[1]"))
+    assert cache.get_or_build("k", 1, 60, _build(calls)) == (body, etag)
+    assert len(calls) == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    # 有新的提交：同一个键重新构建，ETag 随代数变化
+    body2, etag2 = cache.get_or_build("k", 2, 60, _build(calls, b"[1]"))
+    assert len(calls) == 2 and body2 == body and etag2 != etag
+
+
+def test_ttl_caps_entry_age(cache_module, clock):
+    cache, calls = cache_module.ResponseCache(), []
+    cache.get_or_build("k", 1, 60, _build(calls))
+    clock.t += 59
+    cache.get_or_build("k", 1, 60, _build(calls))
+    assert len(calls) == 1
+    clock.t += 2
+    cache.get_or_build("k", 1, 60, _build(calls))
+    assert len(calls) == 2
+
+
+def test_lru_evicts_least_recently_used(cache_module, clock):
+    cache = cache_module.ResponseCache(max_entries=2)
+    cache.put("a", 1, b"a", "ea")
+    cache.put("b", 1, b"b", "eb")
+    assert cache.get("a", 1, 60) is not None     # a 变为最近使用
+    cache.put("c", 1, b"c", "ec")
+    assert cache.get("b", 1, 60) is None
+    assert cache.get("a", 1, 60) == (b"a", "ea")
+    assert cache.stats()["entries"] == 2
+
+
+def test_disabled_cache_always_builds(cache_module, clock):
+    cache, calls = cache_module.ResponseCache(enabled=False), []
+    for _ in range(3):
+        cache.get_or_build("k", 1, 60, _build(calls))
+    assert len(calls) == 3 and cache.stats()["entries"] == 0
+
+
+def test_route_is_cached_until_next_write(client, server_app):
+    cache = server_app.response_cache
+    params = {"days": 3, "end_date": "2024-03-05"}
+    first = client.get("/activity_daily", params=params)
+    hits = cache.hits
+    assert client.get("/activity_daily", params=params).content == first.content
+    assert cache.hits == hits + 1
+
+    # 写入后代数变化：同样的请求重新查询，并读到刚写入的数据
+    client.post("/key_events/batch", json=[{"key_name": "a", "virtual_key_code": 65,
+                                            "timestamp": "2024-03-05T09:00:00"}])
+    misses = cache.misses
+    fresh = client.get("/activity_daily", params=params).json()
+    assert cache.misses == misses + 1
+    assert fresh[-1]["key_presses"] == 1
+
+    # 参数不同的请求各自缓存
+    other = client.get("/activity_daily", params={"days": 2, "end_date": "2024-03-05"}).json()
+    assert len(other) == 2 and len(fresh) == 3
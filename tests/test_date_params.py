@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_date_params.py
+@Description : 各统计接口的结束日期参数：格式错误返回 400，而不是 500
+"""
+
+import pytest
+
+BAD_DATES = [
+    ("/activity_daily", {"end_date": "2024-13-01"}),
+    ("/hotkey_series", {"hotkey_id": "CTRL+C", "end_date": "yesterday"}),
+    ("/key_matrix/day_key", {"end_date": "2024/03/05"}),
+    ("/analytics/rolling_mean", {"end_date": "2024-02-30"}),
+    ("/typing/speed", {"end_date": "x"}),
+    ("/activity_hourly", {"end_hour": "2024-03-05"}),
+    ("/activity_monthly", {"end_month": "2024-3x"}),
+]
+
+
+@pytest.mark.parametrize("path,params", BAD_DATES)
+def test_malformed_end_date_is_rejected(client, path, params):
+    resp = client.get(path, params=params)
+    assert resp.status_code == 400
+    assert "must be" in resp.json()["detail"]
+
+
+def test_end_date_selects_the_range(client):
+    client.post("/key_events/batch", json=[
+        {"key_name": "a", "virtual_key_code": 65, "timestamp": "2024-03-05T10:00:00"},
+        {"key_name": "a", "virtual_key_code": 65, "timestamp": "2024-03-06T10:00:00"},
+    ])
+    daily = client.get("/activity_daily", params={"days": 2, "end_date": "2024-03-05"}).json()
+    assert [(d["date"], d["key_presses"]) for d in daily] == [("2024-03-04", 0), ("2024-03-05", 1)]
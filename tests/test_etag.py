@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_etag.py
+@Description : 统计接口的 ETag / If-None-Match：未变化时返回 304 且不带响应体，写入后 ETag 改变
+"""
+
+import importlib
+
+import pytest
+
+ROUTES = [
+    ("/activity_daily", {"days": 7}),
+    ("/activity_hourly", {"hours": 24}),
+    ("/activity_monthly", {"months": 12}),
+    ("/hotkey_totals", {}),
+    ("/key_counts", {}),
+    ("/key_counts", {"limit": 5}),
+]
+
+
+def _write(client, n=1):
+    client.post("/key_events/batch", json=[{"key_name": "a", "virtual_key_code": 65}] * n)
+
+
+@pytest.mark.parametrize("path,params", ROUTES)
+def test_not_modified_until_write(client, path, params):
+    _write(client)
+    resp = client.get(path, params=params)
+    etag = resp.headers["etag"]
+    assert resp.status_code == 200 and resp.headers["cache-control"] == "no-cache"
+
+    resp = client.get(path, params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 304 and resp.content == b""
+    assert resp.headers["etag"] == etag
+
+    _write(client)
+    resp = client.get(path, params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag and resp.content
+
+
+def test_etag_matches_follows_weak_comparison(server_app):
+    cache = importlib.import_module("server.cache")
+    etag = cache.make_etag(3, b"[]")
+    assert etag.startswith('"3-') and etag.endswith('"')
+    assert cache.etag_matches(etag, etag)
+    assert cache.etag_matches(f"W/{etag}", etag)
+    assert cache.etag_matches(f'"other", {etag}', etag)
+    assert cache.etag_matches("*", etag)
+    assert not cache.etag_matches(None, etag)
+    assert not cache.etag_matches('"other"', etag)
+    # 代数相同、内容不同时 ETag 也不同
+    assert cache.make_etag(3, b"[1]") != etag
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_ingest.py
+@Description : listener.ingest：队列溢出时的丢弃 / 合并，长按重复只计一次，合并计数按小时保留时间戳
+"""
+
+from datetime import datetime
+
+from listener.ingest import KIND_PRESS, KIND_RELEASE, OVERFLOW_COALESCE, OVERFLOW_DROP, EventRing, IngestWorker
+
+
+def _press(vk, ts, name="k"):
+    return vk, name, ts, KIND_PRESS
+
+
+def _release(vk, ts, name="k"):
+    return vk, name, ts, KIND_RELEASE
+
+
+def _full_ring(overflow, wall_offset=0.0):
+    ring = EventRing(capacity=2, overflow=overflow, wall_offset=wall_offset)
+    assert ring.push(_press(1, 0.0)) and ring.push(_press(2, 0.0))
+    return ring
+
+
+def test_drop_counts_presses_but_keeps_releases():
+    ring = _full_ring(OVERFLOW_DROP)
+    assert not ring.push(_press(65, 1.0))
+    assert ring.push(_release(65, 1.1))
+    assert ring.stats()["dropped"] == 1
+    assert ring.take_coalesced() == []
+    assert [e[0] for e in ring.drain()] == [1, 2, 65]
+
+
+def test_coalesce_skips_auto_repeat():
+    ring = _full_ring(OVERFLOW_COALESCE)
+    for i in range(10):                          # 按住不放：第一次按下之后都是自动重复
+        assert not ring.push(_press(65, 1.0 + i * 0.03, "a"))
+    assert ring.push(_release(65, 1.5, "a"))     # 松开总是入队
+    assert not ring.push(_press(65, 1.6, "a"))   # 再按一次才是新的按键
+
+    assert ring.coalesced == 2
+    assert ring.take_coalesced() == [(65, "a", 2, 1.6)]
+    assert ring.take_coalesced() == []
+
+
+def test_coalesce_skips_repeats_of_keys_pressed_before_overflow():
+    ring = EventRing(capacity=2, overflow=OVERFLOW_COALESCE)
+    assert ring.push(_press(65, 0.0))            # 正常入队的按下
+    assert ring.push(_press(66, 0.1))
+    assert not ring.push(_press(65, 0.5))        # 队列满时的长按重复
+    assert ring.coalesced == 0 and ring.take_coalesced() == []
+
+
+def test_coalesced_presses_keep_their_own_hour():
+    # 让 monotonic 的 100 秒对应本地时间 10:59:58
+    offset = datetime(2024, 6, 1, 10, 59, 58).timestamp() - 100.0
+    ring = _full_ring(OVERFLOW_COALESCE, wall_offset=offset)
+    ring.push(_press(65, 100.0, "a"))
+    ring.push(_release(65, 100.5, "a"))
+    ring.push(_press(66, 101.0, "b"))            # 另一个键在本小时内，时间戳各自保留
+    ring.push(_release(66, 101.2, "b"))
+    ring.push(_press(65, 103.0, "a"))            # 11:00:01，下一个小时
+
+    worker_calls = []
+    worker = IngestWorker(ring, handler=lambda ev: None,
+                          coalesced_handler=lambda *args: worker_calls.append(args))
+    assert worker.drain_once() == 4              # 队列中的两次按下 + 两次松开
+    assert sorted(worker_calls) == [(65, "a", 1, 100.0), (65, "a", 1, 103.0), (66, "b", 1, 101.0)]
+    assert {datetime.fromtimestamp(ts + offset).hour for *_, ts in worker_calls} == {10, 11}
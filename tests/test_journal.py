@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_journal.py
+@Description : listener.journal：记录格式往返、分段轮转、截断容错，以及 replay_journal 的重放规则
+"""
+
+import os
+
+from listener.hotkeys import BUILTIN_HOTKEYS, compile_hotkeys
+from listener.journal import (
+    FLAG_COALESCED, FLAG_PRESS, HEADER, MAX_DELTA_MS, RECORD, EventJournal, iter_journal, list_segments, load_names,
+)
+from replay_journal import replay_deltas
+
+BASE_MS = 1_717_200_000_000   # 2024-06-01 前后
+
+
+def _write(directory, records, **kwargs):
+    journal = EventJournal(str(directory), flush_interval=3600, **kwargs)
+    for ms, vk, flags, name, count in records:
+        journal.append(ms, vk, flags, name, count)
+    journal.close()
+    return journal
+
+
+def test_round_trip_across_segments(tmp_path):
+    records = []
+    for i in range(25):
+        records.append((BASE_MS + i * 40, 65 + i % 3, FLAG_PRESS, chr(97 + i % 3), 1))
+        records.append((BASE_MS + i * 40 + 15, 65 + i % 3, 0, "", 1))
+    records.append((BASE_MS + 5000, 70, FLAG_PRESS | FLAG_COALESCED, "f", 3))
+
+    journal = _write(tmp_path, records, segment_bytes=HEADER.size + RECORD.size * 10, flush_bytes=RECORD.size * 4)
+    assert journal.segments == len(list_segments(str(tmp_path))) > 1
+    assert journal.records == 53
+
+    expected = []
+    for ms, vk, flags, _, count in records:
+        expected.extend([(ms, vk, flags)] * count)
+    assert list(iter_journal(str(tmp_path))) == expected
+    assert load_names(str(tmp_path)) == {65: "a", 66: "b", 67: "c", 70: "f"}
+
+    # [since, until) 过滤：跨过分段边界时与整体过滤结果一致
+    since, until = BASE_MS + 300, BASE_MS + 700
+    assert list(iter_journal(str(tmp_path), since, until)) == [r for r in expected if since <= r[0] < until]
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    _write(tmp_path, [(BASE_MS + i, 65, FLAG_PRESS, "a", 1) for i in range(5)])
+    (segment,) = list_segments(str(tmp_path))
+    # 模拟写到一半时崩溃：文件末尾只有半条记录
+    with open(segment, "r+b") as f:
+        f.truncate(os.path.getsize(segment) - RECORD.size // 2)
+    assert [r[0] for r in iter_journal(str(tmp_path))] == [BASE_MS + i for i in range(4)]
+
+
+def test_large_gap_rotates_segment(tmp_path):
+    later = BASE_MS + MAX_DELTA_MS + 1
+    _write(tmp_path, [(BASE_MS, 65, FLAG_PRESS, "a", 1), (later, 66, FLAG_PRESS, "b", 1)])
+    assert len(list_segments(str(tmp_path))) == 2
+    assert list(iter_journal(str(tmp_path))) == [(BASE_MS, 65, FLAG_PRESS), (later, 66, FLAG_PRESS)]
+
+
+def test_replay_counts_repeats_once_and_matches_hotkeys(tmp_path):
+    ctrl, c = 162, 67
+    _write(tmp_path, [
+        (BASE_MS, ctrl, FLAG_PRESS, "ctrl_l", 1),
+        (BASE_MS + 10, c, FLAG_PRESS, "c", 1),
+        (BASE_MS + 40, c, FLAG_PRESS, "c", 1),       # 长按的自动重复
+        (BASE_MS + 60, c, 0, "", 1),
+        (BASE_MS + 70, ctrl, 0, "", 1),
+        (BASE_MS + 100, c, FLAG_PRESS, "c", 1),
+        (BASE_MS + 120, c, 0, "", 1),
+        (BASE_MS + 200, 65, FLAG_PRESS | FLAG_COALESCED, "a", 2),
+    ])
+
+    names = load_names(str(tmp_path))
+    deltas = list(replay_deltas(iter_journal(str(tmp_path)), names, compile_hotkeys(BUILTIN_HOTKEYS)))
+    assert len(deltas) == 1
+    delta = deltas[0]
+    assert dict(delta.key_total) == {ctrl: 1, c: 2, 65: 2}
+    assert dict(delta.hotkey_total) == {"CTRL+C": 1}
+    assert delta.key_names[c] == "c"
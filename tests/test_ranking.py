@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_ranking.py
+@Description : server.ranking.KeyRanking：增量冒泡后的名次、since_generation 只返回变化过的按键
+"""
+
+import random
+from datetime import datetime
+
+from storage import StatsDelta
+
+
+def _delta(counts, names=None):
+    delta = StatsDelta()
+    now = datetime(2024, 3, 5, 10)
+    for vk, n in counts.items():
+        delta.add_key((names or {}).get(vk, ""), vk, now, n)
+    return delta
+
+
+def _order(ranking, limit=None):
+    return [(k["virtual_key_code"], k["count"]) for k in ranking.top(limit)[1]]
+
+
+def test_incremental_order_matches_full_sort(server_app):
+    rng = random.Random(7)
+    ranking = server_app.KeyRanking()
+    ranking.seed([(vk, chr(vk), rng.randint(0, 50)) for vk in range(65, 91)], 1)
+    totals = {vk: n for vk, n in _order(ranking)}
+    for generation in range(2, 60):
+        counts = {rng.randint(60, 100): rng.randint(1, 30) for _ in range(rng.randint(1, 4))}
+        ranking.apply(_delta(counts), generation)
+        for vk, n in counts.items():
+            totals[vk] = totals.get(vk, 0) + n
+        expected = sorted(totals.items(), key=lambda kv: -kv[1])
+        assert [n for _, n in _order(ranking)] == [n for _, n in expected]
+        assert dict(_order(ranking)) == totals
+    assert ranking.top()[0] == 59
+    assert len(_order(ranking, 5)) == 5
+
+
+def test_changes_since_generation(server_app):
+    ranking = server_app.KeyRanking()
+    ranking.seed([(65, "a", 10), (66, "b", 5), (67, "c", 1)], 3)
+    ranking.apply(_delta({67: 20}), 4)
+    ranking.apply(_delta({66: 1}, {66: "B"}), 5)
+
+    diff = ranking.changes(4)
+    assert diff["generation"] == 5 and diff["max"] == 21
+    assert diff["keys"] == [{"key_name": "B", "count": 6, "virtual_key_code": 66}]
+    assert [k["virtual_key_code"] for k in ranking.changes(3)["keys"]] == [67, 66]
+    assert ranking.changes(5)["keys"] == []
+    # limit 只看前几名；0 或比当前代数大（服务重启）时返回全部
+    assert [k["virtual_key_code"] for k in ranking.changes(3, limit=1)["keys"]] == [67]
+    assert len(ranking.changes(0)["keys"]) == 3
+    assert len(ranking.changes(99)["keys"]) == 3
+
+
+def test_key_counts_diff_endpoint(client):
+    client.post("/key_events/batch", json=[{"key_name": "a", "virtual_key_code": 65}] * 3)
+    full = client.get("/key_counts", params={"since_generation": 0}).json()
+    assert full["keys"] == [{"key_name": "a", "count": 3, "virtual_key_code": 65}]
+
+    client.post("/key_events/batch", json=[{"key_name": "b", "virtual_key_code": 66}])
+    diff = client.get("/key_counts", params={"since_generation": full["generation"]}).json()
+    assert diff["generation"] > full["generation"] and diff["max"] == 3
+    assert diff["keys"] == [{"key_name": "b", "count": 1, "virtual_key_code": 66}]
+
+    same = client.get("/key_counts", params={"since_generation": diff["generation"]}).json()
+    assert same["keys"] == []
+    assert client.get("/key_counts", params={"limit": 0}).status_code == 400
+
+
+def test_seed_from_db_includes_unrolled_facts(server_app):
+    # 刚写入、尚未汇总的明细也计入排名
+    server_app.write_delta(server_app.engine, _delta({65: 4}, {65: "a"}))
+    ranking = server_app.KeyRanking()
+    ranking.seed_from_db(server_app.engine, 0)
+    assert _order(ranking) == [(65, 4)]
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_retention.py
+@Description : storage.retention：小时 → 6 小时 → 日的分级降采样与明细过期
+"""
+
+from datetime import datetime, timedelta
+
+from storage import Retention, StatsDelta, load_retention, rollup, tier_cutoffs, write_delta
+from storage.timekeys import epoch_day, epoch_hour
+
+NOW = datetime(2024, 6, 30, 12, 30)
+POLICY = {"hourly_days": 3, "six_hour_days": 10, "fact_days": 20, "batch_size": 50, "max_batches": 1000}
+
+
+def _fill(engine, days: int = 40) -> StatsDelta:
+    delta = StatsDelta()
+    start = NOW - timedelta(days=days)
+    for h in range(days * 24):
+        now = start + timedelta(hours=h)
+        delta.add_key("a", 65, now, 1 + h % 7)
+        delta.add_key("b", 66, now, 2)
+        if h % 5 == 0:
+            delta.add_hotkey("CTRL+S", "Ctrl + S", now)
+    write_delta(engine, delta)
+    with engine.begin() as conn:
+        rollup(conn)
+    return delta
+
+
+def _column(engine, sql: str):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.exec_driver_sql(sql)]
+
+
+def test_tiering_keeps_daily_totals(engine, table_sum):
+    delta = _fill(engine)
+    # 尚未汇总的旧明细：即使超过 fact_days 也不能删除
+    stale = StatsDelta()
+    stale.add_key("c", 67, NOW - timedelta(days=35), 4)
+    write_delta(engine, stale)
+
+    daily_before = table_sum("daily_activity_stats", "key_presses")
+    total_before = table_sum("key_total_stats", "total_count")
+    policy = load_retention(POLICY)
+    raw, six = tier_cutoffs(policy, NOW)
+    assert raw.hour % 6 == 0 and six.hour == 0 and six <= raw
+
+    result = Retention(engine, policy).run_once(NOW)
+    assert result["hourly_downsampled"] > 0
+    assert result["six_hour_expired"] > 0
+    assert result["facts_expired"] > 0
+
+    # 粗粒度总数不受影响
+    assert table_sum("daily_activity_stats", "key_presses") == daily_before
+    assert table_sum("key_total_stats", "total_count") == total_before == sum(delta.key_total.values())
+
+    # 小时表只剩 raw 之后的部分，6 小时桶对齐且只落在 [six, raw)
+    assert min(_column(engine, "SELECT epoch_hour FROM hourly_activity_stats")) == epoch_hour(raw)
+    buckets = _column(engine, "SELECT epoch_hour FROM activity_6h_stats")
+    assert buckets and all(b % 6 == 0 and epoch_hour(six) <= b < epoch_hour(raw) for b in buckets)
+
+    # 在两级都覆盖的天里，小时 + 6 小时之和与日统计一致
+    covered = (table_sum("hourly_activity_stats", "key_presses")
+               + table_sum("activity_6h_stats", "key_presses"))
+    assert covered == table_sum("daily_activity_stats", "key_presses", f"epoch_day >= {epoch_day(six.date())}")
+    assert (table_sum("hourly_activity_stats", "hotkey_triggers")
+            + table_sum("activity_6h_stats", "hotkey_triggers")
+            == table_sum("daily_activity_stats", "hotkey_triggers", f"epoch_day >= {epoch_day(six.date())}"))
+
+    # 过期明细只删掉已汇总的行
+    cutoff = epoch_hour((NOW - timedelta(days=POLICY["fact_days"])).replace(hour=0))
+    old = _column(engine, f"SELECT virtual_key_code FROM hourly_key_stats WHERE epoch_hour < {cutoff}")
+    assert old == [67]
+    assert table_sum("hourly_hotkey_stats", "count", f"epoch_hour < {cutoff}") == 0
+
+
+def test_second_run_is_a_noop(engine, table_sum):
+    _fill(engine)
+    retention = Retention(engine, load_retention(POLICY))
+    retention.run_once(NOW)
+    before = (table_sum("hourly_activity_stats", "key_presses"), table_sum("activity_6h_stats", "key_presses"))
+
+    result = retention.run_once(NOW)
+    assert result == {"hourly_downsampled": 0, "six_hour_expired": 0, "facts_expired": 0, "pages_freed": 0}
+    assert (table_sum("hourly_activity_stats", "key_presses"), table_sum("activity_6h_stats", "key_presses")) == before
+
+
+def test_small_batches_match_single_batch(engine, table_sum):
+    # batch_size 不整除一个 6 小时桶时，同一个桶会分几批累加
+    _fill(engine, days=8)
+    total = table_sum("hourly_activity_stats", "key_presses")
+    Retention(engine, load_retention(dict(POLICY, batch_size=4))).run_once(NOW)
+    assert table_sum("hourly_activity_stats", "key_presses") + table_sum("activity_6h_stats", "key_presses") == total
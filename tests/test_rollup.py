@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_rollup.py
+@Description : storage.rollup：高水位增量汇总、重复执行无副作用、一次性补齐
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from storage import StatsDelta, rollup, write_delta
+
+# 粗粒度表的按键计数列：汇总后每张表的总和都应等于明细
+KEY_TABLES = [
+    ("key_total_stats", "total_count"),
+    ("monthly_key_stats", "monthly_count"),
+    ("daily_key_stats", "daily_count"),
+    ("key_weekhour_stats", "count"),
+    ("hourly_activity_stats", "key_presses"),
+    ("daily_activity_stats", "key_presses"),
+    ("monthly_activity_stats", "key_presses"),
+]
+HOTKEY_TABLES = [
+    ("hotkey_total_stats", "total_count"),
+    ("hotkey_daily_stats", "daily_count"),
+    ("hourly_activity_stats", "hotkey_triggers"),
+    ("daily_activity_stats", "hotkey_triggers"),
+    ("monthly_activity_stats", "hotkey_triggers"),
+]
+
+
+def _delta(start: datetime, hours: int, seed: int) -> StatsDelta:
+    rng = random.Random(seed)
+    delta = StatsDelta()
+    for h in range(hours):
+        now = start + timedelta(hours=h, minutes=5)
+        for vk in (65, 66, 67):
+            delta.add_key(chr(vk).lower(), vk, now, rng.randint(1, 20))
+        if h % 3 == 0:
+            delta.add_hotkey("CTRL+C", "Ctrl + C", now, 2)
+    return delta
+
+
+def _keys(delta: StatsDelta) -> int:
+    # events 同时计入了快捷键，按键数单独从 key_total 求和
+    return sum(delta.key_total.values())
+
+
+def _rollup(engine) -> int:
+    with engine.begin() as conn:
+        return rollup(conn)
+
+
+def _snapshot(table_sum):
+    return {table + "." + col: table_sum(table, col) for table, col in KEY_TABLES + HOTKEY_TABLES}
+
+
+def _assert_consistent(table_sum, keys: int, hotkeys: int) -> None:
+    assert table_sum("hourly_key_stats", "count") == keys
+    assert table_sum("hourly_hotkey_stats", "count") == hotkeys
+    for table, col in KEY_TABLES:
+        assert table_sum(table, col) == keys, table
+    for table, col in HOTKEY_TABLES:
+        assert table_sum(table, col) == hotkeys, table
+    # 全部明细都已标记为汇总过
+    assert table_sum("hourly_key_stats", "count - rolled") == 0
+    assert table_sum("hourly_hotkey_stats", "count - rolled") == 0
+
+
+def test_rollup_matches_facts_across_month_boundary(engine, table_sum):
+    delta = _delta(datetime(2024, 3, 30, 20), 80, seed=1)
+    write_delta(engine, delta)
+
+    assert _rollup(engine) == 1
+    hotkeys = sum(delta.hotkey_total.values())
+    _assert_consistent(table_sum, _keys(delta), hotkeys)
+    assert table_sum("monthly_key_stats", "monthly_count", "epoch_month = (2024 - 1970) * 12 + 2") > 0
+    assert table_sum("monthly_key_stats", "monthly_count", "epoch_month = (2024 - 1970) * 12 + 3") > 0
+
+
+def test_rerunning_rollup_is_a_noop(engine, table_sum):
+    write_delta(engine, _delta(datetime(2024, 5, 1), 30, seed=2))
+    _rollup(engine)
+    before = _snapshot(table_sum)
+
+    assert _rollup(engine) == 0
+    assert _rollup(engine) == 0
+    assert _snapshot(table_sum) == before
+
+
+def test_watermark_only_adds_new_writes(engine, table_sum):
+    # 第二批与第一批落在相同的小时上：同一明细行 count 增加、seq 前移，只应汇总新增的部分
+    first = _delta(datetime(2024, 5, 1), 24, seed=3)
+    second = _delta(datetime(2024, 5, 1, 12), 24, seed=4)
+    write_delta(engine, first)
+    _rollup(engine)
+    write_delta(engine, second)
+    write_delta(engine, second)
+
+    assert _rollup(engine) == 2
+    hotkeys = sum(first.hotkey_total.values()) + 2 * sum(second.hotkey_total.values())
+    _assert_consistent(table_sum, _keys(first) + 2 * _keys(second), hotkeys)
+    with engine.connect() as conn:
+        hwm = conn.exec_driver_sql("SELECT value FROM db_meta WHERE key = 'rollup_hwm'").scalar()
+        seq = conn.exec_driver_sql("SELECT value FROM db_meta WHERE key = 'fact_seq'").scalar()
+    assert int(hwm) == int(seq) == 3
+
+
+def test_key_matrix_seed_runs_once(engine, table_sum):
+    delta = _delta(datetime(2024, 6, 10), 48, seed=5)
+    write_delta(engine, delta)
+    _rollup(engine)
+
+    # 模拟按键矩阵表出现之前就已汇总过的库：矩阵为空、没有补齐标记
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM daily_key_stats")
+        conn.exec_driver_sql("DELETE FROM key_weekhour_stats")
+        conn.exec_driver_sql("DELETE FROM db_meta WHERE key = 'key_matrix_seeded'")
+
+    assert _rollup(engine) == 0
+    assert table_sum("daily_key_stats", "daily_count") == _keys(delta)
+    assert table_sum("key_weekhour_stats", "count") == _keys(delta)
+
+    # 补齐只执行一次，之后的写入照常增量汇总
+    more = _delta(datetime(2024, 6, 12), 5, seed=6)
+    write_delta(engine, more)
+    _rollup(engine)
+    _rollup(engine)
+    assert table_sum("daily_key_stats", "daily_count") == _keys(delta) + _keys(more)
+    assert table_sum("key_weekhour_stats", "count") == _keys(delta) + _keys(more)
+
+
+def test_monthly_activity_seed_uses_existing_days(engine, table_sum):
+    # 升级上来的库只有日表：第一次汇总时按月补齐
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO daily_activity_stats(epoch_day, key_presses, hotkey_triggers) VALUES (19000, 7, 1), (19001, 5, 0)"
+        )
+    _rollup(engine)
+    _rollup(engine)
+    assert table_sum("monthly_activity_stats", "key_presses") == 12
+    assert table_sum("monthly_activity_stats", "hotkey_triggers") == 1
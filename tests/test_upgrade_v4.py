@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@File        : TraceBoard-test_upgrade_v4.py
+@Description : upgrade_db_v3：v3 字符串时间键 / 旧 key_events 库转换为 v4 整数键后总数不变
+"""
+
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+import upgrade_db_v3
+from storage import install_profile, load_profile, rollup
+from storage.models import Base
+from storage.timekeys import epoch_day, epoch_hour, epoch_month
+
+
+def _make_v3(path: str) -> None:
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    upgrade_db_v3._create_tables(cur)
+    cur.executemany("INSERT INTO daily_activity_stats(stat_date, key_presses, hotkey_triggers) VALUES (?, ?, ?)",
+                    [("2024-03-05", 10, 2), ("2024-03-06", 5, 0), ("2024-04-01", 7, 1)])
+    cur.executemany("INSERT INTO hourly_activity_stats(stat_hour, key_presses, hotkey_triggers) VALUES (?, ?, ?)",
+                    [("2024-03-05 13", 10, 2), ("2024-03-06 09", 5, 0), ("2024-04-01 00", 7, 1)])
+    cur.executemany("INSERT INTO monthly_key_stats(stat_month, virtual_key_code, key_name, monthly_count) "
+                    "VALUES (?, ?, ?, ?)", [("2024-03", 65, "a", 15), ("2024-04", 65, "a", 7)])
+    cur.execute("INSERT INTO key_total_stats(virtual_key_code, key_name, total_count) VALUES (65, 'a', 22)")
+    cur.executemany("INSERT INTO hotkey_daily_stats(stat_date, hotkey_id, count) VALUES (?, ?, ?)",
+                    [("2024-03-05", "CTRL+C", 2), ("2024-04-01", "CTRL+C", 1)])
+    cur.execute("INSERT INTO hotkey_total_stats(hotkey_id, display_name, total_count) VALUES ('CTRL+C', 'Ctrl + C', 3)")
+    upgrade_db_v3._set_schema_version(cur, 3)
+    conn.commit()
+    conn.close()
+
+
+def _rows(path: str, sql: str):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_v3_converts_to_same_totals(db_path):
+    _make_v3(db_path)
+    assert upgrade_db_v3.needs_upgrade(db_path)
+
+    upgrade_db_v3.migrate(db_path, drop_old=False)
+    assert not upgrade_db_v3.needs_upgrade(db_path)
+    assert _rows(db_path, "SELECT value FROM db_meta WHERE key = 'schema_version'") == [("4",)]
+
+    assert _rows(db_path, "SELECT epoch_day, key_presses, hotkey_triggers FROM daily_activity_stats ORDER BY 1") == [
+        (epoch_day(date(2024, 3, 5)), 10, 2),
+        (epoch_day(date(2024, 3, 6)), 5, 0),
+        (epoch_day(date(2024, 4, 1)), 7, 1),
+    ]
+    converted = [(epoch_hour(datetime(2024, 3, 5, 13)), 10), (epoch_hour(datetime(2024, 3, 6, 9)), 5),
+                 (epoch_hour(datetime(2024, 4, 1, 0)), 7)]
+    # 升级时还会补上最近 48 小时的空行
+    assert _rows(db_path, "SELECT epoch_hour, key_presses FROM hourly_activity_stats "
+                          "WHERE key_presses > 0 ORDER BY 1") == converted
+    assert _rows(db_path, "SELECT epoch_month, virtual_key_code, key_name, monthly_count FROM monthly_key_stats "
+                          "ORDER BY 1") == [(epoch_month(date(2024, 3, 1)), 65, "a", 15),
+                                            (epoch_month(date(2024, 4, 1)), 65, "a", 7)]
+    assert _rows(db_path, "SELECT epoch_day, hotkey_id, daily_count FROM hotkey_daily_stats ORDER BY 1") == [
+        (epoch_day(date(2024, 3, 5)), "CTRL+C", 2), (epoch_day(date(2024, 4, 1)), "CTRL+C", 1)]
+    assert _rows(db_path, "SELECT total_count FROM key_total_stats") == [(22,)]
+    assert _rows(db_path, "SELECT total_count FROM hotkey_total_stats") == [(3,)]
+
+    # 再次升级什么也不改
+    before = _rows(db_path, "SELECT * FROM daily_activity_stats ORDER BY 1")
+    upgrade_db_v3.migrate(db_path, drop_old=False)
+    assert _rows(db_path, "SELECT * FROM daily_activity_stats ORDER BY 1") == before
+
+
+def test_upgraded_db_seeds_monthly_activity(db_path):
+    _make_v3(db_path)
+    upgrade_db_v3.migrate(db_path, drop_old=False)
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        install_profile(engine, load_profile())
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            rollup(conn)
+    finally:
+        engine.dispose()
+    assert _rows(db_path, "SELECT epoch_month, key_presses, hotkey_triggers FROM monthly_activity_stats ORDER BY 1") == [
+        (epoch_month(date(2024, 3, 1)), 15, 2), (epoch_month(date(2024, 4, 1)), 7, 1)]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_key_events_rebuild_then_convert(db_path, workers):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE key_events(id INTEGER PRIMARY KEY AUTOINCREMENT, key_name TEXT, "
+                 "virtual_key_code INTEGER, timestamp TEXT)")
+    events = [("a", 65, f"2024-03-31 23:{m:02d}:00") for m in range(30)]
+    events += [("b", 66, f"2024-04-01 0{h}:15:00") for h in range(5)]
+    events += [(None, 66, "2024-04-01 05:00:00")]
+    conn.executemany("INSERT INTO key_events(key_name, virtual_key_code, timestamp) VALUES (?, ?, ?)", events)
+    conn.commit()
+    conn.close()
+
+    assert upgrade_db_v3.needs_upgrade(db_path)
+    upgrade_db_v3.migrate(db_path, drop_old=True, workers=workers, chunk=7)
+    assert not upgrade_db_v3.needs_upgrade(db_path)
+
+    assert _rows(db_path, "SELECT virtual_key_code, key_name, total_count FROM key_total_stats ORDER BY 1") == [
+        (65, "a", 30), (66, "b", 6)]
+    assert _rows(db_path, "SELECT epoch_day, key_presses FROM daily_activity_stats ORDER BY 1") == [
+        (epoch_day(date(2024, 3, 31)), 30), (epoch_day(date(2024, 4, 1)), 6)]
+    assert _rows(db_path, "SELECT SUM(key_presses) FROM hourly_activity_stats") == [(36,)]
+    assert _rows(db_path, "SELECT epoch_month, SUM(monthly_count) FROM monthly_key_stats GROUP BY 1 ORDER BY 1") == [
+        (epoch_month(date(2024, 3, 1)), 30), (epoch_month(date(2024, 4, 1)), 6)]
+    assert _rows(db_path, "SELECT name FROM sqlite_master WHERE name = 'key_events'") == []
+
+
+def test_missing_or_fresh_db_needs_no_upgrade(db_path, engine):
+    # engine 夹具按最新结构建好了表
+    assert not upgrade_db_v3.needs_upgrade(db_path)
+    assert not upgrade_db_v3.needs_upgrade(db_path + ".missing")
@@ -4,6 +4,10 @@ from datetime import datetime
 from tqdm import tqdm 
 import os
 import sys
+import time
+
+from storage.timekeys import parse_month
+from upgrade_db_v3 import RebuildAggregate, _aggregate_range, _iter_chunks, _report_rate
 
 
 try:
@@ -47,67 +51,51 @@ def migrate_database():
 
         print(f"总计找到 {total_records} 条旧按键记录，开始聚合...")
 
-        batch_size = 50000 
-        
-        total_stats_map = {} 
-        monthly_stats_map = {} 
-
-        offset = 0
-        with tqdm(total=total_records, desc="聚合历史数据") as pbar:
-            while True:
-                batch = db.query(OldKeyEvent) \
-                    .order_by(OldKeyEvent.id) \
-                    .offset(offset) \
-                    .limit(batch_size) \
-                    .all()
-                
-                if not batch:
-                    break
-                
-                for event in batch:
-                    vk = event.virtual_key_code
-                    key_name = event.key_name or '-'
-                    if not event.timestamp:
-                        continue
-                        
-                    stat_month = event.timestamp.strftime('%Y-%m')
-
-                    total_stats_map[vk] = (key_name, total_stats_map.get(vk, ('', 0))[1] + 1)
-                    
-                    monthly_key = (stat_month, vk)
-                    monthly_stats_map[monthly_key] = (key_name, monthly_stats_map.get(monthly_key, ('', 0))[1] + 1)
-
-                offset += len(batch)
-                pbar.update(len(batch))
-        
+        # 按主键 keyset 分页，每块在 SQL 里聚合（与 upgrade_db_v3 共用同一套分块聚合逻辑）
+        started = time.perf_counter()
+        agg = RebuildAggregate()
+        raw = engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            with tqdm(total=total_records, desc="聚合历史数据", unit="rows") as pbar:
+                for lo, hi, n in _iter_chunks(cur):
+                    agg.merge(_aggregate_range(cur, lo, hi))
+                    agg.rows += n
+                    pbar.update(n)
+        finally:
+            raw.close()
+        _report_rate("聚合 key_events", agg.rows, started)
+
         db.close()
         db = SessionLocal() 
 
         print("\n正在写入 KeyTotalStats...")
+        now = datetime.now()
         total_stats_to_insert = [
-            KeyTotalStats(
-                key_name=data[0],
+            dict(
+                key_name=agg.key_name(vk) or '-',
                 virtual_key_code=vk,
-                total_count=data[1],
-                last_updated=datetime.now()
-            ) for vk, data in total_stats_map.items()
+                total_count=cnt,
+                last_updated=now
+            ) for vk, cnt in agg.key_total.items()
         ]
-        db.bulk_save_objects(total_stats_to_insert)
+        db.bulk_insert_mappings(KeyTotalStats, total_stats_to_insert)
         print(f"✅ KeyTotalStats 写入完成 ({len(total_stats_to_insert)} 条记录)。")
 
         print("正在写入 MonthlyKeyStats...")
         monthly_stats_to_insert = [
-            MonthlyKeyStats(
-                key_name=data[0],
+            dict(
+                key_name=agg.key_name(vk) or '-',
                 virtual_key_code=vk,
-                stat_month=month,
-                monthly_count=data[1]
-            ) for (month, vk), data in monthly_stats_map.items()
+                epoch_month=parse_month(month),
+                monthly_count=cnt
+            ) for (month, vk), cnt in agg.monthly.items()
         ]
-        db.bulk_save_objects(monthly_stats_to_insert)
+        db.bulk_insert_mappings(MonthlyKeyStats, monthly_stats_to_insert)
         print(f"✅ MonthlyKeyStats 写入完成 ({len(monthly_stats_to_insert)} 条记录)。")
 
         db.commit()
+        _report_rate("迁移（含写入）", agg.rows, started)
         
         OldKeyEvent.__table__.drop(engine, checkfirst=True)
         print("✅ 旧表 'key_events' 已清理/删除。")
@@ -8,6 +8,8 @@ from sqlalchemy import Column, DateTime, Integer, String, inspect
 from sqlalchemy.orm import declarative_base
 from tqdm import tqdm
 
+from storage.timekeys import parse_month
+
 try:
     from server.app import engine, SessionLocal, Base, KeyTotalStats, MonthlyKeyStats, DBMeta
     print("ℹ️ 成功导入 server.app 的数据库配置和新模型。")
@@ -131,7 +133,7 @@ def migrate_v0_to_v1():
         for (month, vk), data in tqdm(monthly_stats_map.items(), desc="MonthlyKeyStats", unit="rows"):
             existing = db.query(MonthlyKeyStats).filter(
                 MonthlyKeyStats.virtual_key_code == vk,
-                MonthlyKeyStats.stat_month == month
+                MonthlyKeyStats.epoch_month == parse_month(month)
             ).first()
             if existing:
                 existing.monthly_count += data["count"]
@@ -141,7 +143,7 @@ def migrate_v0_to_v1():
                 db.add(MonthlyKeyStats(
                     key_name=data["key_name"],
                     virtual_key_code=vk,
-                    stat_month=month,
+                    epoch_month=parse_month(month),
                     monthly_count=data["count"]
                 ))
 
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 import argparse
+import collections
+import json
 import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, Tuple, List
+from typing import Dict, Iterator, List, Optional, Tuple
 
-SCHEMA_LATEST = 3
+import metrics
+
+SCHEMA_LATEST = 4
 
 
 def _now_iso() -> str:
@@ -149,23 +156,181 @@ def _progress(total: int):
         return tqdm(total=total, desc="Upgrading", unit="rows")
     except Exception:
         class Dummy:
-            def __init__(self, total): self.total=total; self.done=0
+            def __init__(self, total):
+                self.total = total
+                self.done = 0
+                self.started = time.perf_counter()
+                self.reported = 0
             def update(self, n):
                 self.done += n
-                if self.total > 0 and self.done % 50000 == 0:
+                if self.total > 0 and (self.done - self.reported >= 50000 or self.done >= self.total):
+                    self.reported = self.done
                     pct = self.done / self.total * 100
-                    print(f"Upgrading... {pct:.1f}% ({self.done}/{self.total})")
+                    rate = self.done / max(time.perf_counter() - self.started, 1e-9)
+                    print(f"Upgrading... {pct:.1f}% ({self.done}/{self.total}, {rate:,.0f} rows/s)")
             def close(self): pass
         return Dummy(total)
 
 
-def _rebuild_from_key_events(cur: sqlite3.Cursor) -> None:
+REBUILD_CHUNK = 200_000
+
+# 每个区间只扫一次主键范围，在 SQL 里按 (vk, 小时) 聚合，Python 端只处理聚合后的少量行
+_CHUNK_BOUNDS_SQL = """
+SELECT MAX(id), COUNT(*) FROM (
+  SELECT id FROM key_events WHERE id > ? ORDER BY id LIMIT ?
+);
+"""
+
+_CHUNK_AGG_SQL = """
+SELECT virtual_key_code, substr(timestamp, 1, 13) AS hour, COUNT(*)
+FROM key_events
+WHERE id > ? AND id <= ?
+  AND virtual_key_code IS NOT NULL AND timestamp IS NOT NULL
+GROUP BY virtual_key_code, hour;
+"""
+
+# SQLite 保证与 MAX() 同时出现的裸列取自最大值所在行：即区间内每个 vk 最后一次非空的 key_name
+_CHUNK_NAMES_SQL = """
+SELECT virtual_key_code, MAX(id), key_name
+FROM key_events
+WHERE id > ? AND id <= ?
+  AND virtual_key_code IS NOT NULL AND timestamp IS NOT NULL
+  AND key_name IS NOT NULL AND key_name <> ''
+GROUP BY virtual_key_code;
+"""
+
+
+class RebuildAggregate:
+    """
+    key_events 某个 id 区间的聚合结果。merge 满足交换律与结合律
+    （计数相加，key_name 取 id 最大者），分块、乱序合并都与整表顺序扫描结果一致。
+    """
+
+    def __init__(self):
+        self.key_total: collections.Counter = collections.Counter()
+        self.monthly: collections.Counter = collections.Counter()
+        self.daily: collections.Counter = collections.Counter()
+        self.hourly: collections.Counter = collections.Counter()
+        self.names: Dict[int, Tuple[int, str]] = {}   # vk -> (id, key_name)
+        self.rows = 0
+
+    def add_hour(self, vk: int, hour: str, n: int) -> None:
+        self.key_total[vk] += n
+        self.monthly[(hour[:7], vk)] += n
+        self.daily[hour[:10]] += n
+        self.hourly[hour] += n
+
+    def add_name(self, vk: int, row_id: int, key_name: str) -> None:
+        cur = self.names.get(vk)
+        if cur is None or row_id > cur[0]:
+            self.names[vk] = (row_id, key_name)
+
+    def merge(self, other: "RebuildAggregate") -> None:
+        self.key_total.update(other.key_total)
+        self.monthly.update(other.monthly)
+        self.daily.update(other.daily)
+        self.hourly.update(other.hourly)
+        for vk, (row_id, key_name) in other.names.items():
+            self.add_name(vk, row_id, key_name)
+        self.rows += other.rows
+
+    def key_name(self, vk: int) -> Optional[str]:
+        entry = self.names.get(vk)
+        return entry[1] if entry else None
+
+
+_MIN_ROWID = -(1 << 63)
+
+
+def _iter_chunks(cur: sqlite3.Cursor, after_id: int = _MIN_ROWID,
+                 size: int = REBUILD_CHUNK) -> Iterator[Tuple[int, int, int]]:
+    """按主键做 keyset 分页：依次产出 (lo, hi, rows)，区间为 lo < id <= hi；不使用 OFFSET"""
+    lo = after_id
+    while True:
+        cur.execute(_CHUNK_BOUNDS_SQL, (lo, size))
+        hi, n = cur.fetchone()
+        if not n:
+            return
+        yield lo, int(hi), int(n)
+        lo = int(hi)
+
+
+ChunkPartial = Tuple[collections.Counter, Dict[int, Tuple[int, str]]]
+
+
+def _range_partial(cur: sqlite3.Cursor, lo: int, hi: int) -> ChunkPartial:
+    """区间 lo < id <= hi 的部分结果：(Counter[(vk, 小时)], {vk: (id, key_name)})"""
+    hours: collections.Counter = collections.Counter()
+    cur.execute(_CHUNK_AGG_SQL, (lo, hi))
+    for vk, hour, n in cur.fetchall():
+        hours[(int(vk), str(hour))] += int(n)
+    cur.execute(_CHUNK_NAMES_SQL, (lo, hi))
+    names = {int(vk): (int(row_id), str(key_name)) for vk, row_id, key_name in cur.fetchall()}
+    return hours, names
+
 
+def _aggregate_range(cur: sqlite3.Cursor, lo: int, hi: int) -> RebuildAggregate:
+    agg = RebuildAggregate()
+    hours, names = _range_partial(cur, lo, hi)
+    for (vk, hour), n in hours.items():
+        agg.add_hour(vk, hour, n)
+    for vk, (row_id, key_name) in names.items():
+        agg.add_name(vk, row_id, key_name)
+    return agg
+
+
+def _write_aggregate(cur: sqlite3.Cursor, agg: RebuildAggregate) -> None:
+    # 按键排序后写入：串行 / 并行重建得到的表（包括自增 id）完全一致
+    now = _now_iso()
+    cur.executemany(
+        """
+        INSERT INTO key_total_stats(virtual_key_code, key_name, total_count, last_updated)
+        VALUES (?, ?, ?, ?);
+        """,
+        [(vk, agg.key_name(vk), int(cnt), now) for vk, cnt in sorted(agg.key_total.items())],
+    )
+    cur.executemany(
+        """
+        INSERT INTO monthly_key_stats(stat_month, virtual_key_code, key_name, monthly_count)
+        VALUES (?, ?, ?, ?);
+        """,
+        [(month, vk, agg.key_name(vk), int(cnt)) for (month, vk), cnt in sorted(agg.monthly.items())],
+    )
+    cur.executemany(
+        """
+        INSERT INTO daily_activity_stats(stat_date, key_presses, hotkey_triggers)
+        VALUES (?, ?, 0);
+        """,
+        [(day, int(cnt)) for day, cnt in sorted(agg.daily.items())],
+    )
+    cur.executemany(
+        """
+        INSERT INTO hourly_activity_stats(stat_hour, key_presses, hotkey_triggers, last_updated)
+        VALUES (?, ?, 0, ?);
+        """,
+        [(hour, int(cnt), now) for hour, cnt in sorted(agg.hourly.items())],
+    )
+
+
+def _clear_aggregates(cur: sqlite3.Cursor) -> None:
     cur.execute("DELETE FROM key_total_stats;")
     cur.execute("DELETE FROM monthly_key_stats;")
     cur.execute("DELETE FROM daily_activity_stats;")
     cur.execute("DELETE FROM hourly_activity_stats;")
 
+
+def _report_rate(label: str, rows: int, started: float) -> None:
+    secs = max(time.perf_counter() - started, 1e-9)
+    print(f"📈 {label}: {rows} 行，用时 {secs:.2f}s，{rows / secs:,.0f} rows/s")
+    if metrics.ENABLED:
+        metrics.REGISTRY.histogram("migration_seconds", "迁移各阶段耗时", phase=label).observe(int(secs * 1e9))
+        metrics.REGISTRY.counter("migration_rows_total", "迁移各阶段处理的行数", phase=label).inc(rows)
+
+
+def _rebuild_from_key_events(cur: sqlite3.Cursor, chunk: int = REBUILD_CHUNK) -> None:
+
+    _clear_aggregates(cur)
+
     if not _table_exists(cur, "key_events"):
         return
 
@@ -174,109 +339,329 @@ def _rebuild_from_key_events(cur: sqlite3.Cursor) -> None:
     if total == 0:
         return
 
-    import collections
-    key_total = collections.Counter()
-    monthly = collections.Counter()
-    daily = collections.Counter()
-    hourly = collections.Counter()
-    last_key_name: Dict[int, str] = {}
-
-    CHUNK = 5000
-    offset = 0
+    started = time.perf_counter()
+    agg = RebuildAggregate()
     pbar = _progress(total)
+    for lo, hi, n in _iter_chunks(cur, size=chunk):
+        agg.merge(_aggregate_range(cur, lo, hi))
+        agg.rows += n
+        pbar.update(n)
+    pbar.close()
+    _report_rate("聚合 key_events", agg.rows, started)
 
-    while True:
-        cur.execute(
-            """
-            SELECT virtual_key_code, key_name, timestamp
-            FROM key_events
-            ORDER BY id
-            LIMIT ? OFFSET ?;
-            """,
-            (CHUNK, offset),
-        )
-        rows = cur.fetchall()
-        if not rows:
-            break
-
-        for vk, key_name, ts in rows:
-            if vk is None or ts is None:
-                continue
-            vk = int(vk)
-            key_total[vk] += 1
-            if key_name:
-                last_key_name[vk] = str(key_name)
-
-            month = str(ts)[:7]
-            day = str(ts)[:10]
-            hour = str(ts)[:13] 
-
-            monthly[(month, vk)] += 1
-            daily[day] += 1
-            hourly[hour] += 1
-
-        offset += CHUNK
-        pbar.update(len(rows))
+    _write_aggregate(cur, agg)
+    _report_rate("重建（含写入）", agg.rows, started)
 
-    pbar.close()
 
-    now = _now_iso()
+# ---------- 并行、可断点续跑的重建 ----------
+# 分块计划与每块的完成标记记录在 db_meta；每块的部分结果写入暂存表，
+# 与完成标记在同一事务中提交。中途崩溃后重新运行，只处理尚未完成的块。
 
-    for vk, cnt in key_total.items():
-        cur.execute(
-            """
-            INSERT INTO key_total_stats(virtual_key_code, key_name, total_count, last_updated)
-            VALUES (?, ?, ?, ?);
-            """,
-            (vk, last_key_name.get(vk), int(cnt), now),
-        )
-
-    for (month, vk), cnt in monthly.items():
-        cur.execute(
-            """
-            INSERT INTO monthly_key_stats(stat_month, virtual_key_code, key_name, monthly_count)
-            VALUES (?, ?, ?, ?);
-            """,
-            (month, vk, last_key_name.get(vk), int(cnt)),
-        )
-
-    for day, cnt in daily.items():
-        cur.execute(
-            """
-            INSERT INTO daily_activity_stats(stat_date, key_presses, hotkey_triggers)
-            VALUES (?, ?, 0);
-            """,
-            (day, int(cnt)),
-        )
-
-    for hour, cnt in hourly.items():
-        cur.execute(
-            """
-            INSERT INTO hourly_activity_stats(stat_hour, key_presses, hotkey_triggers, last_updated)
-            VALUES (?, ?, 0, ?);
-            """,
-            (hour, int(cnt), now),
-        )
+_META_PLAN = "rebuild_plan"
+_META_CHUNK_PREFIX = "rebuild_chunk:"
+
+
+def _create_stage_tables(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rebuild_stage_hours(
+          chunk_hi INTEGER NOT NULL,
+          virtual_key_code INTEGER NOT NULL,
+          stat_hour TEXT NOT NULL,
+          n INTEGER NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rebuild_stage_names(
+          chunk_hi INTEGER NOT NULL,
+          virtual_key_code INTEGER NOT NULL,
+          row_id INTEGER NOT NULL,
+          key_name TEXT
+        );
+        """
+    )
+
+
+def _drop_stage(cur: sqlite3.Cursor) -> None:
+    cur.execute("DROP TABLE IF EXISTS rebuild_stage_hours;")
+    cur.execute("DROP TABLE IF EXISTS rebuild_stage_names;")
+    cur.execute("DELETE FROM db_meta WHERE key = ? OR key LIKE ?;", (_META_PLAN, _META_CHUNK_PREFIX + "%"))
+
+
+def _set_meta(cur: sqlite3.Cursor, key: str, value: str) -> None:
+    cur.execute(
+        """
+        INSERT INTO db_meta(key, value, updated_at)
+        VALUES(?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET
+          value=excluded.value,
+          updated_at=excluded.updated_at;
+        """,
+        (key, value, _now_iso()),
+    )
+
+
+def _load_or_plan_chunks(conn: sqlite3.Connection, chunk: int) -> List[Tuple[int, int, int]]:
+    """分块边界只计算一次并保存，续跑时沿用，保证每块的范围前后一致"""
+    cur = conn.cursor()
+    cur.execute("SELECT value FROM db_meta WHERE key = ?;", (_META_PLAN,))
+    row = cur.fetchone()
+    if row:
+        plan = json.loads(row[0])
+        if plan.get("chunk") != chunk:
+            print(f"ℹ️ 沿用已保存的分块计划（chunk={plan.get('chunk')}），忽略 --chunk={chunk}")
+        return [tuple(c) for c in plan["chunks"]]
+
+    chunks = list(_iter_chunks(cur, size=chunk))
+    _set_meta(cur, _META_PLAN, json.dumps({"chunk": chunk, "chunks": chunks}))
+    conn.commit()
+    return chunks
+
+
+def _done_chunks(cur: sqlite3.Cursor) -> set:
+    cur.execute("SELECT key FROM db_meta WHERE key LIKE ?;", (_META_CHUNK_PREFIX + "%",))
+    return {int(k[len(_META_CHUNK_PREFIX):]) for (k,) in cur.fetchall()}
+
+
+def _chunk_worker(db_path: str, lo: int, hi: int) -> Tuple[int, ChunkPartial]:
+    """子进程：独立的只读连接聚合一个区间"""
+    uri = Path(db_path).absolute().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        conn.execute("PRAGMA query_only=1;")
+        return hi, _range_partial(conn.cursor(), lo, hi)
+    finally:
+        conn.close()
+
+
+def _save_partial(conn: sqlite3.Connection, hi: int, partial: ChunkPartial) -> None:
+    hours, names = partial
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO rebuild_stage_hours(chunk_hi, virtual_key_code, stat_hour, n) VALUES (?, ?, ?, ?);",
+        [(hi, vk, hour, n) for (vk, hour), n in hours.items()],
+    )
+    cur.executemany(
+        "INSERT INTO rebuild_stage_names(chunk_hi, virtual_key_code, row_id, key_name) VALUES (?, ?, ?, ?);",
+        [(hi, vk, row_id, key_name) for vk, (row_id, key_name) in names.items()],
+    )
+    _set_meta(cur, f"{_META_CHUNK_PREFIX}{hi:020d}", "done")
+    conn.commit()
+
+
+def _merge_stage(cur: sqlite3.Cursor) -> RebuildAggregate:
+    agg = RebuildAggregate()
+    cur.execute(
+        """
+        SELECT virtual_key_code, stat_hour, SUM(n)
+        FROM rebuild_stage_hours
+        GROUP BY virtual_key_code, stat_hour;
+        """
+    )
+    for vk, hour, n in cur.fetchall():
+        agg.add_hour(int(vk), str(hour), int(n))
+    cur.execute("SELECT virtual_key_code, row_id, key_name FROM rebuild_stage_names;")
+    for vk, row_id, key_name in cur.fetchall():
+        agg.add_name(int(vk), int(row_id), str(key_name))
+    return agg
+
+
+def _rebuild_parallel(conn: sqlite3.Connection, db_path: str, workers: int, chunk: int = REBUILD_CHUNK) -> None:
+    """
+    与 _rebuild_from_key_events 结果一致：子进程各自产出区间的部分计数，
+    主进程逐块落到暂存表并记录进度，全部完成后一次性合并写入聚合表。
+    调用方负责在最后提交（与 schema_version 同一事务）。
+    """
+    cur = conn.cursor()
+    _create_stage_tables(cur)
+    conn.commit()
+
+    chunks = _load_or_plan_chunks(conn, chunk)
+    done = _done_chunks(cur)
+    pending = [(lo, hi, n) for lo, hi, n in chunks if hi not in done]
+    total = sum(n for _, _, n in chunks)
+    if done:
+        print(f"♻️ 续跑：{len(chunks) - len(pending)}/{len(chunks)} 块已完成")
+
+    started = time.perf_counter()
+    pbar = _progress(total)
+    pbar.update(total - sum(n for _, _, n in pending))
+    rows = {hi: n for _, hi, n in pending}
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(_chunk_worker, db_path, lo, hi) for lo, hi, _ in pending]
+        for fut in as_completed(futures):
+            hi, partial = fut.result()
+            _save_partial(conn, hi, partial)
+            pbar.update(rows[hi])
+    finally:
+        # 出错时不再等待排队中的块，已提交的进度下次续跑
+        pool.shutdown(cancel_futures=True)
+    pbar.close()
+    _report_rate(f"并行聚合 key_events（{workers} 进程）", sum(rows.values()), started)
+
+    agg = _merge_stage(cur)
+    _clear_aggregates(cur)
+    _write_aggregate(cur, agg)
+    _drop_stage(cur)
+    _report_rate("重建（含合并写入）", sum(rows.values()), started)
+
+
+# ---------- v4：整数时间键 + WITHOUT ROWID ----------
+# 时间键改为自 1970-01-01 起的天数 / 小时数 / 月数（本地钟面时间，与 storage.timekeys 一致），
+# 并直接作为聚簇主键，不再需要 id 自增列和 (日期, 键) 唯一索引。
+
+_DAY_SQL = "CAST(julianday({c}) - 2440587.5 AS INTEGER)"
+_HOUR_SQL = "CAST(julianday(substr({c}, 1, 10)) - 2440587.5 AS INTEGER) * 24 + CAST(substr({c}, 12, 2) AS INTEGER)"
+_MONTH_SQL = "(CAST(substr({c}, 1, 4) AS INTEGER) - 1970) * 12 + CAST(substr({c}, 6, 2) AS INTEGER) - 1"
+
+_ACTIVITY_COLUMNS = """
+          key_presses INTEGER DEFAULT 0,
+          hotkey_triggers INTEGER DEFAULT 0,
+          last_updated DATETIME"""
+
+# 表名 -> (v4 建表语句的列定义, 整数键列, 旧的字符串键列, 转换表达式, 旧列名别名, 附带索引)
+_V4_TABLES = {
+    "daily_activity_stats": (
+        f"epoch_day INTEGER NOT NULL PRIMARY KEY,{_ACTIVITY_COLUMNS}",
+        "epoch_day", "stat_date", _DAY_SQL, {}, [],
+    ),
+    "hourly_activity_stats": (
+        f"epoch_hour INTEGER NOT NULL PRIMARY KEY,{_ACTIVITY_COLUMNS}",
+        "epoch_hour", "stat_hour", _HOUR_SQL, {}, [],
+    ),
+    "activity_6h_stats": (
+        f"epoch_hour INTEGER NOT NULL PRIMARY KEY,{_ACTIVITY_COLUMNS}",
+        "epoch_hour", "stat_bucket", _HOUR_SQL, {}, [],
+    ),
+    "monthly_activity_stats": (
+        f"epoch_month INTEGER NOT NULL PRIMARY KEY,{_ACTIVITY_COLUMNS}",
+        "epoch_month", "stat_month", _MONTH_SQL, {}, [],
+    ),
+    "monthly_key_stats": (
+        """epoch_month INTEGER NOT NULL,
+          virtual_key_code INTEGER NOT NULL,
+          key_name VARCHAR,
+          monthly_count INTEGER DEFAULT 0,
+          PRIMARY KEY (epoch_month, virtual_key_code)""",
+        "epoch_month", "stat_month", _MONTH_SQL, {}, [],
+    ),
+    "hotkey_daily_stats": (
+        """epoch_day INTEGER NOT NULL,
+          hotkey_id VARCHAR NOT NULL,
+          display_name VARCHAR DEFAULT '',
+          daily_count INTEGER DEFAULT 0,
+          last_triggered DATETIME,
+          PRIMARY KEY (epoch_day, hotkey_id)""",
+        # v3 脚本建的表计数列名为 count
+        "epoch_day", "stat_date", _DAY_SQL, {"daily_count": "count"}, [],
+    ),
+    "hourly_key_stats": (
+        """epoch_hour INTEGER NOT NULL,
+          virtual_key_code INTEGER NOT NULL,
+          key_name VARCHAR,
+          count INTEGER DEFAULT 0,
+          rolled INTEGER DEFAULT 0,
+          seq INTEGER DEFAULT 0,
+          last_updated DATETIME,
+          PRIMARY KEY (epoch_hour, virtual_key_code)""",
+        "epoch_hour", "stat_hour", _HOUR_SQL, {},
+        ["CREATE INDEX IF NOT EXISTS ix_hourly_key_stats_seq ON hourly_key_stats(seq);"],
+    ),
+    "hourly_hotkey_stats": (
+        """epoch_hour INTEGER NOT NULL,
+          hotkey_id VARCHAR NOT NULL,
+          display_name VARCHAR DEFAULT '',
+          count INTEGER DEFAULT 0,
+          rolled INTEGER DEFAULT 0,
+          seq INTEGER DEFAULT 0,
+          last_triggered DATETIME,
+          PRIMARY KEY (epoch_hour, hotkey_id)""",
+        "epoch_hour", "stat_hour", _HOUR_SQL, {},
+        ["CREATE INDEX IF NOT EXISTS ix_hourly_hotkey_stats_seq ON hourly_hotkey_stats(seq);"],
+    ),
+}
+
+
+def _columns(cur: sqlite3.Cursor, table: str) -> List[str]:
+    cur.execute(f"PRAGMA table_info({table});")
+    return [r[1] for r in cur.fetchall()]
+
+
+def _upgrade_to_v4(cur: sqlite3.Cursor) -> None:
+    """逐表重建为整数键的 WITHOUT ROWID 表；已是新结构的表跳过，缺失的表直接按新结构创建"""
+    for table, (ddl, key_col, old_col, convert, aliases, indexes) in _V4_TABLES.items():
+        old_cols = _columns(cur, table) if _table_exists(cur, table) else []
+        if key_col in old_cols:
+            continue
+
+        target = f"{table}__v4" if old_cols else table
+        cur.execute(f"DROP TABLE IF EXISTS {target};")
+        cur.execute(f"CREATE TABLE {target}(\n          {ddl}\n        ) WITHOUT ROWID;")
+
+        if old_cols:
+            new_cols = _columns(cur, target)
+            exprs = []
+            for col in new_cols:
+                src = aliases.get(col, col)
+                if col == key_col:
+                    exprs.append(convert.format(c=old_col))
+                elif src in old_cols:
+                    exprs.append(src)
+                elif col in old_cols:
+                    exprs.append(col)
+                else:
+                    exprs.append("NULL")
+            started = time.perf_counter()
+            cur.execute(
+                f"INSERT INTO {target}({', '.join(new_cols)}) "
+                f"SELECT {', '.join(exprs)} FROM {table} WHERE {old_col} IS NOT NULL;"
+            )
+            rows = cur.rowcount
+            cur.execute(f"DROP TABLE {table};")
+            cur.execute(f"ALTER TABLE {target} RENAME TO {table};")
+            _report_rate(f"转换 {table}", max(rows, 0), started)
+
+        for sql in indexes:
+            cur.execute(sql)
 
 
 def _ensure_recent_hours(cur: sqlite3.Cursor, hours: int = 48) -> None:
     end_dt = datetime.now().replace(minute=0, second=0, microsecond=0)
-    start_dt = end_dt - timedelta(hours=hours - 1)
+    end_h = (end_dt.toordinal() - datetime(1970, 1, 1).toordinal()) * 24 + end_dt.hour
     now = _now_iso()
-    cur_dt = start_dt
-    while cur_dt <= end_dt:
-        h = cur_dt.strftime("%Y-%m-%d %H")
-        cur.execute(
-            """
-            INSERT OR IGNORE INTO hourly_activity_stats(stat_hour, key_presses, hotkey_triggers, last_updated)
-            VALUES (?, 0, 0, ?);
-            """,
-            (h, now),
-        )
-        cur_dt += timedelta(hours=1)
-
-
-def migrate(db_path: str, drop_old: bool) -> None:
+    cur.executemany(
+        """
+        INSERT OR IGNORE INTO hourly_activity_stats(epoch_hour, key_presses, hotkey_triggers, last_updated)
+        VALUES (?, 0, 0, ?);
+        """,
+        [(h, now) for h in range(end_h - hours + 1, end_h + 1)],
+    )
+
+
+def needs_upgrade(db_path: str) -> bool:
+    """
+    库中还有旧结构：未重建的逐条事件表 key_events，或仍用字符串时间键的统计表。
+    文件不存在或是全新的空库时返回 False（由服务直接按最新结构建表）。
+    """
+    if not Path(db_path).exists():
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        cur = conn.cursor()
+        if _table_exists(cur, "key_events") and _get_schema_version(cur) < 3:
+            return True
+        for table, (_, key_col, *_rest) in _V4_TABLES.items():
+            if _table_exists(cur, table) and key_col not in _columns(cur, table):
+                return True
+        return False
+    finally:
+        conn.close()
+
+
+def migrate(db_path: str, drop_old: bool, workers: int = 0, chunk: int = REBUILD_CHUNK) -> None:
     conn = sqlite3.connect(db_path)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
@@ -286,24 +671,33 @@ def migrate(db_path: str, drop_old: bool) -> None:
         current = _get_schema_version(cur)
         print(f"当前数据库 schema_version: v{current}")
 
-        _create_tables(cur)
-
         if current < 3:
+            _create_tables(cur)
             if _table_exists(cur, "key_events"):
                 print("🚀 检测到 key_events：从逐条事件重建聚合（包含 hourly_activity_stats）...")
-                _rebuild_from_key_events(cur)
+                if workers > 0:
+                    _rebuild_parallel(conn, db_path, workers, chunk)
+                else:
+                    _rebuild_from_key_events(cur, chunk)
                 if drop_old:
                     cur.execute("DROP TABLE IF EXISTS key_events;")
                     print("🧹 已删除旧表 key_events（--drop-old）。")
             else:
-                print("ℹ️ 未发现 key_events：仅补齐 v3 表结构与最近小时占位。")
-                _ensure_recent_hours(cur, hours=48)
+                print("ℹ️ 未发现 key_events：仅补齐 v3 表结构。")
 
             _set_schema_version(cur, 3)
             conn.commit()
-            print("🎉 升级完成：schema_version 已设置为 v3。")
+            print("🎉 已升级到 v3。")
+
+        if current < SCHEMA_LATEST:
+            print("🚀 转换为整数时间键（v4）...")
+            _upgrade_to_v4(cur)
+            _ensure_recent_hours(cur, hours=48)
+            _set_schema_version(cur, SCHEMA_LATEST)
+            conn.commit()
+            print(f"🎉 升级完成：schema_version 已设置为 v{SCHEMA_LATEST}。")
         else:
-            print("✅ 数据库已是最新版本（v3），无需升级。")
+            print(f"✅ 数据库已是最新版本（v{SCHEMA_LATEST}），无需升级。")
             _ensure_recent_hours(cur, hours=48)
             conn.commit()
 
@@ -318,8 +712,16 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("db", help="SQLite 数据库文件路径（例如 key_events.db）")
     ap.add_argument("--drop-old", action="store_true", help="升级成功后删除旧表 key_events（瘦身）")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="并行、可断点续跑的重建使用的进程数；0 为单事务串行重建（默认）")
+    ap.add_argument("--chunk", type=int, default=REBUILD_CHUNK, help="每块的 key_events 行数")
+    ap.add_argument("--metrics-out", help="把各阶段耗时与行数以 Prometheus 文本格式写入该文件")
     args = ap.parse_args()
-    migrate(args.db, args.drop_old)
+    migrate(args.db, args.drop_old, args.workers, max(1, args.chunk))
+    if args.metrics_out:
+        with open(args.metrics_out, "w", encoding="utf-8") as f:
+            f.write(metrics.REGISTRY.render())
+        print(f"✅ 迁移指标已写入 {args.metrics_out}")
 
 
 if __name__ == "__main__":